@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+IVF approximate nearest-neighbour index over the product vectors from embeddings.py.
+
+build: k-means (Lloyd on a sample, then one assignment pass over all vectors) splits the
+catalog into --nlist inverted lists. Each vector is stored as its residual to the list
+centroid, quantised to int8 with a per-vector scale. Codes and the price/active columns
+are written in list order as .npy files and memory-mapped at query time.
+
+search: probe the --nprobe closest centroids, drop inactive and out-of-budget rows inside
+each probed list, score the rest as q.c + scale * (q . code), return the top k.
+
+bench: recall@k and latency per nprobe against exact (brute-force) search.
+
+Run from project root:
+  python ml/ann_index.py build [--nlist 1024]
+  python ml/ann_index.py bench [--queries 200] [--nprobe 1 2 4 8 16 32]
+"""
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+
+from embeddings import EMBEDDINGS_DIR, ProductEmbeddings, profile_text
+
+ML_DIR = Path(__file__).resolve().parent
+INDEX_DIR = ML_DIR / "ann_index"
+
+SEED = 42
+KMEANS_ITERATIONS = 20
+KMEANS_SAMPLE_PER_LIST = 256
+ASSIGN_BLOCK_ROWS = 65536
+
+
+def _nearest_centroid(X: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # argmin |x - c|^2 == argmax (x.c - |c|^2 / 2)
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(X), dtype=np.int32)
+    for start in range(0, len(X), ASSIGN_BLOCK_ROWS):
+        block = np.asarray(X[start:start + ASSIGN_BLOCK_ROWS])
+        out[start:start + len(block)] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return out
+
+
+def kmeans(X: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+    sample_size = min(len(X), nlist * KMEANS_SAMPLE_PER_LIST)
+    sample = np.asarray(X[np.sort(rng.choice(len(X), sample_size, replace=False))])
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assign = _nearest_centroid(sample, centroids)
+        counts = np.bincount(assign, minlength=nlist)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty lists from random sample points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+    return centroids.astype(np.float32)
+
+
+def build(nlist: int = None, out_dir: Path = INDEX_DIR, embeddings_dir: Path = EMBEDDINGS_DIR):
+    started = time.perf_counter()
+    emb = ProductEmbeddings(embeddings_dir)
+    X = emb.vectors
+    n = len(X)
+    nlist = max(1, min(nlist or int(4 * np.sqrt(n)), n))
+    rng = np.random.default_rng(SEED)
+
+    centroids = kmeans(X, nlist, rng)
+    assign = _nearest_centroid(X, centroids)
+    order = np.argsort(assign, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+
+    codes = np.empty((n, X.shape[1]), dtype=np.int8)
+    scales = np.empty(n, dtype=np.float32)
+    for start in range(0, n, ASSIGN_BLOCK_ROWS):
+        rows = order[start:start + ASSIGN_BLOCK_ROWS]
+        residual = np.asarray(X[rows]) - centroids[assign[rows]]
+        scale = np.abs(residual).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        codes[start:start + len(rows)] = np.clip(np.rint(residual / scale[:, None]), -127, 127)
+        scales[start:start + len(rows)] = scale
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    np.save(out_dir / "centroids.npy", centroids)
+    np.save(out_dir / "offsets.npy", offsets)
+    np.save(out_dir / "codes.npy", codes)
+    np.save(out_dir / "scales.npy", scales)
+    np.save(out_dir / "rows.npy", order.astype(np.int64))
+    np.save(out_dir / "price_min.npy", emb.price_min[order])
+    np.save(out_dir / "price_max.npy", emb.price_max[order])
+    np.save(out_dir / "active.npy", emb.active[order])
+    meta = {"rows": int(n), "dim": int(X.shape[1]), "nlist": int(nlist), "quantizer": "int8-residual"}
+    (out_dir / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    sizes = np.diff(offsets)
+    print(f"Indexed {n} vectors into {nlist} lists (sizes {sizes.min()}-{sizes.max()}, "
+          f"median {int(np.median(sizes))}) in {time.perf_counter() - started:.1f}s -> {out_dir}")
+
+
+class IVFIndex:
+    def __init__(self, out_dir: Path = INDEX_DIR):
+        meta_path = out_dir / "meta.json"
+        if not meta_path.exists():
+            raise SystemExit(f"No index in {out_dir}; run: python ml/ann_index.py build")
+        self.meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        self.centroids = np.load(out_dir / "centroids.npy")
+        self.half_norms = 0.5 * np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self.offsets = np.load(out_dir / "offsets.npy")
+        load = lambda name: np.load(out_dir / f"{name}.npy", mmap_mode="r")
+        self.codes = load("codes")
+        self.scales = load("scales")
+        self.rows = load("rows")
+        self.price_min = load("price_min")
+        self.price_max = load("price_max")
+        self.active = load("active")
+
+    def search(self, query: np.ndarray, k: int = 30, nprobe: int = 8, budget=None):
+        """(embedding row indices, approximate scores) of the top k, best first."""
+        nprobe = min(nprobe, len(self.centroids))
+        closeness = self.centroids @ query - self.half_norms
+        lists = np.argpartition(-closeness, nprobe - 1)[:nprobe]
+        base = self.centroids[lists] @ query
+
+        # Gather the probed lists' row ranges in one index array (sorted for memmap locality)
+        by_start = np.argsort(self.offsets[lists])
+        lists, base = lists[by_start], base[by_start]
+        starts, lengths = self.offsets[lists], self.offsets[lists + 1] - self.offsets[lists]
+        first = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        idx = np.arange(lengths.sum()) + np.repeat(starts - first, lengths)
+        centroid_scores = np.repeat(base, lengths)
+
+        keep = np.asarray(self.active[idx])
+        if budget is not None:
+            keep &= (np.asarray(self.price_max[idx]) >= budget[0]) & (np.asarray(self.price_min[idx]) <= budget[1])
+        idx, centroid_scores = idx[keep], centroid_scores[keep]
+        if not len(idx):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = centroid_scores + self.scales[idx] * (self.codes[idx].astype(np.float32) @ query)
+        rows = np.asarray(self.rows[idx])
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+
+def bench(num_queries: int, k: int, nprobes: list):
+    """Recall@k and latency per nprobe vs exact search, over random quiz profiles with budgets."""
+    from generate_training_data import random_profile
+
+    emb = ProductEmbeddings()
+    index = IVFIndex()
+    random.seed(SEED)
+    profiles = [random_profile() for _ in range(num_queries)]
+    queries = emb.embed([profile_text(p["derived_tags"]) for p in profiles])
+    budgets = [(p["budget_min"], p["budget_max"]) for p in profiles]
+
+    exact, exact_ms = [], []
+    for q, budget in zip(queries, budgets):
+        t0 = time.perf_counter()
+        idx, scores = emb.search_vectors(q[None, :], k, budget)
+        exact_ms.append((time.perf_counter() - t0) * 1000)
+        exact.append(set(idx[0][np.isfinite(scores[0])].tolist()))
+
+    print(f"{len(emb.ids)} products, {len(index.centroids)} lists, {num_queries} queries, k={k}")
+    print(f"{'nprobe':>8}{'recall@k':>10}{'mean ms':>10}{'p95 ms':>10}")
+    print(f"{'exact':>8}{1.0:>10.3f}{np.mean(exact_ms):>10.2f}{np.percentile(exact_ms, 95):>10.2f}")
+    report = []
+    for nprobe in nprobes:
+        recalls, times = [], []
+        for q, budget, truth in zip(queries, budgets, exact):
+            t0 = time.perf_counter()
+            rows, _ = index.search(q, k, nprobe, budget)
+            times.append((time.perf_counter() - t0) * 1000)
+            if truth:
+                recalls.append(len(truth.intersection(rows.tolist())) / len(truth))
+        recall = float(np.mean(recalls)) if recalls else 1.0
+        report.append({"nprobe": nprobe, "recall": recall, "mean_ms": float(np.mean(times)),
+                       "p95_ms": float(np.percentile(times, 95))})
+        print(f"{nprobe:>8}{recall:>10.3f}{np.mean(times):>10.2f}{np.percentile(times, 95):>10.2f}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or benchmark the IVF product index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="cluster and quantise ml/embeddings/")
+    b.add_argument("--nlist", type=int, default=None, help="inverted lists (default: 4 * sqrt(rows))")
+    r = sub.add_parser("bench", help="recall/latency vs exact search")
+    r.add_argument("--queries", type=int, default=200)
+    r.add_argument("-k", type=int, default=30)
+    r.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args.nlist)
+    else:
+        bench(args.queries, args.k, args.nprobe)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Budget-ordered candidate filtering for a batch of profiles (generate_training_data.py --sweep-batch N).
+
+candidates_for() rescans every price bucket up to budget_max for each profile. Here a batch of
+profiles is sorted by budget_max and swept once over the catalog sorted by price_min:
+  - a pointer adds each product once, when budget_max first reaches its price_min
+  - active products are grouped by price_max, so the products with price_max >= budget_min
+    are the groups from bisect(budget_min) onwards
+Filtering a batch costs one pass over the catalog plus the size of the candidate lists, not
+profiles x catalog.
+
+Each profile's candidates are put in candidates_for() order (price bucket, then catalog order),
+and the lists are returned in the batch's original profile order. Scoring and negative sampling
+then run in the usual order, so the output is identical to the unbatched run.
+"""
+
+import bisect
+
+PRICE_BUCKET = 10  # bucket width (USD) of bucket_products() in generate_training_data.py
+
+
+class BudgetSweep:
+    def __init__(self, products: list):
+        # Global position in candidates_for() order: price bucket, then catalog order
+        order = sorted(range(len(products)), key=lambda i: (products[i]["price_min"] // PRICE_BUCKET, i))
+        self.by_rank = [products[i] for i in order]
+        # Ranks by price_min; active groups hold ranks, so each candidate list is a plain int sort
+        self.by_price_min = sorted(range(len(order)), key=lambda r: self.by_rank[r]["price_min"])
+
+    def candidates(self, profiles: list) -> list:
+        """Candidate lists for profiles, in the same order as the profiles."""
+        order = sorted(range(len(profiles)), key=lambda i: profiles[i]["budget_max"])
+        active = {}  # price_max -> ranks of the products added so far
+        price_maxes = []  # sorted keys of active
+        nxt = 0
+        out = [None] * len(profiles)
+        by_rank, by_price_min = self.by_rank, self.by_price_min
+        for i in order:
+            budget_min, budget_max = profiles[i]["budget_min"], profiles[i]["budget_max"]
+            while nxt < len(by_price_min) and by_rank[by_price_min[nxt]]["price_min"] <= budget_max:
+                r = by_price_min[nxt]
+                price_max = by_rank[r]["price_max"]
+                group = active.get(price_max)
+                if group is None:
+                    group = active[price_max] = []
+                    bisect.insort(price_maxes, price_max)
+                group.append(r)
+                nxt += 1
+            found = []
+            for price_max in price_maxes[bisect.bisect_left(price_maxes, budget_min):]:
+                found.extend(active[price_max])
+            found.sort()
+            out[i] = [by_rank[r] for r in found]
+        return out
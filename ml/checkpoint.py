@@ -0,0 +1,101 @@
+"""
+Checkpoints for resumable training-data generation (generate_training_data.py --resume).
+
+A checkpoint directory holds:
+  profiles.json  the run's profile list, written once at the start
+  state.json     progress: next profile index (CSV) or finished shards, RNG state, output
+                 byte offset and row count, plus the seed and a run fingerprint
+
+The fingerprint covers the feature layout, the catalog file (size, mtime and SHA-256) and the
+options that decide the output (seed, profile count, mode, shard count), so a resume against a
+changed catalog or with other options is refused instead of mixing two datasets.
+
+state.json is replaced atomically after the output has been flushed and fsynced, so it never
+points past data that is on disk. Resuming truncates the output back to the recorded offset,
+restores the RNG and continues; the result is byte-identical to an uninterrupted run.
+"""
+
+import hashlib
+import json
+import os
+import random
+import shutil
+from pathlib import Path
+
+from shards import file_sha256
+
+CHECKPOINT_VERSION = 1
+
+
+def _profile_to_json(profile: dict) -> dict:
+    return {**profile, "derived_tags": sorted(profile["derived_tags"])}
+
+
+def _profile_from_json(data: dict) -> dict:
+    return {**data, "derived_tags": set(data["derived_tags"])}
+
+
+def rng_state_to_json(state: tuple) -> list:
+    version, internal, gauss_next = state
+    return [version, list(internal), gauss_next]
+
+
+def rng_state_from_json(data: list) -> tuple:
+    version, internal, gauss_next = data
+    return (version, tuple(internal), gauss_next)
+
+
+def fingerprint(spec: dict, catalog: Path, **options) -> str:
+    """Identifies the feature layout, catalog file and generation options a checkpoint was written for."""
+    stat = catalog.stat()
+    key = json.dumps([spec["feature_names"], spec["category_list"],
+                      [stat.st_size, stat.st_mtime_ns, file_sha256(catalog)], sorted(options.items())],
+                     separators=(",", ":"))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+class Checkpoint:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.state_path = directory / "state.json"
+        self.profiles_path = directory / "profiles.json"
+
+    def exists(self) -> bool:
+        return self.state_path.exists() and self.profiles_path.exists()
+
+    def start(self, profiles: list, state: dict):
+        """Begin a fresh run: discard any old checkpoint, store the profiles and initial state."""
+        self.clear()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.profiles_path.write_text(json.dumps([_profile_to_json(p) for p in profiles]), encoding="utf-8")
+        self.save(state)
+
+    def save(self, state: dict):
+        tmp = self.state_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CHECKPOINT_VERSION, **state}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_path)
+
+    def load(self, expected_fingerprint: str):
+        """(profiles, state) of the saved run; SystemExit if it was written for another catalog."""
+        state = json.loads(self.state_path.read_text(encoding="utf-8"))
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise SystemExit(f"Checkpoint {self.state_path} has an unsupported version; rerun without --resume")
+        if state.get("fingerprint") != expected_fingerprint:
+            raise SystemExit("Catalog, feature spec or generation options changed since the checkpoint was written; "
+                             "rerun with the same --seed / --shards, or without --resume")
+        profiles = [_profile_from_json(p) for p in json.loads(self.profiles_path.read_text(encoding="utf-8"))]
+        return profiles, state
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def capture_rng(rng=random) -> list:
+    return rng_state_to_json(rng.getstate())
+
+
+def restore_rng(data: list, rng=random):
+    rng.setstate(rng_state_from_json(data))
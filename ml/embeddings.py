@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Offline product embeddings for semantic candidate retrieval.
+
+build: hashed TF-IDF over title, description, tags and category, reduced with a randomized
+SVD to --dim dimensions and L2-normalised. Vectors are stored as a float32 memory-mapped
+matrix (ml/embeddings/vectors.f32) row-aligned with ids.npy, next to the price/active
+columns and the projection needed to embed queries.
+
+query: a quiz profile (or free text) is embedded with the same projection and scored
+against every product in one matrix multiply; top-k via argpartition.
+
+Run from project root:
+  python ml/embeddings.py build [--dim 64]
+  python ml/embeddings.py query "gaming birthday friend" --budget 10 60 -k 10
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.utils.extmath import randomized_svd
+
+ML_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = ML_DIR.parent
+PRODUCTS_CSV = PROJECT_ROOT / "prisma" / "products.csv"
+EMBEDDINGS_DIR = ML_DIR / "embeddings"
+
+HASH_FEATURES = 1 << 18
+DEFAULT_DIM = 64
+SEED = 42
+QUERY_BLOCK_ROWS = 65536  # products scored per block (bounds the score buffer)
+
+
+def _vectorizer() -> HashingVectorizer:
+    return HashingVectorizer(n_features=HASH_FEATURES, alternate_sign=False, norm=None, dtype=np.float32)
+
+
+def product_text(row: dict) -> str:
+    tags = (row.get("tags") or "").replace("|", " ")
+    category = (row.get("category") or "").replace("|", " ")
+    return " ".join([row.get("title") or "", row.get("description") or "", tags, category])
+
+
+def profile_text(profile_tags) -> str:
+    """Derived tags ("baby-shower", "remote_worker") as query text."""
+    return " ".join(str(t).replace("_", " ").replace("-", " ") for t in profile_tags)
+
+
+def read_catalog(path: Path):
+    ids, texts, price_min, price_max, active = [], [], [], [], []
+    csv.field_size_limit(sys.maxsize)
+    with open(path, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if not row.get("id"):
+                continue
+            ids.append(row["id"])
+            texts.append(product_text(row))
+            price_min.append(int(row.get("price_min") or 0))
+            price_max.append(int(row.get("price_max") or 0))
+            active.append((row.get("active") or "true").strip().lower() != "false")
+    return ids, texts, np.array(price_min, dtype=np.int32), np.array(price_max, dtype=np.int32), np.array(active)
+
+
+def build(products_csv: Path = PRODUCTS_CSV, out_dir: Path = EMBEDDINGS_DIR, dim: int = DEFAULT_DIM):
+    started = time.perf_counter()
+    ids, texts, price_min, price_max, active = read_catalog(products_csv)
+    if not ids:
+        raise SystemExit(f"No products in {products_csv}")
+
+    counts = _vectorizer().transform(texts)
+    # Smoothed idf, as in sklearn's TfidfTransformer
+    df = np.bincount(counts.indices, minlength=HASH_FEATURES).astype(np.float32)
+    idf = (np.log((1 + len(ids)) / (1 + df)) + 1).astype(np.float32)
+    tfidf = normalize(counts.multiply(idf).tocsr())
+
+    # Hash buckets no product uses have all-zero components; keep only the used columns
+    used = np.flatnonzero(df).astype(np.int32)
+    tfidf = tfidf[:, used]
+    dim = min(dim, min(tfidf.shape) - 1)
+    _, _, components = randomized_svd(tfidf, n_components=dim, random_state=SEED)
+    components = components.astype(np.float32)
+    vectors = normalize(np.asarray(tfidf @ components.T, dtype=np.float32))
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    mm = np.memmap(out_dir / "vectors.f32", dtype=np.float32, mode="w+", shape=vectors.shape)
+    mm[:] = vectors
+    mm.flush()
+    del mm
+    np.save(out_dir / "ids.npy", np.array(ids, dtype=str))
+    np.save(out_dir / "price_min.npy", price_min)
+    np.save(out_dir / "price_max.npy", price_max)
+    np.save(out_dir / "active.npy", active)
+    np.save(out_dir / "idf.npy", idf[used])
+    np.save(out_dir / "columns.npy", used)
+    np.save(out_dir / "components.npy", components)
+    meta = {"rows": len(ids), "dim": int(dim), "hash_features": HASH_FEATURES, "source": str(products_csv.name)}
+    (out_dir / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    print(f"Embedded {len(ids)} products into {dim} dims in {time.perf_counter() - started:.1f}s -> {out_dir}")
+
+
+class ProductEmbeddings:
+    """Memory-mapped product vectors plus the projection used to embed queries."""
+
+    def __init__(self, out_dir: Path = EMBEDDINGS_DIR):
+        meta_path = out_dir / "meta.json"
+        if not meta_path.exists():
+            raise SystemExit(f"No embeddings in {out_dir}; run: python ml/embeddings.py build")
+        self.meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        self.vectors = np.memmap(out_dir / "vectors.f32", dtype=np.float32, mode="r",
+                                 shape=(self.meta["rows"], self.meta["dim"]))
+        self.ids = np.load(out_dir / "ids.npy")
+        self.price_min = np.load(out_dir / "price_min.npy")
+        self.price_max = np.load(out_dir / "price_max.npy")
+        self.active = np.load(out_dir / "active.npy")
+        self.idf = np.load(out_dir / "idf.npy")
+        self.columns = np.load(out_dir / "columns.npy")
+        self.components = np.load(out_dir / "components.npy", mmap_mode="r")
+        self._vectorizer = _vectorizer()
+
+    def embed(self, texts: list) -> np.ndarray:
+        """(len(texts), dim) float32 unit vectors in the product space."""
+        counts = self._vectorizer.transform(texts).tocsc()[:, self.columns]
+        tfidf = normalize(counts.multiply(self.idf).tocsr())
+        return normalize(np.asarray(tfidf @ np.asarray(self.components).T, dtype=np.float32))
+
+    def allowed(self, budget=None) -> np.ndarray:
+        """Active products whose price range overlaps budget (same rule as the generator)."""
+        mask = self.active.copy()
+        if budget is not None:
+            lo, hi = budget
+            mask &= (self.price_max >= lo) & (self.price_min <= hi)
+        return mask
+
+    def search_vectors(self, queries: np.ndarray, k: int = 30, budget=None):
+        """Top-k (indices, scores) per query row: one matrix multiply per block of products."""
+        n = len(self.ids)
+        k = min(k, n)
+        mask = self.allowed(budget)
+        best_idx = np.empty((len(queries), 0), dtype=np.int64)
+        best_score = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, n, QUERY_BLOCK_ROWS):
+            stop = min(n, start + QUERY_BLOCK_ROWS)
+            scores = queries @ np.asarray(self.vectors[start:stop]).T
+            scores[:, ~mask[start:stop]] = -np.inf
+            idx = np.broadcast_to(np.arange(start, stop), scores.shape)
+            best_idx = np.concatenate([best_idx, idx], axis=1)
+            best_score = np.concatenate([best_score, scores], axis=1)
+            if best_score.shape[1] > k:
+                top = np.argpartition(-best_score, k - 1, axis=1)[:, :k]
+                best_idx = np.take_along_axis(best_idx, top, axis=1)
+                best_score = np.take_along_axis(best_score, top, axis=1)
+        order = np.argsort(-best_score, axis=1, kind="stable")
+        return np.take_along_axis(best_idx, order, axis=1), np.take_along_axis(best_score, order, axis=1)
+
+    def search(self, texts: list, k: int = 30, budget=None) -> list:
+        """[(product_id, score), ...] per query text, best first; filtered-out products are dropped."""
+        idx, scores = self.search_vectors(self.embed(texts), k, budget)
+        return [
+            [(str(self.ids[i]), float(s)) for i, s in zip(row_idx, row_scores) if np.isfinite(s)]
+            for row_idx, row_scores in zip(idx, scores)
+        ]
+
+    def search_profile(self, profile_tags, k: int = 30, budget=None) -> list:
+        return self.search([profile_text(profile_tags)], k, budget)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query offline product embeddings.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="embed prisma/products.csv")
+    b.add_argument("--products", type=Path, default=PRODUCTS_CSV)
+    b.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    q = sub.add_parser("query", help="top-k products for a text or profile tags")
+    q.add_argument("text")
+    q.add_argument("-k", type=int, default=10)
+    q.add_argument("--budget", type=int, nargs=2, metavar=("MIN", "MAX"), default=None)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args.products, dim=args.dim)
+        return
+    emb = ProductEmbeddings()
+    started = time.perf_counter()
+    results = emb.search([profile_text(args.text.split())], args.k, args.budget)[0]
+    elapsed = (time.perf_counter() - started) * 1000
+    for pid, score in results:
+        print(f"{score:.4f}  {pid}")
+    print(f"{len(results)} results in {elapsed:.1f} ms over {len(emb.ids)} products")
+
+
+if __name__ == "__main__":
+    main()
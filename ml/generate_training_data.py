@@ -4,17 +4,38 @@ Generate training data: (profile, product) pairs with label 1=recommended, 0=not
 Uses same keyword scoring logic as the app's retrieval to create labels.
 Output: ml/training_data.csv and ml/feature_spec.json (with category list).
 Run from project root: python ml/generate_training_data.py
+Sharded output: python ml/generate_training_data.py --shards 16 (ml/training_shards/, see shards.py)
+Interrupted runs: rerun with --resume to continue from ml/.generate_checkpoint/ (see checkpoint.py)
+Time-budgeted runs: python ml/generate_training_data.py --time-budget 60 adds profiles until the budget
+is spent, samples negatives per category / price-band stratum and writes a sample_weight column plus
+ml/training_coverage.json (see stratified.py)
 """
 
+import argparse
 import csv
 import json
+import os
 import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
+from budget_sweep import BudgetSweep
+from checkpoint import Checkpoint, capture_rng, fingerprint, restore_rng
+from shards import SHARD_DIR, file_sha256, write_manifest, write_shard
+from score_cache import DEFAULT_MAX_MB, ScoreCache
+from stratified import Coverage, sample_negatives
+from tag_bitset import TagBitsetEngine
+from term_automaton import TermMatcher
+
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 PRODUCTS_CSV = PROJECT_ROOT / "prisma" / "products.csv"
 OUTPUT_CSV = Path(__file__).resolve().parent / "training_data.csv"
 SPEC_PATH = Path(__file__).resolve().parent / "feature_spec.json"
+COVERAGE_JSON = Path(__file__).resolve().parent / "training_coverage.json"
+CHECKPOINT_DIR = Path(__file__).resolve().parent / ".generate_checkpoint"
+CHECKPOINT_EVERY = 100  # profiles between checkpoints (CSV mode)
+SWEEP_BATCH = 1000  # profiles whose candidates are filtered in one budget-ordered sweep
 NUM_PROFILES = 500  # more profiles for better ML coverage
 TOP_POSITIVE = 6
 NEGATIVE_PER_PROFILE = 20  # negatives per profile (balanced with positives)
@@ -32,6 +53,9 @@ INTEREST_POOL = [
     "movies", "sports", "yoga", "gardening", "food", "wellness", "home", "office",
 ]
 
+# Every tag random_profile can put in derived_tags (bit positions for TagBitsetEngine)
+PROFILE_VOCABULARY = OCCASIONS + RELATIONSHIPS + AGE_RANGES + DAILY_LIFE + INTEREST_POOL
+
 
 def load_products():
     rows = []
@@ -66,6 +90,23 @@ def score_product(profile_tags: set, product: dict) -> int:
     return score
 
 
+def score_product_bits(engine: TagBitsetEngine, mask: int, extras: list, profile_tags: set, product: dict) -> int:
+    """score_product using precomputed bitsets (product annotated by engine and TermMatcher).
+
+    mask has the same bit order as title_terms / category_terms, so title and category
+    matches are popcounts; only tags outside the vocabulary (extras) are searched directly.
+    """
+    score = 3 * engine.overlap(mask, extras, product)
+    score += 2 * (mask & product["title_terms"]).bit_count()
+    score += 2 * (mask & product["category_terms"]).bit_count()
+    for tag in extras:
+        if tag in product["title"]:
+            score += 2
+        if tag in product["category"]:
+            score += 2
+    return score
+
+
 def random_profile(occasion=None, relationship=None, age_range=None):
     occasion = occasion or random.choice(OCCASIONS)
     relationship = relationship or random.choice(RELATIONSHIPS)
@@ -83,6 +124,8 @@ def random_profile(occasion=None, relationship=None, age_range=None):
         "budget_max": budget_max,
         "interest_count": len(interests),
         "daily_life_count": len(daily_life),
+        "interests": interests,
+        "daily_life": daily_life,
         "derived_tags": derived,
     }
 
@@ -111,7 +154,7 @@ def tag_overlap(profile_tags: set, product_tags: list) -> int:
     return sum(1 for t in profile_tags if any(t in x or x in t for x in pt))
 
 
-def extract_features(profile: dict, product: dict, category_list: list, spec: dict):
+def extract_features(profile: dict, product: dict, category_list: list, spec: dict, overlap=None):
     occ = spec["occasion_values"].index(profile["occasion"]) if profile["occasion"] in spec["occasion_values"] else 0
     rel = spec["relationship_values"].index(profile["relationship"]) if profile["relationship"] in spec["relationship_values"] else 0
     age = spec["age_range_values"].index(profile["age_range"]) if profile["age_range"] in spec["age_range_values"] else 0
@@ -128,7 +171,8 @@ def extract_features(profile: dict, product: dict, category_list: list, spec: di
     cat_id = category_to_id(product.get("category") or "", category_list)
     price_min_norm = min(1.0, (product.get("price_min") or 0) / spec["price_max_norm"])
     price_max_norm = min(1.0, (product.get("price_max") or 0) / spec["price_max_norm"])
-    overlap = tag_overlap(profile["derived_tags"], product.get("tags") or [])
+    if overlap is None:
+        overlap = tag_overlap(profile["derived_tags"], product.get("tags") or [])
     tag_overlap_norm = min(1.0, overlap / spec["max_tag_overlap"])
     price_in_budget = 1 if (product.get("price_max", 0) >= profile["budget_min"] and product.get("price_min", 999) <= profile["budget_max"]) else 0
 
@@ -140,16 +184,7 @@ def extract_features(profile: dict, product: dict, category_list: list, spec: di
     return feats
 
 
-def main():
-    spec = json.loads(SPEC_PATH.read_text(encoding="utf-8"))
-    products = load_products()
-    category_list = build_category_list(products)
-    spec["category_list"] = category_list
-    SPEC_PATH.write_text(json.dumps(spec, indent=2), encoding="utf-8")
-
-    feature_names = spec["feature_names"]
-    rows = [feature_names + ["product_id", "label"]]
-
+def build_profiles() -> list:
     if STRATIFY_BY_OCCASION:
         profiles_per_occasion = max(1, NUM_PROFILES // len(OCCASIONS))
         profile_batches = []
@@ -159,7 +194,10 @@ def main():
         random.shuffle(profile_batches)
     else:
         profile_batches = [random_profile() for _ in range(NUM_PROFILES)]
+    return profile_batches
+
 
+def bucket_products(products) -> dict:
     # Sort products by price_min to optimize filtering? 
     # Actually just iterating 550k items 6000 times is 3e9 ops. 
     # In Python that takes minutes. Let's try to reduce overhead.
@@ -169,77 +207,338 @@ def main():
         bucket = p["price_min"] // 10
         if bucket not in products_by_price: products_by_price[bucket] = []
         products_by_price[bucket].append(p)
-    
-    max_price_bucket = max(products_by_price.keys()) if products_by_price else 0
+    return products_by_price
 
-    print(f"Generating data for {len(profile_batches)} profiles...")
-    count = 0
-    for profile in profile_batches:
-        # subset products: price_max >= budget_min AND price_min <= budget_max
-        # Approximation: iterate buckets that overlap with [budget_min, budget_max]
-        # But we need check p["price_max"] >= budget_min too.
-        # Most products have p["price_max"] >= p["price_min"].
-        # If we check buckets p["price_min"] <= budget_max.
-        
-        start_bucket = 0 # Any product could potentially have max_price >= budget_min
-        end_bucket = profile["budget_max"] // 10
-        
-        candidate_products = []
-        for b in range(end_bucket + 1):
-            if b in products_by_price:
-                # Secondary filter
-                for p in products_by_price[b]:
-                     if p["price_max"] >= profile["budget_min"] and p["price_min"] <= profile["budget_max"]:
-                         candidate_products.append(p)
-        
-        # If candidates too few, maybe broaden search or skip
-        if len(candidate_products) < TOP_POSITIVE + 5:
-            continue
-            
-        # Scoring
-        # Optimization: only score if candidate count is manageable? 
-        # If candidate_products is huge (e.g. 50k), scoring all is slow.
-        # But we need top K.
-        # We can sample a subset if too large? 
-        # But we want the BEST recommendations.
-        # Let's just score them.
-        
-        # Using a heap could be faster than full sort if we only need top K?
-        # But we assume the list isn't astronomically large (filtered by budget).
-        
-        scored = [(score_product(profile["derived_tags"], p), p) for p in candidate_products]
-        # Sort by score desc, then random (shuffle to break ties?)
-        # For determinism/quality, improved sort:
-        scored.sort(key=lambda x: -x[0])
-        
-        # Top positives
-        for i in range(min(TOP_POSITIVE, len(scored))):
-            p = scored[i][1]
-            if scored[i][0] > 0: # Only positive if score > 0? No, logic says top K.
-                feats = extract_features(profile, p, category_list, spec)
-                rows.append([*feats, p["id"], 1])
-        
-        # Negatives (sample from the rest)
-        start_neg = TOP_POSITIVE
-        num_neg_candidates = len(scored) - start_neg
-        if num_neg_candidates > 0:
-            num_to_pick = min(NEGATIVE_PER_PROFILE, num_neg_candidates)
-            # Efficient sampling without creating new list
-            indices = random.sample(range(start_neg, len(scored)), num_to_pick)
-            for idx in indices:
-                p = scored[idx][1]
-                feats = extract_features(profile, p, category_list, spec)
-                rows.append([*feats, p["id"], 0])
-        
-        count += 1
-        if count % 100 == 0:
-            print(f"Processed {count} profiles...", end='\r')
+
+def candidates_for(profile: dict, products_by_price: dict) -> list:
+    # subset products: price_max >= budget_min AND price_min <= budget_max
+    # Approximation: iterate buckets that overlap with [budget_min, budget_max]
+    # But we need check p["price_max"] >= budget_min too.
+    # Most products have p["price_max"] >= p["price_min"].
+    # If we check buckets p["price_min"] <= budget_max.
+    end_bucket = profile["budget_max"] // 10
+
+    candidate_products = []
+    for b in range(end_bucket + 1):
+        if b in products_by_price:
+            # Secondary filter
+            for p in products_by_price[b]:
+                 if p["price_max"] >= profile["budget_min"] and p["price_min"] <= profile["budget_max"]:
+                     candidate_products.append(p)
+    return candidate_products
+
+
+def iter_candidates(profiles: list, products_by_price: dict, start: int = 0, sweep: BudgetSweep = None,
+                    batch: int = SWEEP_BATCH):
+    """Yield (index, profile, candidates) from start on; with a sweep, candidates are filtered batch by batch."""
+    if sweep is None:
+        for i in range(start, len(profiles)):
+            yield i, profiles[i], candidates_for(profiles[i], products_by_price)
+        return
+    for block_start in range(start, len(profiles), batch):
+        block = profiles[block_start:block_start + batch]
+        for offset, candidates in enumerate(sweep.candidates(block)):
+            yield block_start + offset, block[offset], candidates
+
+
+def rank_candidates(profile: dict, candidate_products: list, engine: TagBitsetEngine, cache: ScoreCache = None):
+    """(mask, extras, [(score, product)] sorted by score desc, stable on ties); scores come from cache if given."""
+    tags = profile["derived_tags"]
+    mask, extras = engine.profile_mask(tags)
+    if cache is None:
+        scores = [score_product_bits(engine, mask, extras, tags, p) for p in candidate_products]
+    else:
+        scores = cache.scores(tags, candidate_products, mask, extras)
+    scored = list(zip(scores, candidate_products))
+    scored.sort(key=lambda x: -x[0])
+    return mask, extras, scored
+
+
+def profile_rows(profile: dict, candidate_products: list, engine: TagBitsetEngine, category_list: list, spec: dict,
+                 rng=random, cache: ScoreCache = None):
+    """Labelled rows for one profile, or None if it has too few candidates. rng draws the negatives."""
+    # If candidates too few, maybe broaden search or skip
+    if len(candidate_products) < TOP_POSITIVE + 5:
+        return None
+
+    # Scoring
+    # Using a heap could be faster than full sort if we only need top K?
+    # But we assume the list isn't astronomically large (filtered by budget).
+    mask, extras, scored = rank_candidates(profile, candidate_products, engine, cache)
+
+    rows = []
+    # Top positives
+    for i in range(min(TOP_POSITIVE, len(scored))):
+        p = scored[i][1]
+        if scored[i][0] > 0: # Only positive if score > 0? No, logic says top K.
+            feats = extract_features(profile, p, category_list, spec, engine.overlap(mask, extras, p))
+            rows.append([*feats, p["id"], 1])
+
+    # Negatives (sample from the rest)
+    start_neg = TOP_POSITIVE
+    num_neg_candidates = len(scored) - start_neg
+    if num_neg_candidates > 0:
+        num_to_pick = min(NEGATIVE_PER_PROFILE, num_neg_candidates)
+        # Efficient sampling without creating new list
+        indices = rng.sample(range(start_neg, len(scored)), num_to_pick)
+        for idx in indices:
+            p = scored[idx][1]
+            feats = extract_features(profile, p, category_list, spec, engine.overlap(mask, extras, p))
+            rows.append([*feats, p["id"], 0])
+    return rows
+
+
+def stratified_profile_rows(profile: dict, candidate_products: list, engine: TagBitsetEngine, category_list: list,
+                            spec: dict, coverage: Coverage, rng=random, cache: ScoreCache = None):
+    """Like profile_rows, but negatives are drawn per stratum and every row ends with its sample weight."""
+    if len(candidate_products) < TOP_POSITIVE + 5:
+        return None
+    mask, extras, scored = rank_candidates(profile, candidate_products, engine, cache)
+    coverage.add_candidates(candidate_products)
+
+    rows = []
+    for score, p in scored[:TOP_POSITIVE]:
+        if score > 0:
+            feats = extract_features(profile, p, category_list, spec, engine.overlap(mask, extras, p))
+            rows.append([*feats, p["id"], 1, 1.0])
+            coverage.add_row(p, 1, 1.0)
+    for p, weight in sample_negatives([p for _, p in scored[TOP_POSITIVE:]], NEGATIVE_PER_PROFILE, rng):
+        feats = extract_features(profile, p, category_list, spec, engine.overlap(mask, extras, p))
+        rows.append([*feats, p["id"], 0, round(weight, 6)])
+        coverage.add_row(p, 0, weight)
+    return rows
+
+
+def load_catalog():
+    """Products annotated with tag and title/category term bitsets, the tag engine and the price buckets."""
+    products = load_products()
+    engine = TagBitsetEngine(PROFILE_VOCABULARY)
+    engine.annotate(products)
+    TermMatcher(PROFILE_VOCABULARY).annotate(products)
+    return products, engine, bucket_products(products)
+
+
+# Per-process state for sharded generation (loaded once by each worker)
+_worker = {}
+
+
+def _init_shard_worker(cache_bytes: int = 0, sweep_batch: int = 0):
+    spec = json.loads(SPEC_PATH.read_text(encoding="utf-8"))
+    products, engine, products_by_price = load_catalog()
+    cache = ScoreCache(products, engine, score_product_bits, cache_bytes) if cache_bytes > 0 else None
+    sweep = BudgetSweep(products) if sweep_batch > 0 else None
+    _worker.update(spec=spec, engine=engine, products_by_price=products_by_price, cache=cache, sweep=sweep,
+                   sweep_batch=sweep_batch)
+
+
+def _generate_shard(task):
+    index, profiles, seed, shard_dir = task
+    spec = _worker["spec"]
+    rng = random.Random(seed)
+    rows = []
+    for _, profile, candidates in iter_candidates(profiles, _worker["products_by_price"], sweep=_worker["sweep"],
+                                                  batch=_worker["sweep_batch"]):
+        profile_out = profile_rows(profile, candidates, _worker["engine"], spec["category_list"], spec, rng,
+                                   _worker["cache"])
+        if profile_out is not None:
+            rows.extend(profile_out)
+    entry = write_shard(shard_dir, index, rows, len(spec["feature_names"]))
+    entry["profiles"] = len(profiles)
+    return entry
+
+
+def generate_shards(profile_batches: list, spec: dict, num_shards: int, workers: int, seed: int, shard_dir: Path,
+                    checkpoint: Checkpoint = None, state: dict = None, cache_mb: int = 0, sweep_batch: int = 0):
+    """Write profile_batches as num_shards .npz shards in parallel, then the manifest.
+
+    With a checkpoint, each finished shard is recorded in state["done"]; shards already listed
+    there (and still intact on disk) are kept instead of regenerated.
+    """
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    done = {}
+    for key, entry in ((state or {}).get("done") or {}).items():
+        path = shard_dir / entry["file"]
+        if path.exists() and file_sha256(path) == entry["sha256"]:
+            done[int(key)] = entry
+    keep = {entry["file"] for entry in done.values()}
+    for old in shard_dir.glob("shard-*.npz"):
+        if old.name not in keep:
+            old.unlink()
+    per_shard = -(-len(profile_batches) // num_shards)
+    tasks = [
+        (i, profile_batches[i * per_shard:(i + 1) * per_shard], seed * 1_000_003 + i, shard_dir)
+        for i in range(num_shards) if i not in done
+    ]
+    if done:
+        print(f"Resuming: {len(done)} of {num_shards} shards already written")
+    workers = workers or os.cpu_count() or 1
+    # --score-cache-mb is the total across the worker processes
+    initargs = ((cache_mb << 20) // workers, sweep_batch)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker, initargs=initargs) as pool:
+        futures = {pool.submit(_generate_shard, task): task[0] for task in tasks}
+        for future in as_completed(futures):
+            entry = future.result()
+            done[futures[future]] = entry
+            if checkpoint is not None:
+                checkpoint.save({**state, "done": {str(i): e for i, e in done.items()}})
+            print(f"Wrote {entry['file']}: {entry['rows']} rows", end="\r")
     print()
+    manifest = write_manifest(shard_dir, list(done.values()), spec["feature_names"], seed=seed)
+    print(f"Wrote {manifest['total_rows']} training rows in {len(done)} shards to {shard_dir}")
+
+
+def generate_csv(profile_batches: list, engine: TagBitsetEngine, products_by_price: dict, spec: dict,
+                 checkpoint: Checkpoint, state: dict, checkpoint_every: int, cache: ScoreCache = None,
+                 sweep: BudgetSweep = None, sweep_batch: int = SWEEP_BATCH):
+    """Stream rows to OUTPUT_CSV (via a .partial file), checkpointing every checkpoint_every profiles."""
+    feature_names = spec["feature_names"]
+    category_list = spec["category_list"]
+    partial = OUTPUT_CSV.with_name(OUTPUT_CSV.name + ".partial")
+    if state["next_profile"] > 0:
+        # Drop rows written after the last checkpoint; they are regenerated from the saved RNG state
+        with open(partial, "r+b") as f:
+            f.truncate(state["offset"])
+        print(f"Resuming at profile {state['next_profile']} of {len(profile_batches)} ({state['rows']} rows kept)")
+    f = open(partial, "a" if state["next_profile"] > 0 else "w", newline="", encoding="utf-8")
+    with f:
+        writer = csv.writer(f)
+        if state["next_profile"] == 0:
+            writer.writerow(feature_names + ["product_id", "label"])
+        count, total_rows = state["profiles_done"], state["rows"]
+        for i, profile, candidate_products in iter_candidates(profile_batches, products_by_price, state["next_profile"],
+                                                              sweep, sweep_batch):
+            profile_out = profile_rows(profile, candidate_products, engine, category_list, spec, cache=cache)
+            if profile_out is not None:
+                writer.writerows(profile_out)
+                total_rows += len(profile_out)
+                count += 1
+                if count % 100 == 0:
+                    print(f"Processed {count} profiles...", end='\r')
+            if (i + 1) % checkpoint_every == 0 and i + 1 < len(profile_batches):
+                f.flush()
+                os.fsync(f.fileno())
+                state.update(next_profile=i + 1, profiles_done=count, rows=total_rows, offset=f.tell(),
+                             rng=capture_rng())
+                checkpoint.save(state)
+        print()
+    os.replace(partial, OUTPUT_CSV)
+    checkpoint.clear()
+    return total_rows
+
 
-    with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as f:
+def generate_budgeted(budget_seconds: float, products: list, engine: TagBitsetEngine, products_by_price: dict,
+                      spec: dict, cache: ScoreCache = None) -> int:
+    """Add profiles (occasions in rotation) until budget_seconds have passed; returns rows written."""
+    category_list = spec["category_list"]
+    coverage = Coverage(products)
+    partial = OUTPUT_CSV.with_name(OUTPUT_CSV.name + ".partial")
+    started = time.perf_counter()
+    deadline = started + budget_seconds
+    profiles = count = total_rows = 0
+    with open(partial, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
-        writer.writerows(rows)
-    print(f"Wrote {len(rows)-1} training rows to {OUTPUT_CSV}")
+        writer.writerow(spec["feature_names"] + ["product_id", "label", "sample_weight"])
+        while time.perf_counter() < deadline:
+            profile = random_profile(occasion=OCCASIONS[profiles % len(OCCASIONS)])
+            profiles += 1
+            candidate_products = candidates_for(profile, products_by_price)
+            profile_out = stratified_profile_rows(profile, candidate_products, engine, category_list, spec, coverage,
+                                                  cache=cache)
+            if profile_out is not None:
+                writer.writerows(profile_out)
+                total_rows += len(profile_out)
+                count += 1
+                if count % 100 == 0:
+                    print(f"Processed {count} profiles...", end='\r')
+        print()
+    os.replace(partial, OUTPUT_CSV)
+    seconds = time.perf_counter() - started
+    report = coverage.write(COVERAGE_JSON, budget_seconds=budget_seconds, seconds=round(seconds, 2),
+                            profiles=profiles, profiles_used=count, rows=total_rows)
+    print(f"{count} of {profiles} profiles used in {seconds:.1f}s; sampled {report['strata_sampled']} of "
+          f"{report['strata_reachable']} reachable strata ({report['strata']} in the catalog)")
+    print(f"Wrote coverage and weights per stratum to {COVERAGE_JSON}")
+    return total_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate (profile, product) training rows.")
+    parser.add_argument("--seed", type=int, default=None, help="random seed (default: unseeded)")
+    parser.add_argument("--shards", type=int, default=0, help="write N binary shards + manifest instead of the CSV")
+    parser.add_argument("--shard-dir", type=Path, default=SHARD_DIR, help="output directory for --shards")
+    parser.add_argument("--workers", type=int, default=None, help="processes writing shards (default: all cores)")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted run from its last checkpoint")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, help="profiles between checkpoints")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="seconds: add profiles until spent, stratified negatives with sample weights")
+    parser.add_argument("--sweep-batch", type=int, default=SWEEP_BATCH,
+                        help="profiles filtered per budget-ordered sweep (0: filter each profile on its own)")
+    parser.add_argument("--score-cache-mb", type=int, default=DEFAULT_MAX_MB,
+                        help="memory cap for scores shared by profiles with the same tags, split across "
+                             "shard workers (default: off)")
+    args = parser.parse_args()
+    if args.checkpoint_every < 1:
+        parser.error("--checkpoint-every must be at least 1")
+    if args.time_budget is not None and (args.shards or args.resume):
+        raise SystemExit("--time-budget writes the CSV in one pass; it cannot be combined with --shards or --resume")
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    spec = json.loads(SPEC_PATH.read_text(encoding="utf-8"))
+    products, engine, products_by_price = load_catalog()
+    category_list = build_category_list(products)
+    spec["category_list"] = category_list
+    SPEC_PATH.write_text(json.dumps(spec, indent=2), encoding="utf-8")
+    cache = None
+    if args.score_cache_mb > 0:
+        cache = ScoreCache(products, engine, score_product_bits, args.score_cache_mb << 20)
+
+    if args.time_budget is not None:
+        print(f"Generating data for {args.time_budget:g}s...")
+        total_rows = generate_budgeted(args.time_budget, products, engine, products_by_price, spec, cache)
+        if cache is not None:
+            print(cache.summary())
+        print(f"Wrote {total_rows} training rows to {OUTPUT_CSV}")
+        print(f"Categories: {len(category_list)}")
+        return
+
+    mode = "shards" if args.shards > 0 else "csv"
+    checkpoint = Checkpoint(CHECKPOINT_DIR)
+    run_fingerprint = fingerprint(spec, PRODUCTS_CSV, seed=args.seed, num_profiles=NUM_PROFILES, mode=mode,
+                                  num_shards=args.shards)
+    if args.resume and checkpoint.exists():
+        profile_batches, state = checkpoint.load(run_fingerprint)
+        if mode == "csv":
+            restore_rng(state["rng"])
+    else:
+        if args.resume:
+            print(f"No checkpoint in {CHECKPOINT_DIR}; starting a fresh run")
+        profile_batches = build_profiles()
+        # Shards draw negatives from their own Random seeded from this run's seed
+        seed = args.seed if args.seed is not None else random.randrange(2 ** 31) if mode == "shards" else None
+        state = {"mode": mode, "seed": seed, "fingerprint": run_fingerprint}
+        if mode == "shards":
+            state.update(num_shards=args.shards, done={})
+        else:
+            state.update(next_profile=0, profiles_done=0, rows=0, offset=0, rng=capture_rng())
+        checkpoint.start(profile_batches, state)
+
+    if mode == "shards":
+        print(f"Generating data for {len(profile_batches)} profiles in {args.shards} shards...")
+        generate_shards(profile_batches, spec, args.shards, args.workers, state["seed"], args.shard_dir,
+                        checkpoint, state, args.score_cache_mb, args.sweep_batch)
+        checkpoint.clear()
+        print(f"Categories: {len(category_list)}")
+        return
+
+    print(f"Generating data for {len(profile_batches)} profiles...")
+    sweep = BudgetSweep(products) if args.sweep_batch > 0 else None
+    total_rows = generate_csv(profile_batches, engine, products_by_price, spec, checkpoint, state,
+                              args.checkpoint_every, cache, sweep, args.sweep_batch)
+    if cache is not None:
+        print(cache.summary())
+    print(f"Wrote {total_rows} training rows to {OUTPUT_CSV}")
     print(f"Categories: {len(category_list)}")
 
 
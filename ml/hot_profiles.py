@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Mine the Session table for repeat quiz forms and build a hot-profile cache for the app.
+
+Sessions are streamed from SQLite in batches (read-only). Each form_json is re-serialised
+the way /api/recommend serialises its normalised form, and its key is the route's
+formHash (sha256 of that JSON, first 16 hex chars). Key frequencies are counted with a
+Space-Saving sketch, so memory stays at --capacity keys however many sessions there are.
+
+For the top --top keys the cached value is the {profile, result} pair the route stores:
+by default the newest stored result_json for that form, or, with --recompute-url, a fresh
+result from a running /api/recommend. Recompute requests send X-Recompute: 1 (plus
+X-Admin-Secret from ADMIN_SECRET), so the route bypasses its result cache and stores no
+Session row for them. The route preloads ml/hot_profiles.json into its result cache at
+startup, so these forms skip retrieval and model calls.
+
+Run from project root: python ml/hot_profiles.py [--top 500] [--recompute-url http://127.0.0.1:3000/api/recommend]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+# DATABASE_URL resolution and the Space-Saving sketch are shared with the scripts/ tools
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from catalog_delta import sqlite_path  # noqa: E402
+from catalog_profile import SpaceSaving  # noqa: E402
+
+ML_DIR = Path(__file__).resolve().parent
+OUTPUT_JSON = ML_DIR / "hot_profiles.json"
+
+FORM_FIELDS = ["occasion", "relationship", "age_range", "budget_min", "budget_max",
+               "interests", "daily_life", "avoid_list", "notes"]
+
+
+def _js_number(value):
+    # JSON.stringify writes 20.0 as 20
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def canonical_form_json(form_json: str):
+    """form_json as JSON.stringify would write the route's normalised form, or None if unusable."""
+    try:
+        form = json.loads(form_json)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(form, dict) or any(field not in form for field in FORM_FIELDS):
+        return None
+    ordered = {field: _js_number(form[field]) for field in FORM_FIELDS}
+    return json.dumps(ordered, separators=(",", ":"), ensure_ascii=False)
+
+
+def form_hash(canonical_json: str) -> str:
+    """Same key as formHash() in src/app/api/recommend/route.ts."""
+    return hashlib.sha256(canonical_json.encode("utf-8")).hexdigest()[:16]
+
+
+def form_label(form: dict) -> str:
+    parts = [form["occasion"], form["relationship"], form["age_range"],
+             f"${form['budget_min']}-{form['budget_max']}", ",".join(form["interests"]) or "-"]
+    return " / ".join(str(p) for p in parts)
+
+
+def stream_sessions(conn: sqlite3.Connection, batch_size: int):
+    cur = conn.execute('SELECT id, form_json FROM "Session" ORDER BY rowid')
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def recompute(url: str, form: dict, admin_secret: str = None):
+    """{profile, result} freshly computed by a running /api/recommend (the shape the route caches)."""
+    headers = {"Content-Type": "application/json", "X-Recompute": "1"}
+    if admin_secret:
+        headers["X-Admin-Secret"] = admin_secret
+    req = urllib.request.Request(url, data=json.dumps(form).encode("utf-8"), headers=headers)
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        body = json.load(resp)
+    pick = lambda items: [{k: item[k] for k in ("product_id", "score", "why_bullets", "best_for_label")}
+                          for item in items]
+    return {"profile": body["profile"],
+            "result": {"top_3": pick(body["top_3"]), "alternatives_3": pick(body["alternatives_3"])}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build ml/hot_profiles.json from Session logs.")
+    parser.add_argument("--db", type=Path, default=None, help="SQLite file (default: from DATABASE_URL)")
+    parser.add_argument("--top", type=int, default=500, help="forms to cache")
+    parser.add_argument("--capacity", type=int, default=20000, help="keys tracked by the heavy-hitters sketch")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Session rows fetched per batch")
+    parser.add_argument("--min-count", type=int, default=2, help="skip forms seen fewer times than this")
+    parser.add_argument("--recompute-url", default=None, help="POST top forms to this /api/recommend URL")
+    parser.add_argument("--output", type=Path, default=OUTPUT_JSON)
+    args = parser.parse_args()
+
+    db_path = args.db or sqlite_path()
+    if not db_path.exists():
+        raise SystemExit(f"Database not found: {db_path}")
+    started = time.perf_counter()
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+    sketch = SpaceSaving(args.capacity)
+    scanned = skipped = 0
+    for session_id, form_json in stream_sessions(conn, args.batch_size):
+        scanned += 1
+        canonical = canonical_form_json(form_json)
+        if canonical is None:
+            skipped += 1
+            continue
+        # Payload: newest session for this form (rows stream in insertion order)
+        sketch.add(form_hash(canonical), (session_id, canonical))
+        if scanned % 100000 == 0:
+            print(f"Scanned {scanned} sessions...", end="\r")
+    print()
+
+    entries = []
+    for key, count, error, (session_id, canonical) in sketch.ranked(args.top):
+        if count - error < args.min_count:
+            continue
+        form = json.loads(canonical)
+        if args.recompute_url:
+            cached = recompute(args.recompute_url, form, os.environ.get("ADMIN_SECRET"))
+        else:
+            row = conn.execute('SELECT result_json FROM "Session" WHERE id = ?', (session_id,)).fetchone()
+            if not row or not row[0]:
+                continue
+            cached = json.loads(row[0])
+            if "profile" not in cached or "result" not in cached:
+                continue
+        entries.append({"key": key, "label": form_label(form), "count": count, "error": error,
+                        "form": form, **cached})
+    conn.close()
+
+    output = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sessions_scanned": scanned,
+        "sessions_skipped": skipped,
+        "sketch_capacity": args.capacity,
+        "entries": entries,
+    }
+    args.output.write_text(json.dumps(output, ensure_ascii=False), encoding="utf-8")
+    print(f"Scanned {scanned} sessions ({skipped} unusable) in {time.perf_counter() - started:.1f}s; "
+          f"wrote {len(entries)} hot profiles to {args.output}")
+    for e in entries[:10]:
+        print(f"  {e['count']:>7}  {e['label']}")
+
+
+if __name__ == "__main__":
+    main()
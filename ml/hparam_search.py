@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Successive-halving hyperparameter search for train.py (python ml/train.py --search).
+
+The train/validation matrices are written once as .npy files and opened with
+mmap_mode="r" in every worker, so all processes share the same pages instead of
+receiving a pickled copy per trial. Trials fit and score with the rows' sample weights
+(time-budgeted data is stratified). Configurations are sampled at random, scored on
+weighted validation ROC-AUC minus a per-row latency penalty, and the best 1/ETA of each rung is
+refitted with ETA times more trees. The search stops when the wall-clock budget runs out;
+unfinished trials are discarded, and the winner comes from the deepest rung that finished in
+full (a partial rung only holds the configs that happened to train fastest). All finished
+trials go to ml/search_leaderboard.csv.
+"""
+
+import csv
+import math
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.metrics import roc_auc_score
+
+ML_DIR = Path(__file__).resolve().parent
+LEADERBOARD_CSV = ML_DIR / "search_leaderboard.csv"
+
+ETA = 3  # keep the top 1/ETA of each rung, multiply its trees by ETA
+MIN_ESTIMATORS = 25
+MAX_ESTIMATORS = 400
+# Objective = AUC - LATENCY_WEIGHT * microseconds per scored row
+LATENCY_WEIGHT = 0.002
+LATENCY_ROWS = 2048
+SEED = 42
+
+SEARCH_SPACE = {
+    "max_depth": [3, 4, 5, 6, 7, 8],
+    "learning_rate": (0.02, 0.3),  # log-uniform
+    "min_samples_leaf": [5, 10, 20, 40, 80],
+    "subsample": (0.6, 1.0),  # uniform
+}
+
+_shared = {}
+
+
+def sample_config(rng: random.Random) -> dict:
+    lo, hi = SEARCH_SPACE["learning_rate"]
+    return {
+        "max_depth": rng.choice(SEARCH_SPACE["max_depth"]),
+        "learning_rate": round(math.exp(rng.uniform(math.log(lo), math.log(hi))), 4),
+        "min_samples_leaf": rng.choice(SEARCH_SPACE["min_samples_leaf"]),
+        "subsample": round(rng.uniform(*SEARCH_SPACE["subsample"]), 3),
+    }
+
+
+def _init_worker(data_dir: str):
+    # Memory-mapped: pages are shared with the parent and other workers through the OS cache
+    for name in ("X_train", "y_train", "w_train", "X_val", "y_val", "w_val"):
+        _shared[name] = np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+
+
+def _run_trial(trial: dict) -> dict:
+    X_train, y_train, w_train = _shared["X_train"], _shared["y_train"], _shared["w_train"]
+    X_val, y_val, w_val = _shared["X_val"], _shared["y_val"], _shared["w_val"]
+    params = {**trial["config"], "n_estimators": trial["n_estimators"]}
+
+    started = time.perf_counter()
+    model = GradientBoostingClassifier(**params, random_state=SEED)
+    model.fit(X_train, y_train, sample_weight=w_train)
+    fit_seconds = time.perf_counter() - started
+
+    auc = roc_auc_score(y_val, model.predict_proba(X_val)[:, 1], sample_weight=w_val)
+
+    batch = np.ascontiguousarray(X_val[:LATENCY_ROWS])
+    best = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        model.predict_proba(batch)
+        best = min(best, time.perf_counter() - t0)
+    latency_us = best / len(batch) * 1e6
+
+    return {
+        **trial,
+        "auc": auc,
+        "latency_us": latency_us,
+        "objective": auc - LATENCY_WEIGHT * latency_us,
+        "fit_seconds": fit_seconds,
+    }
+
+
+def _run_rung(pool, trials: list, deadline: float) -> tuple:
+    """Run one rung; returns (finished results, whether every trial finished before the deadline)."""
+    pending = [pool.apply_async(_run_trial, (t,)) for t in trials]
+    results = []
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return results, False
+        pending[0].wait(timeout=min(remaining, 1.0))
+        still = []
+        for job in pending:
+            if job.ready():
+                results.append(job.get())
+            else:
+                still.append(job)
+        pending = still
+    return results, True
+
+
+def write_leaderboard(results: list):
+    ranked = sorted(results, key=lambda r: -r["objective"])
+    fields = ["rank", "rung", "n_estimators", "max_depth", "learning_rate", "min_samples_leaf",
+              "subsample", "auc", "latency_us", "objective", "fit_seconds"]
+    with open(LEADERBOARD_CSV, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        for rank, r in enumerate(ranked, 1):
+            c = r["config"]
+            writer.writerow([
+                rank, r["rung"], r["n_estimators"], c["max_depth"], c["learning_rate"],
+                c["min_samples_leaf"], c["subsample"], f"{r['auc']:.5f}", f"{r['latency_us']:.3f}",
+                f"{r['objective']:.5f}", f"{r['fit_seconds']:.2f}",
+            ])
+    print(f"Wrote {len(ranked)} trials to {LEADERBOARD_CSV}")
+
+
+def run_search(X_train, y_train, X_val, y_val, budget_seconds: float, workers=None, num_trials: int = 27,
+               baseline: dict = None, w_train=None, w_val=None) -> dict:
+    """Return the best hyperparameters (including n_estimators) found within the budget.
+
+    w_train / w_val are per-row sample weights (default: unweighted).
+    """
+    deadline = time.monotonic() + budget_seconds
+    workers = workers or os.cpu_count() or 1
+    rng = random.Random(SEED)
+
+    configs = [sample_config(rng) for _ in range(num_trials)]
+    if baseline:
+        configs[0] = {k: v for k, v in baseline.items() if k != "n_estimators"}
+
+    results = []
+    complete_rung = None  # deepest rung whose trials all finished
+    with tempfile.TemporaryDirectory(prefix="hparam_search_") as data_dir:
+        if w_train is None:
+            w_train = np.ones(len(X_train))
+        if w_val is None:
+            w_val = np.ones(len(X_val))
+        for name, arr, dtype in (("X_train", X_train, np.float32), ("y_train", y_train, np.int64),
+                                 ("w_train", w_train, np.float64), ("X_val", X_val, np.float32),
+                                 ("y_val", y_val, np.int64), ("w_val", w_val, np.float64)):
+            np.save(os.path.join(data_dir, f"{name}.npy"), np.ascontiguousarray(arr, dtype=dtype))
+
+        pool = mp.Pool(processes=workers, initializer=_init_worker, initargs=(data_dir,))
+        try:
+            rung = 0
+            n_estimators = MIN_ESTIMATORS
+            trials = [{"config": c, "rung": 0, "n_estimators": n_estimators} for c in configs]
+            while trials:
+                print(f"Rung {rung}: {len(trials)} configs x {n_estimators} trees "
+                      f"({max(0.0, deadline - time.monotonic()):.0f}s left)")
+                finished, complete = _run_rung(pool, trials, deadline)
+                results.extend(finished)
+                if not complete:
+                    print("Search budget exhausted; stopping unfinished trials")
+                    break
+                complete_rung = rung
+                keep = len(trials) // ETA
+                next_estimators = min(MAX_ESTIMATORS, n_estimators * ETA)
+                if keep < 1 or next_estimators == n_estimators:
+                    break
+                finished.sort(key=lambda r: -r["objective"])
+                rung += 1
+                n_estimators = next_estimators
+                trials = [{"config": r["config"], "rung": rung, "n_estimators": n_estimators}
+                          for r in finished[:keep]]
+        finally:
+            pool.terminate()
+            pool.join()
+
+    if not results:
+        raise SystemExit("Search budget too small: no trial finished")
+    write_leaderboard(results)
+    # Prefer the deepest complete rung: lower rungs are scored with too few trees
+    top_rung = complete_rung if complete_rung is not None else 0
+    if complete_rung is None:
+        print("   ! Rung 0 did not finish; picking from its finished trials only")
+    best = max((r for r in results if r["rung"] == top_rung), key=lambda r: r["objective"])
+    print(f"Best trial: AUC {best['auc']:.4f}, {best['latency_us']:.2f} us/row, objective {best['objective']:.4f}")
+    return {"n_estimators": best["n_estimators"], **best["config"]}
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Warm-start model updates for train.py (python ml/train.py --update new_rows.csv).
+
+A full training run saves the fitted model, a holdout and a version counter to
+ml/model_state.joblib. The holdout is a sample of the validation rows that the final fit
+leaves out (gate_split), so it is never fitted. The state keeps its row ids and the dataset
+they index (training_data.csv or a shard directory), and replay samples skip those rows.
+
+An update loads that state and adds trees to the existing ensemble with warm_start.
+GradientBoostingClassifier continues boosting from the current model's predictions, so only
+the added stages are fitted. The new rows must have the same columns as training_data.csv.
+
+The added stages are fitted on the new rows plus a random replay sample of the dataset
+the model was trained on, with a large min_samples_leaf. Leaf values are Newton steps
+(sum of residuals / sum of p(1 - p)). On rows the model already predicts confidently the
+denominator is close to zero, so a small leaf of a few surprising rows can get a huge value
+and wreck the ranking. Larger leaves and the replayed rows keep each new stage small.
+
+Before anything is exported, the updated model is scored on the stored holdout plus a
+held-out slice of the new rows. If its ROC-AUC is more than --max-auc-drop below the
+previous model's, the update is rejected and model.onnx is left as it was. Every export
+bumps the version, which is written to the ONNX model_version field and metrics.json.
+"""
+
+import copy
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+ML_DIR = Path(__file__).resolve().parent
+STATE_PATH = ML_DIR / "model_state.joblib"
+
+HOLDOUT_MAX_ROWS = 50_000  # validation rows kept out of the final fit (newest kept after updates)
+HOLDOUT_FRACTION = 0.15
+REPLAY_ROWS = 5000  # rows of the training dataset mixed into every update
+MIN_LEAF_FRACTION = 0.1  # min_samples_leaf of the added stages, as a share of the fit rows
+SEED = 42
+
+
+def load_state(path: Path = STATE_PATH) -> dict:
+    if not path.exists():
+        raise SystemExit(f"No {path.name}; run a full python ml/train.py first")
+    return joblib.load(path)
+
+
+def next_version(path: Path = STATE_PATH) -> int:
+    """Version for the next export: one more than the saved state's, or 1."""
+    return joblib.load(path)["version"] + 1 if path.exists() else 1
+
+
+def save_state(model, X_holdout, y_holdout, version: int, source: Path = None, holdout_ids=None,
+               path: Path = STATE_PATH):
+    """source is the training dataset, holdout_ids the ids of its rows in the holdout (see gate_split)."""
+    X_holdout = np.asarray(X_holdout, dtype=np.float32)[-HOLDOUT_MAX_ROWS:]
+    y_holdout = np.asarray(y_holdout, dtype=np.int64)[-HOLDOUT_MAX_ROWS:]
+    holdout_ids = np.sort(np.asarray(holdout_ids if holdout_ids is not None else [], dtype=np.int64))
+    tmp = path.with_name(path.name + ".tmp")
+    joblib.dump({"model": model, "X_holdout": X_holdout, "y_holdout": y_holdout, "version": version,
+                 "source": str(source) if source is not None else None, "holdout_ids": holdout_ids}, tmp)
+    tmp.replace(path)
+
+
+def gate_split(ids, val_ids, max_rows: int = HOLDOUT_MAX_ROWS) -> tuple:
+    """(final-fit mask, holdout mask) over rows with the given ids.
+
+    The holdout is the validation rows, sampled down to max_rows; the final fit gets every
+    other row, so the holdout stays unseen by the exported model.
+    """
+    ids, val_ids = np.asarray(ids), np.asarray(val_ids)
+    if len(val_ids) > max_rows:
+        val_ids = np.random.default_rng(SEED).choice(val_ids, max_rows, replace=False)
+    holdout = np.isin(ids, val_ids)
+    return ~holdout, holdout
+
+
+def split_new_rows(X, y):
+    """Fit / holdout split of the update batch (stratified when both labels are present)."""
+    X, y = np.asarray(X, dtype=np.float32), np.asarray(y, dtype=np.int64)
+    if len(X) < 20:
+        return X, X[:0], y, y[:0]
+    stratify = y if len(np.unique(y)) == 2 and np.bincount(y).min() >= 2 else None
+    return train_test_split(X, y, test_size=HOLDOUT_FRACTION, random_state=SEED, stratify=stratify)
+
+
+def replay_sample(X, y, ids=None, exclude=None, rows: int = REPLAY_ROWS):
+    """Up to rows random rows of (X, y), skipping rows whose id is in exclude (the holdout)."""
+    X, y = np.asarray(X, dtype=np.float32), np.asarray(y, dtype=np.int64)
+    if ids is not None and exclude is not None and len(exclude):
+        keep = ~np.isin(ids, exclude)
+        X, y = X[keep], y[keep]
+    if len(X) <= rows:
+        return X, y
+    keep = np.random.default_rng(SEED).choice(len(X), rows, replace=False)
+    return X[keep], y[keep]
+
+
+def warm_start_update(state: dict, X_new, y_new, add_trees: int, max_auc_drop: float,
+                      X_replay=None, y_replay=None) -> tuple:
+    """Add add_trees stages fitted on the new rows (+ replay); returns (model, X_holdout, y_holdout, report)."""
+    if len(np.unique(y_new)) < 2:
+        raise SystemExit("Update batch needs both relevant and non-relevant rows")
+    X_fit, X_hold, y_fit, y_hold = split_new_rows(X_new, y_new)
+    new_rows = len(X_fit)
+    if X_replay is not None and len(X_replay):
+        X_fit, y_fit = np.concatenate([X_fit, X_replay]), np.concatenate([y_fit, y_replay])
+    X_holdout = np.concatenate([state["X_holdout"], X_hold])
+    y_holdout = np.concatenate([state["y_holdout"], y_hold])
+
+    previous = state["model"]
+    # Keep the column names the model was fitted with (full training uses a DataFrame)
+    columns = getattr(previous, "feature_names_in_", None)
+    if columns is not None:
+        X_fit, X_holdout = pd.DataFrame(X_fit, columns=columns), pd.DataFrame(X_holdout, columns=columns)
+    auc_before = roc_auc_score(y_holdout, previous.predict_proba(X_holdout)[:, 1])
+
+    # Deep copy so a rejected update leaves the saved model untouched
+    model = copy.deepcopy(previous)
+    trees_before = model.n_estimators_
+    # Tree parameters only apply to the new stages; learning_rate is shared by all stages, so it stays
+    min_leaf = max(previous.min_samples_leaf, int(MIN_LEAF_FRACTION * len(X_fit)))
+    model.set_params(warm_start=True, n_estimators=trees_before + add_trees, min_samples_leaf=min_leaf)
+    started = time.perf_counter()
+    model.fit(X_fit, y_fit)
+    seconds = time.perf_counter() - started
+
+    auc_after = roc_auc_score(y_holdout, model.predict_proba(X_holdout)[:, 1])
+    print(f"Added {model.n_estimators_ - trees_before} trees on {new_rows} new + {len(X_fit) - new_rows} replayed "
+          f"rows in {seconds:.2f}s ({model.n_estimators_} total)")
+    print(f"Holdout ROC-AUC ({len(y_holdout)} rows): {auc_before:.4f} -> {auc_after:.4f}")
+    if auc_after < auc_before - max_auc_drop:
+        raise SystemExit(f"Update rejected: holdout ROC-AUC dropped by {auc_before - auc_after:.4f} "
+                         f"(allowed {max_auc_drop}); model.onnx unchanged")
+    model.set_params(warm_start=False, min_samples_leaf=previous.min_samples_leaf)
+    report = {
+        "auc_before": auc_before,
+        "auc_after": auc_after,
+        "trees_added": int(model.n_estimators_ - trees_before),
+        "update_rows": int(new_rows),
+        "replay_rows": int(len(X_fit) - new_rows),
+        "update_seconds": round(seconds, 3),
+    }
+    return model, X_holdout, y_holdout, report
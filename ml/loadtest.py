@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Quiz-traffic load generator: replays random_profile() forms against a local endpoint.
+
+Targets:
+  recommend  POST the quiz form to the Next.js API (default http://127.0.0.1:3000/api/recommend)
+  score      POST {"profile", "product_ids"} to ml/serve.py (default http://127.0.0.1:8500/score)
+Modes:
+  open    requests start on a Poisson schedule at --rate, whether or not earlier ones finished;
+          latency is measured from the scheduled start (no coordinated omission)
+  closed  --concurrency clients each send, wait for the reply, then send again (paced to --rate)
+
+Latencies go into log-linear (HDR-style) histograms per profile segment (--segment-by) and
+overall; the report has p50/p95/p99/max, throughput and error rates, printed and as JSON.
+
+Run from project root: python ml/loadtest.py --target score --mode open --rate 200 --duration 30
+Self-test against a stub: python ml/loadtest.py stub --port 8600 --delay-ms 5
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from generate_training_data import load_products, random_profile
+
+ML_DIR = Path(__file__).resolve().parent
+REPORT_JSON = ML_DIR / "loadtest_report.json"
+
+DEFAULT_URLS = {
+    "recommend": "http://127.0.0.1:3000/api/recommend",
+    "score": "http://127.0.0.1:8500/score",
+}
+CANDIDATES_PER_REQUEST = 30  # same as MAX_CANDIDATES in src/lib/retrieval.ts
+
+
+class LatencyHistogram:
+    """Log-linear buckets over integer microseconds: exact below 2^SUB_BITS, then under 1.6% relative error."""
+
+    SUB_BITS = 7
+    SUB = 1 << SUB_BITS
+    HALF = SUB // 2
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.max = 0
+        self.sum = 0
+
+    def _index(self, v: int) -> int:
+        if v < self.SUB:
+            return v
+        shift = v.bit_length() - self.SUB_BITS
+        return self.SUB + (shift - 1) * self.HALF + ((v >> shift) - self.HALF)
+
+    def _upper(self, i: int) -> int:
+        """Highest value that lands in bucket i."""
+        if i < self.SUB:
+            return i
+        shift = (i - self.SUB) // self.HALF + 1
+        mantissa = (i - self.SUB) % self.HALF + self.HALF
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, micros: int):
+        micros = max(0, int(micros))
+        i = self._index(micros)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.total += 1
+        self.sum += micros
+        self.max = max(self.max, micros)
+
+    def percentile(self, q: float) -> int:
+        if not self.total:
+            return 0
+        rank = max(1, int(round(q / 100.0 * self.total)))
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return min(self._upper(i), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "p50_ms": self.percentile(50) / 1000,
+            "p95_ms": self.percentile(95) / 1000,
+            "p99_ms": self.percentile(99) / 1000,
+            "max_ms": self.max / 1000,
+            "mean_ms": self.sum / self.total / 1000 if self.total else 0.0,
+        }
+
+
+class Segment:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.statuses = {}
+
+    def record(self, micros: int, status):
+        self.requests += 1
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors += 1
+        else:
+            self.latency.record(micros)
+
+    def summary(self, seconds: float) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "throughput_rps": (self.requests - self.errors) / seconds if seconds else 0.0,
+            "statuses": self.statuses,
+            **self.latency.summary(),
+        }
+
+
+def segment_of(profile: dict, segment_by: str) -> str:
+    if segment_by == "budget":
+        return f"${(profile['budget_max'] // 25) * 25}-{(profile['budget_max'] // 25) * 25 + 24}"
+    return str(profile[segment_by])
+
+
+def quiz_form(profile: dict) -> dict:
+    return {
+        "occasion": profile["occasion"],
+        "relationship": profile["relationship"],
+        "age_range": profile["age_range"],
+        "budget_min": profile["budget_min"],
+        "budget_max": profile["budget_max"],
+        "interests": profile["interests"],
+        "daily_life": profile["daily_life"],
+        "avoid_list": [],
+        "notes": "",
+    }
+
+
+class HttpClient:
+    """Tiny keep-alive HTTP/1.1 JSON client over asyncio streams, with a connection pool."""
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self.idle = []
+
+    async def post_json(self, payload: dict) -> int:
+        body = json.dumps(payload).encode("utf-8")
+        conn = self.idle.pop() if self.idle else await asyncio.open_connection(self.host, self.port)
+        reader, writer = conn
+        try:
+            writer.write(
+                f"POST {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: keep-alive\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+            status, keep_alive = await asyncio.wait_for(self._read_response(reader), self.timeout)
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self.idle.append(conn)
+        else:
+            writer.close()
+        return status
+
+    async def _read_response(self, reader: asyncio.StreamReader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+        if headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await reader.readexactly(int(headers.get("content-length") or 0))
+        return status, headers.get("connection") != "close"
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.client = HttpClient(args.url, args.timeout)
+        self.segments = {}
+        self.overall = Segment()
+        self.product_ids = [p["id"] for p in load_products()] if args.target == "score" else []
+        self.rng = random.Random(args.seed)
+
+    def next_request(self):
+        profile = random_profile()
+        form = quiz_form(profile)
+        if self.args.target == "score":
+            k = min(CANDIDATES_PER_REQUEST, len(self.product_ids))
+            payload = {"profile": form, "product_ids": self.rng.sample(self.product_ids, k)}
+        else:
+            payload = form
+        return segment_of(profile, self.args.segment_by), payload
+
+    async def send(self, segment: str, payload: dict, started: float):
+        try:
+            status = await self.client.post_json(payload)
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except (OSError, ConnectionError, ValueError, asyncio.IncompleteReadError) as e:
+            status = type(e).__name__
+        micros = int((time.perf_counter() - started) * 1e6)
+        self.segments.setdefault(segment, Segment()).record(micros, status)
+        self.overall.record(micros, status)
+
+    async def open_loop(self, duration: float):
+        in_flight = set()
+        dropped = 0
+        start = time.perf_counter()
+        next_at = start
+        while next_at - start < duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            segment, payload = self.next_request()
+            if len(in_flight) >= self.args.max_in_flight:
+                dropped += 1
+                self.segments.setdefault(segment, Segment()).record(0, "dropped")
+                self.overall.record(0, "dropped")
+            else:
+                # Latency counts from the scheduled start, so a stalled server is not hidden
+                task = asyncio.ensure_future(self.send(segment, payload, next_at))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            next_at += self.rng.expovariate(self.args.rate)
+        if in_flight:
+            await asyncio.wait(in_flight)
+        return dropped
+
+    async def closed_loop(self, duration: float):
+        start = time.perf_counter()
+        interval = self.args.concurrency / self.args.rate
+
+        async def client_loop():
+            next_at = time.perf_counter()
+            while time.perf_counter() - start < duration:
+                segment, payload = self.next_request()
+                await self.send(segment, payload, time.perf_counter())
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+        await asyncio.gather(*(client_loop() for _ in range(self.args.concurrency)))
+        return 0
+
+    async def run(self) -> dict:
+        args = self.args
+        print(f"{args.mode}-loop {args.target} load on {args.url}: "
+              f"{args.rate} req/s target for {args.duration}s, segments by {args.segment_by}")
+        started = time.perf_counter()
+        if args.mode == "open":
+            dropped = await self.open_loop(args.duration)
+        else:
+            dropped = await self.closed_loop(args.duration)
+        seconds = time.perf_counter() - started
+        self.client.close()
+        return {
+            "target": args.target,
+            "url": args.url,
+            "mode": args.mode,
+            "target_rps": args.rate,
+            "concurrency": args.concurrency if args.mode == "closed" else None,
+            "seconds": round(seconds, 3),
+            "dropped": dropped,
+            "overall": self.overall.summary(seconds),
+            "segments": {name: seg.summary(seconds) for name, seg in sorted(self.segments.items())},
+        }
+
+
+def print_report(report: dict):
+    header = f"{'segment':<16}{'reqs':>8}{'err%':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["segments"].items()) + [("ALL", report["overall"])]
+    for name, s in rows:
+        print(f"{name:<16}{s['requests']:>8}{100 * s['error_rate']:>7.1f}%{s['throughput_rps']:>9.1f}"
+              f"{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+    if report["dropped"]:
+        print(f"Dropped {report['dropped']} requests at the --max-in-flight limit")
+
+
+async def run_stub(port: int, delay_ms: float):
+    """Stand-in endpoint: reads one request, sleeps delay_ms, answers {}."""
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                if not await reader.readline():
+                    break
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                await asyncio.sleep(delay_ms / 1000)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", port)
+    print(f"Stub endpoint on http://127.0.0.1:{port}/ ({delay_ms} ms per request)")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay quiz traffic against a local endpoint.")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "stub"])
+    parser.add_argument("--target", choices=sorted(DEFAULT_URLS), default="recommend")
+    parser.add_argument("--url", default=None, help="endpoint URL (default depends on --target)")
+    parser.add_argument("--mode", choices=["open", "closed"], default="open")
+    parser.add_argument("--rate", type=float, default=50.0, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of traffic")
+    parser.add_argument("--concurrency", type=int, default=16, help="closed loop: concurrent clients")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="open loop: requests in flight before dropping")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--segment-by", choices=["occasion", "relationship", "age_range", "budget"], default="occasion")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--report", type=Path, default=REPORT_JSON)
+    parser.add_argument("--port", type=int, default=8600, help="stub: port to listen on")
+    parser.add_argument("--delay-ms", type=float, default=5.0, help="stub: simulated service time")
+    args = parser.parse_args()
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+
+    if args.command == "stub":
+        try:
+            asyncio.run(run_stub(args.port, args.delay_ms))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    args.url = args.url or DEFAULT_URLS[args.target]
+    random.seed(args.seed)
+    report = asyncio.run(LoadTest(args).run())
+    print_report(report)
+    args.report.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Wrote {args.report}")
+
+
+if __name__ == "__main__":
+    main()
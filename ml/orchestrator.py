@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Pipelined generate + train (npm run ml:train:pipelined): the stages overlap instead of running
+one after the other.
+
+  generate  worker processes write .npz shards (as generate_training_data.py --shards)
+     |      bounded queue of finished shard entries
+  load      verifies each shard's checksum and loads it into typed float32 / int64 buffers
+     |      bounded queue of loaded shards
+  fit       validation fit on the training shards, final fit on all shards (two processes)
+  validate  metrics and an ONNX round-trip check of the validation model, while the final fit runs
+  export    ONNX, flat trees, model state and metrics.json
+
+Validation shards are chosen before generation (shards.split_shards on the planned shard list)
+and submitted last. So the validation fit starts once the training shards are loaded, while
+the validation shards are still being generated.
+
+Each stage reports its busy time, items and utilisation (busy / (workers x wall time)). The run
+ends with wall time next to the sum of the stage times, and that report is also stored under
+"pipeline" in ml/metrics.json.
+
+Run from project root: python ml/orchestrator.py [--shards 16] [--workers N] [--seed S]
+Output: as train.py --shards, plus ml/training_shards/ (reusable with train.py --shards)
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+from sklearn.metrics import accuracy_score, roc_auc_score
+
+from generate_training_data import (SWEEP_BATCH, _generate_shard, _init_shard_worker, build_category_list,
+                                    build_profiles, load_catalog)
+from incremental import gate_split, next_version
+from score_cache import DEFAULT_MAX_MB
+from shards import SHARD_DIR, load_shard, shard_name, shard_row_ids, split_shards, write_manifest
+from train import HYPERPARAMS, SPEC_PATH, build_model, export_model, to_onnx, write_metrics
+
+NUM_SHARDS = 16
+QUEUE_SIZE = 4  # finished shards buffered between two stages
+ONNX_TOLERANCE = 1e-4  # max |onnxruntime - predict_proba| (onnxruntime runs in float32)
+
+
+class StageStats:
+    """Busy time and items of one stage; workers is how many items it can work on at once."""
+
+    def __init__(self, name: str, workers: int = 1):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, items: int = 1):
+        with self._lock:
+            self.busy += seconds
+            self.items += items
+
+    def report(self, wall: float) -> dict:
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "busy_seconds": round(self.busy, 3),
+            "utilisation": round(self.busy / (self.workers * wall), 3) if wall else 0.0,
+        }
+
+
+class Stage(threading.Thread):
+    """Applies fn to each item of inbox (or of source) and puts the results on outbox; None ends the stream.
+
+    If fn raises, the rest of the inbox is drained so the stage upstream never blocks on a full
+    queue, and the error is re-raised by join_checked().
+    """
+
+    def __init__(self, stats: StageStats, fn, inbox: queue.Queue = None, outbox: queue.Queue = None, source=None,
+                 timed: bool = True):
+        super().__init__(name=stats.name, daemon=True)
+        self.stats = stats
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.source = source
+        self.timed = timed
+        self.error = None
+
+    def _items(self):
+        if self.source is not None:
+            yield from self.source
+            return
+        while True:
+            item = self.inbox.get()
+            if item is None:
+                return
+            yield item
+
+    def run(self):
+        try:
+            for item in self._items():
+                started = time.perf_counter()
+                result = self.fn(item)
+                if self.timed:
+                    self.stats.add(time.perf_counter() - started)
+                if self.outbox is not None:
+                    self.outbox.put(result)
+        except BaseException as e:
+            self.error = e
+            if self.inbox is not None:
+                while self.inbox.get() is not None:
+                    pass
+        finally:
+            if self.outbox is not None:
+                self.outbox.put(None)
+
+    def join_checked(self):
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+def _timed_shard(task):
+    started = time.perf_counter()
+    entry = _generate_shard(task)
+    return entry, time.perf_counter() - started
+
+
+def _timed_fit(params: dict, X, y):
+    started = time.perf_counter()
+    model = build_model(params)
+    model.fit(X, y)
+    return model, time.perf_counter() - started
+
+
+def generated_shards(futures: list, stats: StageStats):
+    """Shard entries in completion order; worker time is the stage's busy time."""
+    for future in as_completed(futures):
+        entry, seconds = future.result()
+        stats.add(seconds)
+        print(f"Wrote {entry['file']}: {entry['rows']} rows", end="\r")
+        yield entry
+
+
+def onnx_check(model, X_val) -> float:
+    """Max |onnxruntime - predict_proba| of model's ONNX export on X_val (None without onnxruntime)."""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        return None
+    session = ort.InferenceSession(to_onnx(model).SerializeToString(), providers=["CPUExecutionProvider"])
+    proba = session.run(None, {session.get_inputs()[0].name: X_val.astype(np.float32)})[-1]
+    got = np.array([r[1] for r in proba]) if isinstance(proba, list) else proba[:, -1]
+    diff = float(np.abs(got - model.predict_proba(X_val)[:, 1]).max())
+    if diff > ONNX_TOLERANCE:
+        raise SystemExit(f"ONNX export differs from predict_proba (max abs diff {diff:.3g})")
+    return diff
+
+
+def run_pipeline(params: dict, num_shards: int, workers: int, seed: int, shard_dir: Path, queue_size: int,
+                 cache_mb: int, sweep_batch: int):
+    started = time.perf_counter()
+    stats = {name: StageStats(name, n) for name, n in
+             (("generate", workers), ("load", 1), ("fit", 2), ("validate", 1), ("export", 1))}
+
+    # Same prelude as generate_training_data.py --shards N --seed S, so the shards are identical
+    random.seed(seed)
+    spec = json.loads(SPEC_PATH.read_text(encoding="utf-8"))
+    products, _, _ = load_catalog()
+    spec["category_list"] = build_category_list(products)
+    SPEC_PATH.write_text(json.dumps(spec, indent=2), encoding="utf-8")
+    profile_batches = build_profiles()
+    del products
+
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    for old in shard_dir.glob("shard-*.npz"):
+        old.unlink()
+    per_shard = -(-len(profile_batches) // num_shards)
+    tasks = [(i, profile_batches[i * per_shard:(i + 1) * per_shard], seed * 1_000_003 + i, shard_dir)
+             for i in range(num_shards)]
+    planned = {"shards": [{"file": shard_name(i), "rows": 1} for i in range(num_shards)]}
+    val_files = {e["file"] for e in split_shards(planned)[1]}
+    if not val_files:
+        raise SystemExit("Need at least 2 shards for a shard-level validation split")
+    # Validation shards go last, so the validation fit can start while they are generated
+    tasks.sort(key=lambda t: shard_name(t[0]) in val_files)
+    num_train = num_shards - len(val_files)
+    print(f"Pipelined run: {len(profile_batches)} profiles in {num_shards} shards "
+          f"({len(val_files)} for validation), {workers} generator processes, seed {seed}")
+
+    entries, train_parts, val_parts = [], [], []
+    val_future = final_future = None
+    shard_queue, loaded_queue = queue.Queue(queue_size), queue.Queue(queue_size)
+    # The fit processes start while the stage threads run, so they are spawned rather than forked
+    # --score-cache-mb is the total across the generator processes
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker,
+                             initargs=((cache_mb << 20) // workers, sweep_batch)) as gen_pool, \
+            ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as fit_pool:
+        # Submitted before any stage thread starts (the generator processes fork on the first submit)
+        futures = [gen_pool.submit(_timed_shard, task) for task in tasks]
+        stages = [
+            Stage(stats["generate"], lambda entry: entry, outbox=shard_queue,
+                  source=generated_shards(futures, stats["generate"]), timed=False),
+            Stage(stats["load"], lambda entry: (entry, *load_shard(shard_dir, entry)), shard_queue, loaded_queue),
+        ]
+        for stage in stages:
+            stage.start()
+
+        while (item := loaded_queue.get()) is not None:
+            entry, X, y = item
+            entries.append(entry)
+            (val_parts if entry["file"] in val_files else train_parts).append((entry, X, y))
+            if len(train_parts) == num_train and val_future is None:
+                X_train = np.concatenate([X for _, X, _ in train_parts])
+                y_train = np.concatenate([y for _, _, y in train_parts])
+                print(f"\nTraining shards loaded after {time.perf_counter() - started:.1f}s; "
+                      f"validation fit on {len(X_train)} rows started")
+                val_future = fit_pool.submit(_timed_fit, params, X_train, y_train)
+        for stage in stages:
+            stage.join_checked()
+
+        X_val = np.concatenate([X for _, X, _ in val_parts]) if val_parts else np.empty((0, len(spec["feature_names"])))
+        y_val = np.concatenate([y for _, _, y in val_parts]) if val_parts else np.empty(0, dtype=np.int64)
+        if not len(X_val) or not len(X_train):
+            raise SystemExit("Training or validation shards are empty; use more profiles or fewer shards")
+        manifest = write_manifest(shard_dir, entries, spec["feature_names"], seed=seed)
+        X_all, y_all = np.concatenate([X_train, X_val]), np.concatenate([y_train, y_val])
+        ids_val = shard_row_ids(manifest, [e for e, _, _ in val_parts])
+        ids = np.concatenate([shard_row_ids(manifest, [e for e, _, _ in train_parts]), ids_val])
+        # The --update holdout (a sample of the validation rows) stays out of the final fit
+        fit, holdout = gate_split(ids, ids_val)
+        print(f"\nAll shards loaded after {time.perf_counter() - started:.1f}s; "
+              f"final fit on {fit.sum()} rows started")
+        final_future = fit_pool.submit(_timed_fit, params, X_all[fit], y_all[fit])
+
+        # Validation and the ONNX check run alongside the final fit
+        val_model, seconds = val_future.result()
+        stats["fit"].add(seconds)
+        validate_started = time.perf_counter()
+        y_proba = val_model.predict_proba(X_val)[:, 1]
+        accuracy = accuracy_score(y_val, val_model.predict(X_val))
+        auc = roc_auc_score(y_val, y_proba)
+        onnx_diff = onnx_check(val_model, X_val)
+        stats["validate"].add(time.perf_counter() - validate_started)
+        print(f"Validation accuracy: {accuracy:.4f}")
+        print(f"Validation ROC-AUC: {auc:.4f}")
+        print("ONNX check skipped (onnxruntime not installed)" if onnx_diff is None else
+              f"ONNX check: max |onnxruntime - predict_proba| = {onnx_diff:.2e}")
+
+        model, seconds = final_future.result()
+        stats["fit"].add(seconds)
+
+    export_started = time.perf_counter()
+    version = next_version()
+    export_model(model, spec, X_all[holdout], y_all[holdout], version, shard_dir, ids[holdout])
+    stats["export"].add(time.perf_counter() - export_started)
+
+    wall = time.perf_counter() - started
+    report = {
+        "wall_seconds": round(wall, 2),
+        "stage_seconds": round(sum(s.busy for s in stats.values()), 2),
+        "stages": {name: s.report(wall) for name, s in stats.items()},
+    }
+    write_metrics(params, accuracy, auc, len(X_train), len(X_val), version, pipeline=report,
+                  onnx_max_abs_diff=onnx_diff)
+    print(f"Wrote {manifest['total_rows']} training rows in {len(entries)} shards to {shard_dir}")
+    print(f"{'stage':<10}{'workers':>8}{'items':>7}{'busy s':>9}{'util':>7}")
+    for name, s in report["stages"].items():
+        print(f"{name:<10}{s['workers']:>8}{s['items']:>7}{s['busy_seconds']:>9.1f}{100 * s['utilisation']:>6.0f}%")
+    slowest = max(stats.values(), key=lambda s: s.busy / s.workers)
+    print(f"Wall time {wall:.1f}s for {report['stage_seconds']:.1f}s of stage work "
+          f"(slowest stage: {slowest.name}, {slowest.busy / slowest.workers:.1f}s per worker)")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate shards and train with overlapping pipeline stages.")
+    parser.add_argument("--shards", type=int, default=NUM_SHARDS, help="shards to generate (>= 2)")
+    parser.add_argument("--workers", type=int, default=None, help="generator processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed (default: unseeded)")
+    parser.add_argument("--shard-dir", type=Path, default=SHARD_DIR)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="shards buffered between stages")
+    parser.add_argument("--score-cache-mb", type=int, default=DEFAULT_MAX_MB,
+                        help="generator score cache, split across the processes (default: off)")
+    parser.add_argument("--sweep-batch", type=int, default=SWEEP_BATCH,
+                        help="profiles filtered per budget-ordered sweep (0: filter each profile on its own)")
+    args = parser.parse_args()
+    if args.shards < 2:
+        raise SystemExit("--shards must be at least 2 (whole shards are held out for validation)")
+
+    workers = args.workers or os.cpu_count() or 1
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 31)
+    run_pipeline(HYPERPARAMS, args.shards, workers, seed, args.shard_dir, args.queue_size, args.score_cache_mb,
+                 args.sweep_batch)
+
+
+if __name__ == "__main__":
+    main()
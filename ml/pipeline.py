@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Cached ML pipeline (npm run ml:train): generate_training_data.py, then train.py.
+
+Each step is keyed by a SHA-256 over its code, its input files and its arguments. Inputs and
+outputs depend on the step's mode: train --update hashes the update CSV, the saved model state
+and its replay source; train --shards DIR hashes DIR/manifest.json (which holds the shard
+checksums) instead of training_data.csv; generate --shards N stores the shards and manifest
+instead of the CSV, and --time-budget / --search also store their coverage and leaderboard files.
+Outputs are stored content-addressed under ml/.artifacts/ (objects/ holds blobs by hash,
+steps/<step>/<key>.json maps output paths to blobs). When a step's key is already in the
+store its outputs are restored from there and the step is skipped, so re-running with
+unchanged products.csv, feature_spec.json, scripts and hyperparameters costs only hashing.
+
+Run from project root: python ml/pipeline.py [--force] [train.py args...] [-- generate_training_data.py args...]
+(through npm: npm run ml:train -- --search -- --seed 5 --time-budget 60)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ML_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = ML_DIR.parent
+STORE_DIR = ML_DIR / ".artifacts"
+
+PRODUCTS_CSV = PROJECT_ROOT / "prisma" / "products.csv"
+TRAINING_CSV = ML_DIR / "training_data.csv"
+SPEC_PATH = ML_DIR / "feature_spec.json"
+MODEL_ONNX = ML_DIR / "model.onnx"
+TREES_JSON = ML_DIR / "model_trees.json"
+TREES_BIN = ML_DIR / "model_trees.bin"
+METRICS_JSON = ML_DIR / "metrics.json"
+MODEL_STATE = ML_DIR / "model_state.joblib"
+COVERAGE_JSON = ML_DIR / "training_coverage.json"
+LEADERBOARD_CSV = ML_DIR / "search_leaderboard.csv"
+SHARD_DIR = ML_DIR / "training_shards"
+MANIFEST_NAME = "manifest.json"
+
+CHUNK = 1 << 20
+
+
+def _path(value) -> Path:
+    """A path argument as the step sees it (steps run with the project root as cwd)."""
+    return PROJECT_ROOT / value if value is not None else None
+
+
+def generate_options(args: list):
+    """The generate_training_data.py flags that change what the step reads and writes."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--shards", type=int, default=0)
+    parser.add_argument("--shard-dir", type=Path, default=SHARD_DIR)
+    parser.add_argument("--time-budget", type=float, default=None)
+    return parser.parse_known_args(args)[0]
+
+
+def train_options(args: list):
+    """The train.py flags that change what the step reads and writes."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--search", action="store_true")
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--shards", type=Path, default=None)
+    parser.add_argument("--update", type=Path, default=None)
+    return parser.parse_known_args(args)[0]
+
+
+def generate_inputs(args: list) -> list:
+    return [PRODUCTS_CSV]
+
+
+def generate_outputs(args: list) -> list:
+    opts = generate_options(args)
+    if opts.shards > 0:
+        shard_dir = _path(opts.shard_dir)
+        manifest = json.loads((shard_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+        return [SPEC_PATH, shard_dir / MANIFEST_NAME, *(shard_dir / e["file"] for e in manifest["shards"])]
+    if opts.time_budget is not None:
+        return [TRAINING_CSV, SPEC_PATH, COVERAGE_JSON]
+    return [TRAINING_CSV, SPEC_PATH]
+
+
+def replay_source(update_csv: Path) -> list:
+    """What train.py --update replays from: the saved state's source (as train.replay_pool)."""
+    if not MODEL_STATE.exists():
+        return []
+    import joblib
+
+    source = joblib.load(MODEL_STATE).get("source")
+    source = _path(source) if source else TRAINING_CSV
+    if (source / MANIFEST_NAME).exists():
+        return [source / MANIFEST_NAME]
+    if source.is_file() and source.resolve() != update_csv.resolve():
+        return [source]
+    return []
+
+
+def train_inputs(args: list) -> list:
+    opts = train_options(args)
+    if opts.update:
+        update_csv = _path(opts.update)
+        return [update_csv, MODEL_STATE, SPEC_PATH, *replay_source(update_csv)]
+    if opts.shards:
+        return [_path(opts.shards) / MANIFEST_NAME, SPEC_PATH]
+    return [TRAINING_CSV, SPEC_PATH]
+
+
+def train_outputs(args: list) -> list:
+    outputs = [MODEL_ONNX, TREES_JSON, TREES_BIN, METRICS_JSON, SPEC_PATH, MODEL_STATE]
+    opts = train_options(args)
+    if opts.search and not (opts.update or opts.shards or opts.streaming):
+        outputs.append(LEADERBOARD_CSV)
+    return outputs
+
+
+# Code each step depends on (the script and the ml/ modules it imports); inputs and outputs
+# are functions of the step's arguments
+STEPS = [
+    {
+        "name": "generate",
+        "script": "generate_training_data.py",
+        "code": ["generate_training_data.py", "tag_bitset.py", "shards.py", "checkpoint.py", "term_automaton.py",
+                 "stratified.py", "../scripts/partition_catalog.py", "score_cache.py", "budget_sweep.py"],
+        "inputs": generate_inputs,
+        "outputs": generate_outputs,
+    },
+    {
+        "name": "train",
+        "script": "train.py",
+        "code": ["train.py", "hparam_search.py", "stream_train.py", "shards.py", "tree_export.py", "incremental.py"],
+        "inputs": train_inputs,
+        "outputs": train_outputs,
+    },
+]
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def spec_digest() -> str:
+    """feature_spec.json without category_list and model_version (the pipeline's steps rewrite those)."""
+    spec = json.loads(SPEC_PATH.read_text(encoding="utf-8"))
+    spec.pop("category_list", None)
+    spec.pop("model_version", None)
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def step_key(step: dict, args: list) -> str:
+    h = hashlib.sha256()
+    h.update(step["name"].encode("utf-8"))
+    for name in step["code"]:
+        h.update(name.encode("utf-8"))
+        h.update(file_digest(ML_DIR / name).encode("ascii"))
+    for path in step["inputs"](args):
+        if not path.exists():
+            raise SystemExit(f"Missing input for {step['name']}: {path}")
+        h.update(_relpath(path).encode("utf-8"))
+        h.update(file_digest(path).encode("ascii"))
+    if step["name"] == "generate":
+        h.update(spec_digest().encode("ascii"))
+    h.update(json.dumps(args).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _relpath(path: Path) -> str:
+    return os.path.relpath(path, PROJECT_ROOT)
+
+
+def _object_path(digest: str) -> Path:
+    return STORE_DIR / "objects" / digest[:2] / digest
+
+
+def _manifest_path(step: dict, key: str) -> Path:
+    return STORE_DIR / "steps" / step["name"] / f"{key}.json"
+
+
+def store_outputs(step: dict, key: str, args: list, seconds: float):
+    outputs = {}
+    for path in step["outputs"](args):
+        digest = file_digest(path)
+        obj = _object_path(digest)
+        if not obj.exists():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            tmp = obj.with_suffix(".tmp")
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, obj)
+        outputs[_relpath(path)] = digest
+    manifest = _manifest_path(step, key)
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    manifest.write_text(json.dumps({"outputs": outputs, "seconds": round(seconds, 2),
+                                    "created": time.strftime("%Y-%m-%dT%H:%M:%S")}, indent=2),
+                        encoding="utf-8")
+
+
+def restore_outputs(step: dict, key: str) -> bool:
+    """Copy a cached step's outputs into place; False if the key or a blob is missing."""
+    manifest = _manifest_path(step, key)
+    if not manifest.exists():
+        return False
+    outputs = json.loads(manifest.read_text(encoding="utf-8"))["outputs"]
+    if not all(_object_path(d).exists() for d in outputs.values()):
+        return False
+    for rel, digest in outputs.items():
+        target = PROJECT_ROOT / rel
+        if target.exists() and file_digest(target) == digest:
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + ".restore")
+        shutil.copyfile(_object_path(digest), tmp)
+        os.replace(tmp, target)
+    return True
+
+
+def run_step(step: dict, args: list, force: bool):
+    key = step_key(step, args)
+    if not force and restore_outputs(step, key):
+        print(f"[{step['name']}] cached ({key[:12]}), outputs restored")
+        return
+    print(f"[{step['name']}] running {step['script']} ({key[:12]})")
+    started = time.perf_counter()
+    subprocess.run([sys.executable, str(ML_DIR / step["script"]), *args], cwd=PROJECT_ROOT, check=True)
+    seconds = time.perf_counter() - started
+    store_outputs(step, key, args, seconds)
+    print(f"[{step['name']}] stored in {seconds:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ML pipeline with a content-addressed artifact cache.")
+    parser.add_argument("--force", action="store_true", help="re-run every step even if it is cached")
+    argv = sys.argv[1:]
+    split = argv.index("--") if "--" in argv else len(argv)
+    args, train_args = parser.parse_known_args(argv[:split])
+    step_args = {"generate": argv[split + 1:], "train": train_args}
+
+    for step in STEPS:
+        run_step(step, step_args[step["name"]], args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Recall / NDCG / latency benchmark for approximate candidate retrieval.
+
+For a fixed, seeded set of quiz profiles, the exact answer is computed by brute force:
+every active product whose price range overlaps the budget is scored, and the top K are
+kept. The scorer is either the model (--scorer model: features as in
+generate_training_data.py, scored by the flat trees or model.onnx) or the keyword
+score_product (--scorer keyword). Inactive products (active = false in products.csv) are
+dropped once, before any strategy runs, so the exact answer and every strategy draw from
+the same products (the embedding and IVF searches filter on active too, as the app does).
+
+Each strategy proposes a candidate set, the same scorer ranks it, and its top K is
+compared with the exact top K:
+  recall@K  share of the exact top K found; ties at the K-th exact score count as hits
+  NDCG@K    linear gains from the exact scores, normalised by the ideal ordering
+  latency   candidate generation + scoring, per query (mean and p95)
+Strategies whose inputs are missing (ml/embeddings/, ml/ann_index/) are skipped.
+
+Results go to ml/retrieval_bench.json, with the latency/recall Pareto frontier marked.
+If matplotlib is installed, the frontier is also plotted to ml/retrieval_bench.png.
+
+Run from project root: python ml/retrieval_bench.py [--profiles 200] [-k 6] [--scorer model]
+"""
+
+import argparse
+import csv
+import json
+import math
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+
+from generate_training_data import (
+    PRODUCTS_CSV, bucket_products, candidates_for, extract_features, load_catalog, random_profile, score_product,
+    score_product_bits,
+)
+
+ML_DIR = Path(__file__).resolve().parent
+SPEC_PATH = ML_DIR / "feature_spec.json"
+REPORT_JSON = ML_DIR / "retrieval_bench.json"
+REPORT_PNG = ML_DIR / "retrieval_bench.png"
+
+SEED = 42
+APP_CANDIDATES = 30  # MAX_CANDIDATES in src/lib/retrieval.ts
+
+
+class KeywordScorer:
+    name = "keyword"
+
+    def score(self, profile: dict, products: list) -> np.ndarray:
+        tags = profile["derived_tags"]
+        return np.array([score_product(tags, p) for p in products], dtype=np.float64)
+
+
+class ModelScorer:
+    """Relevance probability from model_trees.json (if exported) or model.onnx."""
+
+    name = "model"
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.spec = json.loads(SPEC_PATH.read_text(encoding="utf-8"))
+        from tree_export import TREES_JSON, FlatTrees
+
+        if TREES_JSON.exists():
+            trees = FlatTrees.load()
+            self.predict = lambda X: trees.predict_proba(X)[:, 1]
+            self.backend = "flat trees"
+            return
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise SystemExit("No ml/model_trees.json and onnxruntime is not installed; use --scorer keyword")
+        session = ort.InferenceSession(str(ML_DIR / "model.onnx"), providers=["CPUExecutionProvider"])
+        input_name = session.get_inputs()[0].name
+
+        def predict(X):
+            proba = session.run(None, {input_name: X})[-1]
+            return np.array([r[1] for r in proba]) if isinstance(proba, list) else proba[:, -1]
+
+        self.predict = predict
+        self.backend = "onnxruntime"
+
+    def score(self, profile: dict, products: list) -> np.ndarray:
+        if not products:
+            return np.empty(0)
+        mask, extras = self.engine.profile_mask(profile["derived_tags"])
+        X = np.array([
+            extract_features(profile, p, self.spec["category_list"], self.spec, self.engine.overlap(mask, extras, p))
+            for p in products
+        ], dtype=np.float32)
+        return np.asarray(self.predict(X), dtype=np.float64)
+
+
+def active_ids(path: Path = PRODUCTS_CSV) -> set:
+    """Ids of products not marked active = false (as embeddings.read_catalog and prisma/seed.ts)."""
+    with open(path, encoding="utf-8") as f:
+        return {row["id"] for row in csv.DictReader(f)
+                if row.get("id") and (row.get("active") or "true").strip().lower() != "false"}
+
+
+def in_budget(profile: dict, products: list) -> list:
+    return [p for p in products if p["price_max"] >= profile["budget_min"] and p["price_min"] <= profile["budget_max"]]
+
+
+def top_k(scorer, profile: dict, candidates: list, k: int) -> tuple:
+    """(product ids, scores) of the best k candidates; stable on ties, like the app's sort."""
+    scores = scorer.score(profile, candidates)
+    order = np.argsort(-scores, kind="stable")[:k]
+    return [candidates[i]["id"] for i in order], scores[order]
+
+
+def build_strategies(products, engine, products_by_price, k: int) -> dict:
+    """name -> function(profile) returning candidate products."""
+    strategies = {
+        "exact": lambda profile: in_budget(profile, products),
+        "price-buckets": lambda profile: candidates_for(profile, products_by_price),
+    }
+
+    def sample(n):
+        rng = random.Random(SEED)
+
+        def candidates(profile):
+            pool = candidates_for(profile, products_by_price)
+            return pool if len(pool) <= n else rng.sample(pool, n)
+        return candidates
+
+    def keyword_top(m):
+        def candidates(profile):
+            pool = candidates_for(profile, products_by_price)
+            mask, extras = engine.profile_mask(profile["derived_tags"])
+            scores = [score_product_bits(engine, mask, extras, profile["derived_tags"], p) for p in pool]
+            order = sorted(range(len(pool)), key=lambda i: -scores[i])[:m]
+            return [pool[i] for i in order]
+        return candidates
+
+    for n in (250, 1000):
+        strategies[f"sample-{n}"] = sample(n)
+    for m in (APP_CANDIDATES, 100):
+        strategies[f"keyword-top-{m}"] = keyword_top(m)
+
+    by_id = {p["id"]: p for p in products}
+    pool = max(100, 10 * k)
+    if (ML_DIR / "embeddings" / "meta.json").exists():
+        from embeddings import ProductEmbeddings
+
+        emb = ProductEmbeddings()
+        strategies[f"embeddings-{pool}"] = lambda profile: [
+            by_id[pid] for pid, _ in emb.search_profile(profile["derived_tags"], pool,
+                                                        (profile["budget_min"], profile["budget_max"]))
+            if pid in by_id
+        ]
+        if (ML_DIR / "ann_index" / "meta.json").exists():
+            from ann_index import IVFIndex
+
+            index = IVFIndex()
+
+            def ivf(nprobe):
+                def candidates(profile):
+                    from embeddings import profile_text
+
+                    q = emb.embed([profile_text(profile["derived_tags"])])[0]
+                    rows, _ = index.search(q, pool, nprobe, (profile["budget_min"], profile["budget_max"]))
+                    return [by_id[str(emb.ids[r])] for r in rows if str(emb.ids[r]) in by_id]
+                return candidates
+
+            for nprobe in (1, 4, 16):
+                strategies[f"ivf-{pool}-nprobe{nprobe}"] = ivf(nprobe)
+    return strategies
+
+
+def ndcg(retrieved_scores, ideal_scores) -> float:
+    discounts = 1.0 / np.log2(np.arange(2, len(ideal_scores) + 2))
+    ideal = float(np.dot(ideal_scores, discounts))
+    if ideal <= 0:
+        return 1.0
+    got = np.zeros(len(ideal_scores))
+    got[:len(retrieved_scores)] = retrieved_scores
+    return float(np.dot(got, discounts)) / ideal
+
+
+def pareto_frontier(results: list) -> list:
+    """Names of strategies not beaten on both mean latency and recall by another strategy."""
+    frontier, best_recall = [], -1.0
+    for r in sorted(results, key=lambda r: (r["mean_ms"], -r["recall"])):
+        if r["recall"] > best_recall:
+            frontier.append(r["strategy"])
+            best_recall = r["recall"]
+    return frontier
+
+
+def plot(results: list, frontier: list, path: Path) -> bool:
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return False
+    fig, ax = plt.subplots(figsize=(7, 4.5))
+    for r in results:
+        on_frontier = r["strategy"] in frontier
+        ax.scatter(r["mean_ms"], r["recall"], color="tab:red" if on_frontier else "tab:gray")
+        ax.annotate(r["strategy"], (r["mean_ms"], r["recall"]), fontsize=7, xytext=(4, 2), textcoords="offset points")
+    front = sorted((r for r in results if r["strategy"] in frontier), key=lambda r: r["mean_ms"])
+    ax.plot([r["mean_ms"] for r in front], [r["recall"] for r in front], color="tab:red", linewidth=1)
+    ax.set_xscale("log")
+    ax.set_xlabel("mean latency per query (ms, log)")
+    ax.set_ylabel("recall@K")
+    ax.set_title("Candidate retrieval: recall vs latency")
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    return True
+
+
+def run(num_profiles: int, k: int, scorer_name: str) -> dict:
+    products, engine, _ = load_catalog()
+    active = active_ids()
+    products = [p for p in products if p["id"] in active]
+    products_by_price = bucket_products(products)
+    scorer = ModelScorer(engine) if scorer_name == "model" else KeywordScorer()
+    random.seed(SEED)
+    profiles = [random_profile() for _ in range(num_profiles)]
+
+    # Exact answers by brute force over the whole catalog
+    truth = [top_k(scorer, profile, in_budget(profile, products), k)[1] for profile in profiles]
+
+    strategies = build_strategies(products, engine, products_by_price, k)
+    results = []
+    for name, candidates_fn in strategies.items():
+        recalls, ndcgs, times, sizes = [], [], [], []
+        for profile, exact_scores in zip(profiles, truth):
+            started = time.perf_counter()
+            candidates = candidates_fn(profile)
+            _, got_scores = top_k(scorer, profile, candidates, k)
+            times.append((time.perf_counter() - started) * 1000)
+            sizes.append(len(candidates))
+            if not len(exact_scores):
+                continue
+            # Strategies rank with the same scorer, so got_scores are exact scores;
+            # anything scoring at least the K-th exact score is as good as an exact hit
+            hits = int(np.sum(got_scores >= exact_scores[-1]))
+            recalls.append(min(1.0, hits / len(exact_scores)))
+            ndcgs.append(ndcg(got_scores, exact_scores))
+        results.append({
+            "strategy": name,
+            "recall": float(np.mean(recalls)) if recalls else math.nan,
+            "ndcg": float(np.mean(ndcgs)) if ndcgs else math.nan,
+            "mean_ms": float(np.mean(times)),
+            "p95_ms": float(np.percentile(times, 95)),
+            "mean_candidates": float(np.mean(sizes)),
+        })
+
+    frontier = pareto_frontier(results)
+    for r in results:
+        r["pareto"] = r["strategy"] in frontier
+    backend = getattr(scorer, "backend", "score_product")
+    report = {"profiles": num_profiles, "k": k, "scorer": scorer.name, "backend": backend,
+              "catalog_rows": len(products), "results": results, "pareto_frontier": frontier}
+    REPORT_JSON.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(f"{len(products)} products, {num_profiles} profiles, K={k}, scorer={scorer.name} ({backend})")
+    print(f"{'strategy':<26}{'recall@K':>10}{'NDCG@K':>9}{'mean ms':>10}{'p95 ms':>9}{'cands':>9}  pareto")
+    for r in results:
+        print(f"{r['strategy']:<26}{r['recall']:>10.3f}{r['ndcg']:>9.3f}{r['mean_ms']:>10.2f}"
+              f"{r['p95_ms']:>9.2f}{r['mean_candidates']:>9.0f}  {'*' if r['pareto'] else ''}")
+    print(f"Wrote {REPORT_JSON}")
+    if plot(results, frontier, REPORT_PNG):
+        print(f"Plotted {REPORT_PNG}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/NDCG/latency of candidate retrieval strategies vs exact top-K.")
+    parser.add_argument("--profiles", type=int, default=200, help="seeded quiz profiles to evaluate")
+    parser.add_argument("-k", type=int, default=6, help="results per query (the app shows 6)")
+    parser.add_argument("--scorer", choices=["model", "keyword"], default="model")
+    args = parser.parse_args()
+    run(args.profiles, args.k, args.scorer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Keyword-score cache shared by profiles with the same derived tag set (opt-in: --score-cache-mb).
+
+score_product only depends on the profile's tags and the product, not on the budget. So a
+profile whose frozenset(derived_tags) was seen before can reuse that tag set's scores. Each
+tag set maps catalog row -> score for the products some profile with those tags actually
+scored, i.e. its budget-filtered candidates, so memory grows with the candidates scored and
+not with the catalog. A profile looks up its own candidates and scores only the ones still
+missing. Tag sets are kept in LRU order and evicted once their estimated size passes
+max_bytes.
+
+The cache only pays off when tag sets repeat; with the default random profile mix they
+rarely do, so it is off by default. Sharded runs split the budget across the workers.
+
+Scores are exactly score_product_bits(), so the generated rows do not change.
+"""
+
+import sys
+from collections import OrderedDict
+
+DEFAULT_MAX_MB = 0  # off unless --score-cache-mb is given
+BYTES_PER_SCORE = 32  # row key (int object) per cached score; scores are small cached ints
+
+
+class ScoreCache:
+    def __init__(self, products: list, engine, score_fn, max_bytes: int):
+        self._score = score_fn  # score_product_bits
+        self.engine = engine
+        for row, p in enumerate(products):
+            p["row"] = row
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # frozenset(tags) -> {catalog row: score}
+        self.sizes = {}  # frozenset(tags) -> estimated bytes of its entry
+        self.bytes = 0
+        self.tag_set_hits = self.tag_set_misses = 0
+        self.scores_reused = self.scores_computed = 0
+        self.evictions = 0
+
+    def _entry(self, key: frozenset) -> dict:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.tag_set_hits += 1
+            return entry
+        self.tag_set_misses += 1
+        entry = self.entries[key] = {}
+        self.sizes[key] = 0
+        return entry
+
+    def _resize(self, key: frozenset, entry: dict):
+        size = sys.getsizeof(entry) + BYTES_PER_SCORE * len(entry)
+        self.bytes += size - self.sizes[key]
+        self.sizes[key] = size
+        while self.bytes > self.max_bytes and self.entries:
+            old, _ = self.entries.popitem(last=False)
+            self.bytes -= self.sizes.pop(old)
+            self.evictions += 1
+
+    def scores(self, profile_tags, candidates: list, mask: int, extras: list) -> list:
+        """score_product_bits() of each candidate (mask, extras from engine.profile_mask(profile_tags))."""
+        key = frozenset(profile_tags)
+        entry = self._entry(key)
+        got = []
+        computed = 0
+        for p in candidates:
+            score = entry.get(p["row"])
+            if score is None:
+                score = entry[p["row"]] = self._score(self.engine, mask, extras, profile_tags, p)
+                computed += 1
+            got.append(score)
+        self.scores_computed += computed
+        self.scores_reused += len(candidates) - computed
+        if computed:
+            self._resize(key, entry)
+        return got
+
+    def stats(self) -> dict:
+        lookups = self.tag_set_hits + self.tag_set_misses
+        scores = self.scores_reused + self.scores_computed
+        return {
+            "tag_sets": len(self.entries),
+            "tag_set_hit_rate": self.tag_set_hits / lookups if lookups else 0.0,
+            "score_hit_rate": self.scores_reused / scores if scores else 0.0,
+            "scores_computed": self.scores_computed,
+            "bytes": self.bytes,
+            "evictions": self.evictions,
+        }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (f"Score cache: {s['tag_sets']} tag sets, {s['bytes'] / 1024:.0f} KiB, "
+                f"tag-set hit rate {100 * s['tag_set_hit_rate']:.1f}%, "
+                f"scores reused {100 * s['score_hit_rate']:.1f}%, {s['evictions']} evictions")
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Local micro-batching scoring service for model.onnx.
+
+Loads model.onnx, feature_spec.json and prisma/products.csv once, then serves over HTTP:
+  POST /score    {"profile": <quiz form>, "product_ids": [...]} -> {"scores": [...], "missing": [...]}
+  GET  /metrics  queue depth, batch-size histogram, request/row counters, inference timings
+  GET  /health
+
+Concurrent requests are merged into one model call per micro-batch: a batch closes when it
+holds --max-batch rows or when its first request has waited --max-wait-ms. Batches run on a
+thread pool (onnxruntime releases the GIL), so up to --workers batches are in flight.
+Features are computed the same way as generate_training_data.py.
+
+Run from project root: python ml/serve.py [--port 8500] [--max-batch 1024] [--max-wait-ms 5]
+Requires: onnxruntime (pip install onnxruntime)
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from generate_training_data import PROFILE_VOCABULARY, extract_features, load_products
+from tag_bitset import TagBitsetEngine
+
+ML_DIR = Path(__file__).resolve().parent
+MODEL_ONNX = ML_DIR / "model.onnx"
+SPEC_PATH = ML_DIR / "feature_spec.json"
+
+MAX_BODY_BYTES = 1 << 20
+
+
+def profile_from_form(form: dict) -> dict:
+    """Quiz form (as posted to /api/recommend) -> profile dict used by extract_features."""
+    interests = [str(t) for t in form.get("interests") or []]
+    daily_life = [str(t) for t in form.get("daily_life") or []]
+    occasion = form.get("occasion") or "birthday"
+    relationship = form.get("relationship") or "friend"
+    age_range = form.get("age_range") or "25-34"
+    # Same normalisation as derivedTags() in src/lib/mlInference.ts
+    derived = {"_".join(str(t).lower().split()) for t in [occasion, relationship, age_range, *interests, *daily_life] if t}
+    return {
+        "occasion": occasion,
+        "relationship": relationship,
+        "age_range": age_range,
+        "budget_min": float(form.get("budget_min") or 0),
+        "budget_max": float(form.get("budget_max") or 100),
+        "interest_count": len(interests),
+        "daily_life_count": len(daily_life),
+        "derived_tags": derived,
+    }
+
+
+class Scorer:
+    """model.onnx + feature computation for (profile, product id) pairs."""
+
+    def __init__(self):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise SystemExit("onnxruntime not installed. Run: python3 -m pip install onnxruntime")
+        self.spec = json.loads(SPEC_PATH.read_text(encoding="utf-8"))
+        self.session = ort.InferenceSession(str(MODEL_ONNX), providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        products = load_products()
+        self.engine = TagBitsetEngine(PROFILE_VOCABULARY)
+        self.engine.annotate(products)
+        self.products = {p["id"]: p for p in products}
+
+    def features(self, form: dict, product_ids: list):
+        profile = profile_from_form(form)
+        mask, extras = self.engine.profile_mask(profile["derived_tags"])
+        rows, found, missing = [], [], []
+        for pid in product_ids:
+            p = self.products.get(pid)
+            if p is None:
+                missing.append(pid)
+                continue
+            overlap = self.engine.overlap(mask, extras, p)
+            rows.append(extract_features(profile, p, self.spec["category_list"], self.spec, overlap))
+            found.append(pid)
+        X = np.asarray(rows, dtype=np.float32).reshape(len(rows), len(self.spec["feature_names"]))
+        return X, found, missing
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        proba = self.session.run(None, {self.input_name: X})[-1]
+        if isinstance(proba, list):  # ZipMap output: one {label: probability} dict per row
+            return np.array([row[1] for row in proba], dtype=np.float32)
+        return proba[:, 1] if proba.ndim == 2 and proba.shape[1] == 2 else proba.reshape(-1)
+
+
+class MicroBatcher:
+    """Merge concurrent submit() calls into batched predict() calls on a worker pool."""
+
+    def __init__(self, predict, max_batch_rows: int, max_wait_ms: float, workers: int):
+        self.predict = predict
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.in_flight = asyncio.Semaphore(workers)
+        self.queued_rows = 0
+        self._tasks = set()
+        self.stats = {
+            "requests": 0,
+            "rows": 0,
+            "batches": 0,
+            "max_queue_depth": 0,
+            "batch_size_histogram": {},  # power-of-two upper bound -> batches
+            "inference_seconds_total": 0.0,
+            "inference_seconds_max": 0.0,
+        }
+
+    async def submit(self, X: np.ndarray) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((X, future))
+        self.queued_rows += len(X)
+        self.stats["requests"] += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue.qsize())
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while rows < self.max_batch_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            self.queued_rows -= rows
+            await self.in_flight.acquire()
+            task = loop.create_task(self._dispatch(batch, rows))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: list, rows: int):
+        loop = asyncio.get_running_loop()
+        try:
+            X = np.concatenate([x for x, _ in batch])
+            started = time.perf_counter()
+            scores = await loop.run_in_executor(self.pool, self.predict, X)
+            elapsed = time.perf_counter() - started
+        except Exception as e:  # surface model errors on every request of the batch
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.in_flight.release()
+        self._record(rows, elapsed)
+        offset = 0
+        for x, future in batch:
+            if not future.done():
+                future.set_result(scores[offset:offset + len(x)])
+            offset += len(x)
+
+    def _record(self, rows: int, elapsed: float):
+        s = self.stats
+        s["batches"] += 1
+        s["rows"] += rows
+        s["inference_seconds_total"] += elapsed
+        s["inference_seconds_max"] = max(s["inference_seconds_max"], elapsed)
+        bucket = str(1 << max(0, rows - 1).bit_length())
+        s["batch_size_histogram"][bucket] = s["batch_size_histogram"].get(bucket, 0) + 1
+
+    def metrics(self) -> dict:
+        s = self.stats
+        return {
+            **s,
+            "queue_depth": self.queue.qsize(),
+            "queued_rows": self.queued_rows,
+            "mean_batch_rows": s["rows"] / s["batches"] if s["batches"] else 0.0,
+            "mean_inference_ms": 1000 * s["inference_seconds_total"] / s["batches"] if s["batches"] else 0.0,
+            "max_batch_rows": self.max_batch_rows,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+class ScoringServer:
+    def __init__(self, scorer: Scorer, batcher: MicroBatcher):
+        self.scorer = scorer
+        self.batcher = batcher
+
+    async def score(self, body: dict) -> dict:
+        form = body.get("profile") or {}
+        product_ids = [str(pid) for pid in body.get("product_ids") or []]
+        X, found, missing = self.scorer.features(form, product_ids)
+        scores = await self.batcher.submit(X) if len(X) else np.empty(0)
+        return {
+            "scores": [{"product_id": pid, "score": float(s)} for pid, s in zip(found, scores)],
+            "missing": missing,
+        }
+
+    async def route(self, method: str, path: str, body: bytes):
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok", "products": len(self.scorer.products)}
+        if method == "GET" and path == "/metrics":
+            return 200, self.batcher.metrics()
+        if method == "POST" and path == "/score":
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                return 400, {"error": "invalid JSON body"}
+            if not isinstance(payload, dict):
+                return 400, {"error": "body must be a JSON object"}
+            return 200, await self.score(payload)
+        return 404, {"error": f"no route for {method} {path}"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Minimal HTTP/1.1 with keep-alive; one request at a time per connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                if len(parts) < 2:
+                    break
+                method, path = parts[0].upper(), parts[1].split("?", 1)[0]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    status, payload = 413, {"error": "body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        status, payload = await self.route(method, path, body)
+                    except Exception as e:
+                        status, payload = 500, {"error": str(e)}
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int, max_batch: int, max_wait_ms: float, workers: int):
+    scorer = Scorer()
+    batcher = MicroBatcher(scorer.predict, max_batch, max_wait_ms, workers)
+    app = ScoringServer(scorer, batcher)
+    batch_task = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(app.handle, host, port)
+    print(f"Scoring {len(scorer.products)} products on http://{host}:{port} "
+          f"(max batch {max_batch} rows, max wait {max_wait_ms} ms, {workers} workers)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching HTTP scoring service for model.onnx.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8500)
+    parser.add_argument("--max-batch", type=int, default=1024, help="rows per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="longest a request waits for its batch to fill")
+    parser.add_argument("--workers", type=int, default=2, help="batches scored concurrently")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_batch, args.max_wait_ms, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
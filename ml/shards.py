@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Sharded training dataset: N .npz shards plus manifest.json.
+
+Each shard holds X (float32, rows x features), y (int8 labels) and product_id.
+The manifest records per-shard row counts, label balance and a SHA-256 of the shard file,
+so readers can verify shards, load them in parallel and split train/validation by shard
+without shuffling rows.
+"""
+
+import hashlib
+import json
+import random
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+SHARD_DIR = Path(__file__).resolve().parent / "training_shards"
+MANIFEST_NAME = "manifest.json"
+
+
+def shard_name(index: int) -> str:
+    return f"shard-{index:05d}.npz"
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_shard(shard_dir: Path, index: int, rows: list, num_features: int) -> dict:
+    """Write rows ([*features, product_id, label]) as one shard; returns its manifest entry."""
+    X = np.array([r[:num_features] for r in rows], dtype=np.float32).reshape(len(rows), num_features)
+    y = np.array([r[-1] for r in rows], dtype=np.int8)
+    product_id = np.array([r[num_features] for r in rows], dtype=str)
+    path = Path(shard_dir) / shard_name(index)
+    tmp = path.with_name(path.name + ".tmp.npz")
+    np.savez(tmp, X=X, y=y, product_id=product_id)
+    tmp.replace(path)
+    positives = int(y.sum())
+    return {
+        "file": path.name,
+        "rows": len(rows),
+        "positives": positives,
+        "negatives": len(rows) - positives,
+        "sha256": file_sha256(path),
+    }
+
+
+def write_manifest(shard_dir: Path, entries: list, feature_names: list, **extra):
+    entries = sorted(entries, key=lambda e: e["file"])
+    manifest = {
+        "feature_names": feature_names,
+        "total_rows": sum(e["rows"] for e in entries),
+        "total_positives": sum(e["positives"] for e in entries),
+        **extra,
+        "shards": entries,
+    }
+    (Path(shard_dir) / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+def read_manifest(shard_dir: Path) -> dict:
+    path = Path(shard_dir) / MANIFEST_NAME
+    if not path.exists():
+        raise SystemExit(f"No {MANIFEST_NAME} in {shard_dir}; run generate_training_data.py --shards N first")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def load_shard(shard_dir: Path, entry: dict, verify: bool = True):
+    path = Path(shard_dir) / entry["file"]
+    if verify and file_sha256(path) != entry["sha256"]:
+        raise SystemExit(f"Checksum mismatch for {path}")
+    with np.load(path) as data:
+        return data["X"], data["y"].astype(np.int64)
+
+
+def load_shards(shard_dir: Path, entries: list, workers: int = 8, verify: bool = True):
+    """Load and concatenate shards with a thread pool (file reads and hashing release the GIL)."""
+    if not entries:
+        raise SystemExit("No shards to load")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(lambda e: load_shard(shard_dir, e, verify), entries))
+    return np.concatenate([X for X, _ in parts]), np.concatenate([y for _, y in parts])
+
+
+def split_shards(manifest: dict, val_fraction: float = 0.15, seed: int = 42):
+    """Deterministic shard-level train/validation split: (train entries, validation entries)."""
+    entries = [e for e in manifest["shards"] if e["rows"]]
+    order = list(range(len(entries)))
+    random.Random(seed).shuffle(order)
+    num_val = max(1, round(len(entries) * val_fraction)) if len(entries) > 1 else 0
+    val_idx = set(order[:num_val])
+    train = [e for i, e in enumerate(entries) if i not in val_idx]
+    val = [e for i, e in enumerate(entries) if i in val_idx]
+    return train, val
+
+
+def shard_row_ids(manifest: dict, entries: list) -> np.ndarray:
+    """Row ids of entries' rows: positions in all of the manifest's shards concatenated in file order."""
+    offsets, start = {}, 0
+    for e in manifest["shards"]:
+        offsets[e["file"]] = start
+        start += e["rows"]
+    if not entries:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([np.arange(offsets[e["file"]], offsets[e["file"]] + e["rows"], dtype=np.int64)
+                           for e in entries])
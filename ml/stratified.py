@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Stratified negative sampling and coverage tracking for generate_training_data.py --time-budget.
+
+The catalog is split into strata by top-level category and price band (price_band() from
+scripts/partition_catalog.py). For each profile, the non-top candidates are grouped by
+stratum and the negatives are drawn per stratum, so small categories and price bands are not
+crowded out by the big ones:
+  - if the candidates span at most k strata, each stratum gets one negative and the rest of
+    the k is split in proportion to stratum size (largest remainder)
+  - otherwise k strata are chosen uniformly and each gives one negative
+Either way every candidate's inclusion probability is known. Its weight is 1 / probability,
+rescaled so the negatives of a profile sum to the number drawn (positives have weight 1). The
+weights undo the oversampling of small strata without changing the class balance.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# One price band scheme for the catalog partitions and the strata
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from partition_catalog import price_band  # noqa: E402
+
+
+def stratum_of(product: dict) -> tuple:
+    return (product["category"].split("|")[0].strip() or "other", price_band(product["price_min"]))
+
+
+def allocate(sizes: dict, k: int, rng) -> tuple:
+    """(stratum -> draws, stratum selection probability) for k draws over strata of the given sizes."""
+    if len(sizes) > k:
+        chosen = rng.sample(sorted(sizes), k)
+        return {s: 1 for s in chosen}, k / len(sizes)
+    alloc = {s: 1 for s in sizes}
+    spare = min(k, sum(sizes.values())) - len(sizes)
+    if spare > 0:
+        room = {s: n - 1 for s, n in sizes.items()}
+        total = sum(room.values())
+        shares = {s: spare * r / total for s, r in room.items()}
+        extra = {s: int(share) for s, share in shares.items()}
+        leftover = spare - sum(extra.values())
+        for s in sorted(shares, key=lambda s: (extra[s] - shares[s], s))[:leftover]:
+            extra[s] += 1
+        for s in alloc:
+            alloc[s] += min(extra[s], room[s])
+    return alloc, 1.0
+
+
+def sample_negatives(pool: list, k: int, rng) -> list:
+    """[(product, weight)]: up to k products drawn from pool by stratum (see module docstring)."""
+    by_stratum = {}
+    for p in pool:
+        by_stratum.setdefault(stratum_of(p), []).append(p)
+    sizes = {s: len(ps) for s, ps in by_stratum.items()}
+    alloc, selection = allocate(sizes, k, rng)
+    drawn = []
+    for s in sorted(alloc):
+        inclusion = selection * alloc[s] / sizes[s]
+        drawn.extend((p, 1.0 / inclusion) for p in rng.sample(by_stratum[s], alloc[s]))
+    scale = len(drawn) / sum(w for _, w in drawn) if drawn else 1.0
+    return [(p, w * scale) for p, w in drawn]
+
+
+class Coverage:
+    """Per-stratum counts over a run: catalog size, candidate appearances, rows and distinct products."""
+
+    def __init__(self, products: list):
+        self.strata = {}
+        for p in products:
+            self._entry(stratum_of(p))["catalog_products"] += 1
+
+    def _entry(self, stratum: tuple) -> dict:
+        entry = self.strata.get(stratum)
+        if entry is None:
+            entry = self.strata[stratum] = {"catalog_products": 0, "candidate_appearances": 0,
+                                            "positives": 0, "negatives": 0, "negative_weight": 0.0,
+                                            "products": set()}
+        return entry
+
+    def add_candidates(self, products: list):
+        for p in products:
+            self._entry(stratum_of(p))["candidate_appearances"] += 1
+
+    def add_row(self, product: dict, label: int, weight: float):
+        entry = self._entry(stratum_of(product))
+        entry["positives" if label else "negatives"] += 1
+        if not label:
+            entry["negative_weight"] += weight
+        entry["products"].add(product["id"])
+
+    def report(self, **summary) -> dict:
+        strata = []
+        for (category, band), e in sorted(self.strata.items()):
+            strata.append({
+                "category": category,
+                "price_band": band,
+                "catalog_products": e["catalog_products"],
+                "candidate_appearances": e["candidate_appearances"],
+                "positives": e["positives"],
+                "negatives": e["negatives"],
+                "negative_weight": round(e["negative_weight"], 3),
+                "products_covered": len(e["products"]),
+            })
+        reachable = [s for s in strata if s["candidate_appearances"]]
+        return {
+            **summary,
+            "strata": len(strata),
+            "strata_reachable": len(reachable),
+            "strata_sampled": sum(1 for s in reachable if s["positives"] or s["negatives"]),
+            "by_stratum": strata,
+        }
+
+    def write(self, path: Path, **summary) -> dict:
+        report = self.report(**summary)
+        path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        return report
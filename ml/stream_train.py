@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Out-of-core sampling for train.py (python ml/train.py --streaming).
+
+The training CSV is read once in fixed-size chunks. Every row gets a uniform random key;
+each label keeps the rows with the smallest keys in a bounded reservoir, which is a
+uniform sample without replacement of that label. Rows are routed to a train or a
+validation reservoir by a Bernoulli draw. Memory is capped by --max-rows and the chunk
+size, not by the file size, so 100M+ row files train on a 16 GB machine.
+
+Each sampled row carries the weight rows_seen / rows_kept of its label and split, so the
+weighted sample reproduces the class balance of the full file. If the file has a
+sample_weight column (generate_training_data.py --time-budget), that inclusion weight is
+multiplied in, so the stratified sampling is undone as in the in-memory path. Rows keep their position in
+the file as an id (train.py keeps its --update holdout out of the final fit by id).
+"""
+
+import numpy as np
+import pandas as pd
+
+VAL_FRACTION = 0.15
+SEED = 42
+
+
+class Reservoir:
+    """Keep the k rows with the smallest random keys (uniform sample of everything offered)."""
+
+    def __init__(self, capacity: int, num_features: int):
+        self.capacity = capacity
+        self.keys = np.empty(0, dtype=np.float64)
+        self.X = np.empty((0, num_features), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.w = np.empty(0, dtype=np.float64)  # per-row inclusion weights
+        self.seen = 0
+
+    def offer(self, X: np.ndarray, keys: np.ndarray, ids: np.ndarray, w: np.ndarray):
+        self.seen += len(X)
+        if len(self.keys) >= self.capacity:
+            # Only rows below the current k-th smallest key can enter
+            keep = keys < self.keys.max()
+            X, keys, ids, w = X[keep], keys[keep], ids[keep], w[keep]
+            if not len(keys):
+                return
+        keys = np.concatenate([self.keys, keys])
+        X = np.concatenate([self.X, X])
+        ids = np.concatenate([self.ids, ids])
+        w = np.concatenate([self.w, w])
+        if len(keys) > self.capacity:
+            idx = np.argpartition(keys, self.capacity - 1)[: self.capacity]
+            keys, X, ids, w = keys[idx], X[idx], ids[idx], w[idx]
+        self.keys, self.X, self.ids, self.w = keys, X, ids, w
+
+    @property
+    def weight(self) -> float:
+        return self.seen / len(self.keys) if len(self.keys) else 0.0
+
+
+def _stack(reservoirs: dict):
+    X = np.concatenate([r.X for r in reservoirs.values()])
+    y = np.concatenate([np.full(len(r.X), label, dtype=np.int64) for label, r in reservoirs.items()])
+    w = np.concatenate([r.weight * r.w for r in reservoirs.values()])
+    ids = np.concatenate([r.ids for r in reservoirs.values()])
+    return X, y, w, ids
+
+
+def sample_csv(path, feature_names: list, max_rows: int, chunk_rows: int = 1_000_000):
+    """
+    Stream path and return (X_train, y_train, w_train, ids_train, X_val, y_val, w_val, ids_val);
+    ids are row positions in the file.
+    max_rows caps train + validation rows together; each split holds at most
+    max_rows/2 rows per label.
+    """
+    rng = np.random.default_rng(SEED)
+    val_cap = max(1, int(max_rows * VAL_FRACTION) // 2)
+    train_cap = max(1, (max_rows - 2 * val_cap) // 2)
+    num_features = len(feature_names)
+    dtypes = {name: np.float32 for name in feature_names}
+    dtypes["label"] = np.int64
+    weighted = "sample_weight" in pd.read_csv(path, nrows=0).columns
+    columns = feature_names + ["label"] + (["sample_weight"] if weighted else [])
+
+    train, val = {}, {}
+    total = 0
+    reader = pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunk_rows)
+    for chunk in reader:
+        X = chunk[feature_names].to_numpy(dtype=np.float32)
+        y = chunk["label"].to_numpy()
+        w = chunk["sample_weight"].to_numpy(np.float64) if weighted else np.ones(len(X))
+        to_val = rng.random(len(X)) < VAL_FRACTION
+        keys = rng.random(len(X))
+        ids = np.arange(total, total + len(X), dtype=np.int64)
+        for label in np.unique(y):
+            is_label = y == label
+            for split, reservoirs, cap in ((to_val, val, val_cap), (~to_val, train, train_cap)):
+                rows = is_label & split
+                if rows.any():
+                    res = reservoirs.setdefault(int(label), Reservoir(cap, num_features))
+                    res.offer(X[rows], keys[rows], ids[rows], w[rows])
+        total += len(X)
+        print(f"Streamed {total} rows...", end="\r")
+    print()
+
+    if len(train) < 2 or len(val) < 2:
+        raise SystemExit("Streaming sample needs both labels in train and validation")
+    for name, reservoirs in (("train", train), ("validation", val)):
+        summary = ", ".join(f"label {label}: {len(r.X)}/{r.seen} (w={r.weight:.2f})"
+                            for label, r in sorted(reservoirs.items()))
+        print(f"Sampled {name}: {summary}")
+    return (*_stack(train), *_stack(val))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Bitset tag-overlap engine for training-data generation.
+
+The keyword rule used by score_product / tag_overlap is "t in x or x in t" for every
+(profile tag, product tag) pair. Profile tags come from a small, fixed vocabulary
+(occasions, relationships, ages, interests, daily life), so the relation is precomputed
+once per distinct product tag as a bitmask over that vocabulary, and each product keeps
+the OR of its tags' masks. Overlap then becomes popcount(product_bits & profile_mask),
+per product with Python ints or over a whole catalog with a packed NumPy matrix.
+"""
+
+import numpy as np
+
+# Popcount of every byte value, used when np.bitwise_count is not available (NumPy < 2.0)
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount_rows(words: np.ndarray) -> np.ndarray:
+    """Number of set bits per row of a (n, words) uint64 matrix."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    as_bytes = np.ascontiguousarray(words).view(np.uint8).reshape(words.shape[0], -1)
+    return _BYTE_POPCOUNT[as_bytes].sum(axis=1, dtype=np.int64)
+
+
+def substring_match(a: str, b: str) -> bool:
+    return a in b or b in a
+
+
+class TagBitsetEngine:
+    """Precomputed substring-match relation between a profile vocabulary and product tags."""
+
+    def __init__(self, vocabulary):
+        self.vocabulary = list(dict.fromkeys(vocabulary))
+        self.index = {tag: i for i, tag in enumerate(self.vocabulary)}
+        self.num_words = max(1, (len(self.vocabulary) + 63) // 64)
+        self._tag_masks = {}
+
+    def tag_mask(self, product_tag: str) -> int:
+        """Bitmask of vocabulary tags that match product_tag by substring (cached per tag)."""
+        mask = self._tag_masks.get(product_tag)
+        if mask is None:
+            mask = 0
+            for i, v in enumerate(self.vocabulary):
+                if substring_match(v, product_tag):
+                    mask |= 1 << i
+            self._tag_masks[product_tag] = mask
+        return mask
+
+    def product_bits(self, product_tags) -> int:
+        bits = 0
+        for t in product_tags:
+            bits |= self.tag_mask(t)
+        return bits
+
+    def profile_mask(self, profile_tags):
+        """Return (mask, extras): vocabulary tags as a bitmask, unknown tags as a list."""
+        mask = 0
+        extras = []
+        for t in profile_tags:
+            i = self.index.get(t)
+            if i is None:
+                extras.append(t)
+            else:
+                mask |= 1 << i
+        return mask, extras
+
+    def annotate(self, products):
+        """Store each product's tag bitset under p["tag_bits"]."""
+        for p in products:
+            p["tag_bits"] = self.product_bits(p["tags"])
+        return products
+
+    def overlap(self, mask: int, extras, product: dict) -> int:
+        """Same result as generate_training_data.tag_overlap(profile_tags, product["tags"])."""
+        count = (product["tag_bits"] & mask).bit_count()
+        for t in extras:
+            if any(substring_match(t, x) for x in product["tags"]):
+                count += 1
+        return count
+
+    # --- NumPy batch path ---
+
+    def to_words(self, bits: int) -> np.ndarray:
+        return np.array(
+            [(bits >> (64 * w)) & 0xFFFFFFFFFFFFFFFF for w in range(self.num_words)],
+            dtype=np.uint64,
+        )
+
+    def pack(self, products) -> np.ndarray:
+        """(n_products, num_words) uint64 matrix of annotated products' tag bitsets."""
+        packed = np.zeros((len(products), self.num_words), dtype=np.uint64)
+        for row, p in enumerate(products):
+            bits = p["tag_bits"]
+            w = 0
+            while bits:
+                packed[row, w] = bits & 0xFFFFFFFFFFFFFFFF
+                bits >>= 64
+                w += 1
+        return packed
+
+    def overlap_batch(self, mask: int, extras, packed: np.ndarray, products=None) -> np.ndarray:
+        """Overlap for every row of packed; products is needed only when extras is non-empty."""
+        counts = popcount_rows(packed & self.to_words(mask))
+        if extras:
+            if products is None:
+                raise ValueError("overlap_batch needs products for tags outside the vocabulary")
+            for row, p in enumerate(products):
+                for t in extras:
+                    if any(substring_match(t, x) for x in p["tags"]):
+                        counts[row] += 1
+        return counts
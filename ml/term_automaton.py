@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Aho-Corasick term matching for product titles and categories.
+
+score_product checks `tag in title` and `tag in category` for every profile tag, so each
+title is rescanned once per tag and again for every profile. Here the whole vocabulary is
+compiled into one automaton: the profile vocabulary first (same bit order as
+TagBitsetEngine, so its profile masks apply unchanged), then the getRelatedTerms() expansion
+of each vocabulary term, from SYNONYM_MAP parsed from src/lib/textMatching.ts. Synonym terms
+no vocabulary term expands to can never be asked for, so they are left out. Each product's
+title and category are scanned once at catalog load and stored as bitmasks of the terms they
+contain. Per profile, title and category scoring is then popcount(mask & bits).
+
+Synonym bits serve getRelatedTerms-style matching (related_mask); the training labels only
+use the profile vocabulary bits, so adding them does not change any score.
+"""
+
+import re
+from collections import deque
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+TEXT_MATCHING_TS = PROJECT_ROOT / "src" / "lib" / "textMatching.ts"
+
+# Same order as STEMMING_RULES in textMatching.ts (applied one after another)
+STEMMING_RULES = [
+    (re.compile(r"ing$"), ""),
+    (re.compile(r"ed$"), ""),
+    (re.compile(r"er$"), ""),
+    (re.compile(r"ers$"), ""),
+    (re.compile(r"s$"), ""),
+    (re.compile(r"ies$"), "y"),
+    (re.compile(r"ness$"), ""),
+]
+
+_SYNONYM_BLOCK = re.compile(r"const SYNONYM_MAP[^=]*=\s*\{(.*?)\n\};", re.S)
+_SYNONYM_ENTRY = re.compile(r'"([^"]+)"\s*:\s*\[([^\]]*)\]')
+_QUOTED = re.compile(r'"([^"]*)"')
+
+
+def parse_synonym_map(path: Path = TEXT_MATCHING_TS) -> dict:
+    """SYNONYM_MAP from textMatching.ts as {term: [synonyms]}; empty if the file is missing."""
+    if not path.exists():
+        return {}
+    block = _SYNONYM_BLOCK.search(path.read_text(encoding="utf-8"))
+    if block is None:
+        raise SystemExit(f"SYNONYM_MAP not found in {path}")
+    return {key: _QUOTED.findall(values) for key, values in _SYNONYM_ENTRY.findall(block.group(1))}
+
+
+def normalize_text(text: str) -> str:
+    normalized = text.lower().strip()
+    for pattern, replacement in STEMMING_RULES:
+        normalized = pattern.sub(replacement, normalized)
+    return normalized
+
+
+def related_terms(word: str, synonym_map: dict) -> list:
+    """Python port of getRelatedTerms()."""
+    normalized = normalize_text(word)
+    terms = dict.fromkeys([normalized, word.lower()])
+    terms.update(dict.fromkeys(synonym_map.get(normalized, [])))
+    for key, synonyms in synonym_map.items():
+        if normalized in synonyms:
+            terms[key] = None
+            terms.update(dict.fromkeys(synonyms))
+    return list(terms)
+
+
+class AhoCorasick:
+    """Multi-pattern substring automaton; scan() returns the bitmask of patterns found."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [0]
+        for i, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(0)
+                state = nxt
+            self.out[state] |= 1 << i
+        # Breadth-first fail links; each state's output includes everything on its fail chain
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] |= self.out[self.fail[nxt]]
+
+    def scan(self, text: str) -> int:
+        goto, fail, out = self.goto, self.fail, self.out
+        state, found = 0, 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            found |= out[state]
+        return found
+
+
+class TermMatcher:
+    """Profile vocabulary plus synonyms, matched against titles and categories in one pass each."""
+
+    def __init__(self, vocabulary, synonym_map: dict = None):
+        self.synonym_map = parse_synonym_map() if synonym_map is None else synonym_map
+        # Only synonyms reachable from the vocabulary; related_mask() never asks for the rest
+        synonym_terms = [t.lower() for term in vocabulary for t in related_terms(term, self.synonym_map)]
+        # Profile vocabulary keeps bit positions 0..n-1, matching TagBitsetEngine
+        self.terms = [t for t in dict.fromkeys([*vocabulary, *synonym_terms]) if t]
+        self.index = {t: i for i, t in enumerate(self.terms)}
+        self.automaton = AhoCorasick(self.terms)
+        self._category_cache = {}
+
+    def term_bits(self, text: str) -> int:
+        return self.automaton.scan(text)
+
+    def annotate(self, products):
+        """Store p["title_terms"] and p["category_terms"] (titles and categories are lowercased)."""
+        cache = self._category_cache
+        for p in products:
+            p["title_terms"] = self.automaton.scan(p["title"])
+            bits = cache.get(p["category"])
+            if bits is None:
+                bits = cache[p["category"]] = self.automaton.scan(p["category"])
+            p["category_terms"] = bits
+        return products
+
+    def related_mask(self, tags) -> int:
+        """Bits of every known term related to tags (synonym expansion as in getRelatedTerms)."""
+        mask = 0
+        for tag in tags:
+            for term in related_terms(tag, self.synonym_map):
+                i = self.index.get(term)
+                if i is not None:
+                    mask |= 1 << i
+        return mask
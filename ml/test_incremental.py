@@ -0,0 +1,53 @@
+"""
+The --update gate's holdout must stay out of the final fit and of replay samples.
+Run from project root: python -m pytest ml/test_incremental.py
+"""
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingClassifier
+
+from incremental import gate_split, load_state, replay_sample, save_state
+from shards import shard_row_ids
+
+
+def _dataset(rows: int = 400, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.random((rows, 5)).astype(np.float32)
+    y = (X[:, 0] + 0.1 * rng.random(rows) > 0.5).astype(np.int64)
+    return X, y
+
+
+def test_saved_holdout_ids_not_in_final_fit(tmp_path):
+    X, y = _dataset()
+    ids = np.arange(len(X)) + 1000
+    val_ids = np.random.default_rng(1).choice(ids, 60, replace=False)
+    fit, holdout = gate_split(ids, val_ids, max_rows=40)
+
+    model = GradientBoostingClassifier(n_estimators=5, random_state=0).fit(X[fit], y[fit])
+    path = tmp_path / "model_state.joblib"
+    save_state(model, X[holdout], y[holdout], 1, tmp_path / "training_data.csv", ids[holdout], path=path)
+    state = load_state(path)
+
+    assert len(state["holdout_ids"]) == len(state["X_holdout"]) == 40
+    assert not np.intersect1d(state["holdout_ids"], ids[fit]).size
+    assert np.isin(state["holdout_ids"], val_ids).all()
+    assert fit.sum() + holdout.sum() == len(X)
+
+
+def test_replay_sample_skips_holdout_rows():
+    X, y = _dataset()
+    ids = np.arange(len(X))
+    _, holdout = gate_split(ids, ids[::4])
+    X_replay, _ = replay_sample(X, y, ids, ids[holdout], rows=len(X))
+    assert len(X_replay) == len(X) - holdout.sum()
+    held = {row.tobytes() for row in X[holdout]}
+    assert not any(row.tobytes() in held for row in X_replay)
+
+
+def test_shard_row_ids_follow_manifest_order():
+    manifest = {"shards": [{"file": "shard-00000.npz", "rows": 3}, {"file": "shard-00001.npz", "rows": 0},
+                           {"file": "shard-00002.npz", "rows": 2}]}
+    val = [manifest["shards"][2]]
+    train = [manifest["shards"][0]]
+    assert shard_row_ids(manifest, train + val).tolist() == [0, 1, 2, 3, 4]
+    assert shard_row_ids(manifest, val).tolist() == [3, 4]
@@ -0,0 +1,47 @@
+"""
+The term automaton must reproduce substring matching: vocabulary bits as `tag in text`, and
+related_mask() hits as getRelatedTerms() expansion followed by substring checks.
+Run from project root: python -m pytest ml/test_term_automaton.py
+"""
+
+import pytest
+
+from generate_training_data import PRODUCTS_CSV, PROFILE_VOCABULARY, load_products
+from term_automaton import TermMatcher, parse_synonym_map, related_terms
+
+SYNONYMS = {"game": ["video games", "gamer", "console"], "tea": ["matcha", "chai"], "yoga": ["pilates"]}
+
+
+def test_vocabulary_bits_match_substring_checks():
+    matcher = TermMatcher(["game", "tea", "coffee"], SYNONYMS)
+    for text in ["retro game console", "matcha tea set", "steam deck", "coffee and chai"]:
+        found = matcher.term_bits(text)
+        for i, term in enumerate(matcher.terms):
+            assert bool(found >> i & 1) == (term in text), (text, term)
+
+
+def test_related_mask_matches_get_related_terms():
+    matcher = TermMatcher(["game", "tea", "coffee"], SYNONYMS)
+    for text in ["new console bundle", "chai latte kit", "pilates mat", "coffee grinder"]:
+        found = matcher.term_bits(text)
+        for tag in ["game", "tea", "coffee"]:
+            expected = any(t in text for t in related_terms(tag, SYNONYMS))
+            assert bool(found & matcher.related_mask([tag])) == expected, (text, tag)
+
+
+def test_only_unreachable_synonyms_are_pruned():
+    matcher = TermMatcher(["game", "tea"], SYNONYMS)
+    assert "pilates" not in matcher.index and "yoga" not in matcher.index
+    assert {"video games", "gamer", "console", "matcha", "chai"} <= set(matcher.terms)
+    # Vocabulary keeps bit positions 0..n-1 (TagBitsetEngine's order)
+    assert matcher.terms[:2] == ["game", "tea"]
+
+
+@pytest.mark.skipif(not PRODUCTS_CSV.exists(), reason="needs prisma/products.csv")
+def test_catalog_vocabulary_bits_unchanged_by_synonyms():
+    products = load_products()[:300]
+    TermMatcher(PROFILE_VOCABULARY, parse_synonym_map()).annotate(products)
+    for p in products:
+        for i, tag in enumerate(dict.fromkeys(PROFILE_VOCABULARY)):
+            assert (p["title_terms"] >> i & 1) == (tag in p["title"])
+            assert (p["category_terms"] >> i & 1) == (tag in p["category"])
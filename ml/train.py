@@ -4,9 +4,29 @@ Train a binary classifier: (profile, product) -> relevant (1) or not (0).
 Export to ONNX for Node.js inference.
 Run from project root: python ml/train.py
 Requires: ml/training_data.csv (run generate_training_data.py first), ml/feature_spec.json
-Output: ml/model.onnx, ml/feature_spec.json (with category_list)
+Output: ml/model.onnx, ml/feature_spec.json (with category_list), ml/metrics.json,
+        ml/model_trees.json + ml/model_trees.bin (flat trees for onnxruntime-free scoring, see tree_export.py),
+        ml/model_state.joblib (model, holdout and version for --update)
+
+Hyperparameter search: python ml/train.py --search [--budget SECONDS] [--workers N]
+Writes ml/search_leaderboard.csv and exports the winning model the same way. Trials use the
+sample_weight column as the final fit does.
+
+Larger-than-RAM data: python ml/train.py --streaming [--max-rows N]
+Streams the CSV in chunks and trains on a bounded, class-weighted sample (see stream_train.py);
+a sample_weight column is multiplied into the class weights.
+
+Sharded data: python ml/train.py --shards ml/training_shards
+Loads shards in parallel and holds out whole shards for validation (see shards.py). Shards are
+unweighted: they are written by the uniform negative sampler, and --time-budget (which writes
+sample_weight) cannot write shards.
+
+Incremental update: python ml/train.py --update new_rows.csv [--add-trees 10] [--max-auc-drop 0.002]
+Adds trees to the last trained model (ml/model_state.joblib) with warm_start, checks holdout
+ROC-AUC and exports the next model version (see incremental.py).
 """
 
+import argparse
 import json
 import numpy as np
 import pandas as pd
@@ -17,52 +37,59 @@ from sklearn.metrics import accuracy_score, roc_auc_score
 from skl2onnx import convert_sklearn
 from skl2onnx.common.data_types import FloatTensorType
 
+from incremental import gate_split, load_state, next_version, replay_sample, save_state, warm_start_update
+from tree_export import check_trees, remove_trees, write_trees
+
 ML_DIR = Path(__file__).resolve().parent
 TRAINING_CSV = ML_DIR / "training_data.csv"
 SPEC_PATH = ML_DIR / "feature_spec.json"
 MODEL_ONNX = ML_DIR / "model.onnx"
+METRICS_JSON = ML_DIR / "metrics.json"
 
 NUM_FEATURES = 31  # must match feature_spec.feature_names length
 
+HYPERPARAMS = {
+    "n_estimators": 150,
+    "max_depth": 6,
+    "learning_rate": 0.08,
+    "min_samples_leaf": 20,
+    "subsample": 0.85,
+}
 
-def main():
-    if not TRAINING_CSV.exists():
-        raise SystemExit("Run generate_training_data.py first to create training_data.csv")
 
-    df = pd.read_csv(TRAINING_CSV)
+def load_dataset(spec: dict, path: Path = TRAINING_CSV):
+    if not path.exists():
+        if path == TRAINING_CSV:
+            raise SystemExit("Run generate_training_data.py first to create training_data.csv")
+        raise SystemExit(f"{path} not found")
+
+    df = pd.read_csv(path)
+    feature_names = spec["feature_names"]
+    X = df[feature_names].astype(np.float32)
+    y = df["label"].astype(np.int64)
+    # Time-budgeted generation writes inclusion weights; plain runs are unweighted
+    w = df["sample_weight"].to_numpy(np.float64) if "sample_weight" in df else np.ones(len(df))
+    return X, y, w
+
+
+def load_spec() -> dict:
     spec = json.loads(SPEC_PATH.read_text(encoding="utf-8"))
     feature_names = spec["feature_names"]
     if len(feature_names) != NUM_FEATURES:
         raise SystemExit(f"feature_spec has {len(feature_names)} features, expected {NUM_FEATURES}")
+    return spec
 
-    X = df[feature_names].astype(np.float32)
-    y = df["label"].astype(np.int64)
 
-    # Train/validation split for evaluation
-    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.15, random_state=42, stratify=y)
-    print(f"Training samples: {len(X_train)}, validation: {len(X_val)}, positives (train): {y_train.sum()}")
+def split(X, y, w):
+    """Train/validation split for evaluation (shared by the normal run and the search)."""
+    return train_test_split(X, y, w, test_size=0.15, random_state=42, stratify=y)
 
-    # Balanced class weight for imbalanced data (more negatives than positives)
-    model = GradientBoostingClassifier(
-        n_estimators=150,
-        max_depth=6,
-        learning_rate=0.08,
-        min_samples_leaf=20,
-        subsample=0.85,
-        random_state=42,
-    )
-    model.fit(X_train, y_train)
 
-    # Quick validation metrics
-    y_pred = model.predict(X_val)
-    y_proba = model.predict_proba(X_val)[:, 1]
-    print(f"Validation accuracy: {accuracy_score(y_val, y_pred):.4f}")
-    print(f"Validation ROC-AUC: {roc_auc_score(y_val, y_proba):.4f}")
+def build_model(params: dict) -> GradientBoostingClassifier:
+    return GradientBoostingClassifier(**params, random_state=42)
 
-    # Retrain on full data for final model (so we use all data for production)
-    model.fit(X, y)
 
-    # Export to ONNX
+def to_onnx(model, version: int = None):
     initial_type = [("float_input", FloatTensorType([None, NUM_FEATURES]))]
     onnx_model = convert_sklearn(
         model,
@@ -70,15 +97,216 @@ def main():
         target_opset=14,
         options={id(model): {"nocl": True}},
     )
+    if version is not None:
+        onnx_model.model_version = version
+    return onnx_model
+
+
+def export_onnx(model, spec: dict, version: int = None):
+    onnx_model = to_onnx(model, version)
     MODEL_ONNX.write_bytes(onnx_model.SerializeToString())
-    print(f"Saved {MODEL_ONNX}")
+    print(f"Saved {MODEL_ONNX}" + (f" (version {version})" if version is not None else ""))
 
-    # Keep feature_spec with category_list for Node
+    # Keep feature_spec with category_list for Node; model_version tells it which model_trees.json is current
     if "category_list" not in spec:
         spec["category_list"] = []
+    spec["model_version"] = version
     SPEC_PATH.write_text(json.dumps(spec, indent=2), encoding="utf-8")
     print("Done. Use model.onnx and feature_spec.json in Next.js for inference.")
 
 
+def write_metrics(params: dict, accuracy: float, auc: float, train_rows: int, val_rows: int, version: int, **extra):
+    metrics = {
+        "model_version": version,
+        "validation_accuracy": round(float(accuracy), 6),
+        "validation_roc_auc": round(float(auc), 6),
+        "train_rows": int(train_rows),
+        "validation_rows": int(val_rows),
+        "params": params,
+        **extra,
+    }
+    METRICS_JSON.write_text(json.dumps(metrics, indent=2), encoding="utf-8")
+
+
+def export_model(model, spec: dict, X_holdout, y_holdout, version: int, source: Path = None, holdout_ids=None):
+    """ONNX + flat trees, then the warm-start state (holdout rows left out of the fit) for --update runs.
+
+    The flat trees are checked before anything is written; old trees files never outlive a new model.onnx.
+    """
+    header, buffers = check_trees(model, X_holdout)
+    try:
+        export_onnx(model, spec, version)
+    except BaseException:
+        remove_trees()
+        raise
+    write_trees(header, buffers, version, len(X_holdout))
+    save_state(model, X_holdout, y_holdout, version, source, holdout_ids)
+
+
+def train_and_export(X, y, w, params: dict, spec: dict):
+    X_train, X_val, y_train, y_val, w_train, w_val = split(X, y, w)
+    print(f"Training samples: {len(X_train)}, validation: {len(X_val)}, positives (train): {y_train.sum()}")
+
+    model = build_model(params)
+    model.fit(X_train, y_train, sample_weight=w_train)
+
+    # Quick validation metrics
+    y_pred = model.predict(X_val)
+    y_proba = model.predict_proba(X_val)[:, 1]
+    accuracy = accuracy_score(y_val, y_pred, sample_weight=w_val)
+    auc = roc_auc_score(y_val, y_proba, sample_weight=w_val)
+    print(f"Validation accuracy: {accuracy:.4f}")
+    print(f"Validation ROC-AUC: {auc:.4f}")
+    version = next_version()
+    write_metrics(params, accuracy, auc, len(X_train), len(X_val), version)
+
+    # Retrain on everything except the --update holdout (a sample of the validation rows)
+    ids = X.index.to_numpy()
+    fit, holdout = gate_split(ids, X_val.index.to_numpy())
+    model.fit(X[fit], y[fit], sample_weight=w[fit])
+    export_model(model, spec, X[holdout], y[holdout], version, TRAINING_CSV, ids[holdout])
+
+
+def train_and_export_streaming(params: dict, spec: dict, max_rows: int, chunk_rows: int):
+    from stream_train import sample_csv
+
+    if not TRAINING_CSV.exists():
+        raise SystemExit("Run generate_training_data.py first to create training_data.csv")
+    X_train, y_train, w_train, ids_train, X_val, y_val, w_val, ids_val = sample_csv(
+        TRAINING_CSV, spec["feature_names"], max_rows=max_rows, chunk_rows=chunk_rows,
+    )
+
+    model = build_model(params)
+    model.fit(X_train, y_train, sample_weight=w_train)
+
+    y_pred = model.predict(X_val)
+    y_proba = model.predict_proba(X_val)[:, 1]
+    accuracy = accuracy_score(y_val, y_pred, sample_weight=w_val)
+    auc = roc_auc_score(y_val, y_proba, sample_weight=w_val)
+    print(f"Validation accuracy (weighted): {accuracy:.4f}")
+    print(f"Validation ROC-AUC (weighted): {auc:.4f}")
+    version = next_version()
+    write_metrics(params, accuracy, auc, len(X_train), len(X_val), version)
+
+    # Retrain on both samples for the final model, except the --update holdout
+    X, y, w, ids = (np.concatenate(pair) for pair in ((X_train, X_val), (y_train, y_val), (w_train, w_val),
+                                                      (ids_train, ids_val)))
+    fit, holdout = gate_split(ids, ids_val)
+    model.fit(X[fit], y[fit], sample_weight=w[fit])
+    export_model(model, spec, X[holdout], y[holdout], version, TRAINING_CSV, ids[holdout])
+
+
+def train_and_export_shards(params: dict, spec: dict, shard_dir: Path):
+    from shards import load_shards, read_manifest, shard_row_ids, split_shards
+
+    manifest = read_manifest(shard_dir)
+    if manifest["feature_names"] != spec["feature_names"]:
+        raise SystemExit("Shard feature_names do not match feature_spec.json; regenerate the shards")
+    train_entries, val_entries = split_shards(manifest)
+    if not val_entries:
+        raise SystemExit("Need at least 2 non-empty shards for a shard-level validation split")
+    X_train, y_train = load_shards(shard_dir, train_entries)
+    X_val, y_val = load_shards(shard_dir, val_entries)
+    print(f"Training samples: {len(X_train)} ({len(train_entries)} shards), "
+          f"validation: {len(X_val)} ({len(val_entries)} shards), positives (train): {y_train.sum()}")
+
+    model = build_model(params)
+    model.fit(X_train, y_train)
+
+    y_pred = model.predict(X_val)
+    y_proba = model.predict_proba(X_val)[:, 1]
+    accuracy, auc = accuracy_score(y_val, y_pred), roc_auc_score(y_val, y_proba)
+    print(f"Validation accuracy: {accuracy:.4f}")
+    print(f"Validation ROC-AUC: {auc:.4f}")
+    version = next_version()
+    write_metrics(params, accuracy, auc, len(X_train), len(X_val), version)
+
+    # Retrain on all shards for the final model, except the --update holdout
+    X, y = np.concatenate([X_train, X_val]), np.concatenate([y_train, y_val])
+    ids = shard_row_ids(manifest, train_entries + val_entries)
+    fit, holdout = gate_split(ids, shard_row_ids(manifest, val_entries))
+    model.fit(X[fit], y[fit])
+    export_model(model, spec, X[holdout], y[holdout], version, shard_dir, ids[holdout])
+
+
+def replay_pool(spec: dict, state: dict, new_csv: Path):
+    """Replay sample of the dataset the saved model was trained on, without its holdout rows."""
+    from shards import MANIFEST_NAME, load_shards, read_manifest, shard_row_ids
+
+    source = Path(state["source"]) if state.get("source") else TRAINING_CSV
+    if (source / MANIFEST_NAME).exists():
+        manifest = read_manifest(source)
+        entries = [e for e in manifest["shards"] if e["rows"]]
+        X, y = load_shards(source, entries)
+        ids = shard_row_ids(manifest, entries)
+    elif source.is_file() and source.resolve() != new_csv.resolve():
+        X, y, _ = load_dataset(spec, source)
+        ids = X.index.to_numpy()
+    else:
+        return None, None
+    return replay_sample(X, y, ids, state.get("holdout_ids"))
+
+
+def update_and_export(spec: dict, new_csv: Path, add_trees: int, max_auc_drop: float):
+    state = load_state()
+    X_new, y_new, _ = load_dataset(spec, new_csv)
+    print(f"Updating model version {state['version']} with {len(X_new)} new rows, positives: {y_new.sum()}")
+    X_replay, y_replay = replay_pool(spec, state, new_csv)
+    model, X_holdout, y_holdout, report = warm_start_update(
+        state, X_new.to_numpy(), y_new.to_numpy(), add_trees, max_auc_drop, X_replay, y_replay,
+    )
+    accuracy = accuracy_score(y_holdout, model.predict(X_holdout))
+    version = state["version"] + 1
+    params = {name: model.get_params()[name] for name in HYPERPARAMS}
+    write_metrics(params, accuracy, report["auc_after"], report["update_rows"], len(X_holdout), version,
+                  update=report)
+    # The holdout still excludes the same training rows from later replays
+    export_model(model, spec, X_holdout, y_holdout, version, state.get("source"), state.get("holdout_ids"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the gift relevance model and export ONNX.")
+    parser.add_argument("--search", action="store_true", help="successive-halving hyperparameter search")
+    parser.add_argument("--budget", type=float, default=600, help="search wall-clock budget in seconds")
+    parser.add_argument("--workers", type=int, default=None, help="search worker processes (default: all cores)")
+    parser.add_argument("--trials", type=int, default=27, help="configurations sampled for the first rung")
+    parser.add_argument("--streaming", action="store_true", help="stream the CSV in chunks (data larger than RAM)")
+    parser.add_argument("--max-rows", type=int, default=500_000, help="streaming: rows kept in memory for training")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000, help="streaming: CSV rows read per chunk")
+    parser.add_argument("--shards", type=Path, default=None, help="train from a sharded dataset directory")
+    parser.add_argument("--update", type=Path, default=None, help="warm-start: add trees fitted on this CSV")
+    parser.add_argument("--add-trees", type=int, default=10, help="update: boosting stages to add")
+    parser.add_argument("--max-auc-drop", type=float, default=0.002, help="update: reject if holdout AUC drops more")
+    args = parser.parse_args()
+    if args.trials < 1:
+        parser.error("--trials must be at least 1")
+
+    spec = load_spec()
+    if args.update:
+        update_and_export(spec, args.update, args.add_trees, args.max_auc_drop)
+        return
+    if args.shards:
+        train_and_export_shards(HYPERPARAMS, spec, args.shards)
+        return
+    if args.streaming:
+        train_and_export_streaming(HYPERPARAMS, spec, args.max_rows, args.chunk_rows)
+        return
+    X, y, w = load_dataset(spec)
+
+    params = HYPERPARAMS
+    if args.search:
+        from hparam_search import run_search
+
+        X_train, X_val, y_train, y_val, w_train, w_val = split(X, y, w)
+        params = run_search(
+            X_train.to_numpy(), y_train.to_numpy(), X_val.to_numpy(), y_val.to_numpy(),
+            budget_seconds=args.budget, workers=args.workers, num_trials=args.trials, baseline=HYPERPARAMS,
+            w_train=w_train, w_val=w_val,
+        )
+        print(f"Best hyperparameters: {params}")
+
+    train_and_export(X, y, w, params, spec)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Flat array export of the gradient-boosted trees plus a NumPy reference evaluator.
+
+train.py writes, next to model.onnx:
+  model_trees.bin   contiguous little-endian buffers (float64 first, so every buffer is aligned)
+  model_trees.json  header: model version, base score, learning rate, and dtype/offset/length of each buffer
+
+All trees share one node table. Node n tests X[feature[n]] <= threshold[n] and moves to
+left[n] or right[n]. Leaves have feature -1 and point to themselves on both sides, so a
+fixed number of steps (max_depth) always ends on a leaf. value[n] is the leaf output.
+
+The evaluator reproduces GradientBoostingClassifier.predict_proba exactly. The input is cast
+to float32 before it is compared with the float64 thresholds. raw starts at the base score,
+gets learning_rate * leaf value added one tree at a time in stage order, and goes through
+scipy's expit. check_trees() verifies that equality on a sample before train.py writes any
+artifact, and deletes the previous trees files if it fails. The header's model_version matches
+model.onnx and feature_spec.json, so readers can tell stale trees from current ones.
+
+Benchmark against onnxruntime: python ml/tree_export.py bench [--rows 100000]
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.special import expit, logit
+
+ML_DIR = Path(__file__).resolve().parent
+TREES_JSON = ML_DIR / "model_trees.json"
+TREES_BIN = ML_DIR / "model_trees.bin"
+MODEL_ONNX = ML_DIR / "model.onnx"
+TRAINING_CSV = ML_DIR / "training_data.csv"
+SPEC_PATH = ML_DIR / "feature_spec.json"
+
+FORMAT = "flat-gbdt-v1"
+# name -> dtype, in file order (8-byte types first keeps every buffer aligned for typed arrays)
+BUFFERS = {
+    "threshold": "<f8",
+    "value": "<f8",
+    "feature": "<i4",
+    "left": "<i4",
+    "right": "<i4",
+    "roots": "<i4",
+}
+EVAL_BLOCK_ROWS = 8192
+
+
+def flatten(model) -> tuple:
+    """(header, buffers) for a fitted binary GradientBoostingClassifier."""
+    if model.estimators_.shape[1] != 1:
+        raise SystemExit("Flat tree export supports binary classifiers only")
+    trees = [est.tree_ for est in model.estimators_[:, 0]]
+    sizes = np.array([t.node_count for t in trees], dtype=np.int64)
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    feature, threshold, left, right, value = [], [], [], [], []
+    for root, t in zip(roots, trees):
+        is_leaf = t.children_left < 0
+        self_index = np.arange(t.node_count) + root
+        feature.append(np.where(is_leaf, -1, t.feature))
+        threshold.append(np.where(is_leaf, 0.0, t.threshold))
+        left.append(np.where(is_leaf, self_index, t.children_left + root))
+        right.append(np.where(is_leaf, self_index, t.children_right + root))
+        value.append(t.value[:, 0, 0])
+
+    buffers = {
+        "threshold": np.concatenate(threshold),
+        "value": np.concatenate(value),
+        "feature": np.concatenate(feature),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "roots": roots,
+    }
+    buffers = {name: np.ascontiguousarray(buffers[name], dtype=dtype) for name, dtype in BUFFERS.items()}
+    # Constant raw score of the init (prior) estimator: logit of its clipped positive-class probability,
+    # exactly as predict_proba computes it
+    if isinstance(model.init_, str):  # init="zero"
+        base_score = 0.0
+    else:
+        prior = model.init_.predict_proba(np.zeros((1, model.n_features_in_), dtype=np.float32))[0, 1]
+        eps = np.finfo(np.float64).eps
+        base_score = float(logit(np.clip(prior, eps, 1 - eps)))
+    header = {
+        "format": FORMAT,
+        "num_features": int(model.n_features_in_),
+        "num_trees": len(trees),
+        "num_nodes": int(sizes.sum()),
+        "max_depth": int(max(t.max_depth for t in trees)),
+        "learning_rate": float(model.learning_rate),
+        "base_score": base_score,
+    }
+    return header, buffers
+
+
+class FlatTrees:
+    """Vectorized evaluator over the flat buffers."""
+
+    def __init__(self, header: dict, buffers: dict):
+        self.header = header
+        for name in BUFFERS:
+            setattr(self, name, buffers[name])
+
+    @classmethod
+    def load(cls, json_path: Path = TREES_JSON):
+        header = json.loads(json_path.read_text(encoding="utf-8"))
+        if header.get("format") != FORMAT:
+            raise SystemExit(f"{json_path} is not a {FORMAT} file")
+        raw = (json_path.parent / header["file"]).read_bytes()
+        buffers = {
+            name: np.frombuffer(raw, dtype=spec["dtype"], count=spec["length"], offset=spec["offset"])
+            for name, spec in header["buffers"].items()
+        }
+        return cls(header, buffers)
+
+    def decision_function(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty(len(X), dtype=np.float64)
+        lr = self.header["learning_rate"]
+        for start in range(0, len(X), EVAL_BLOCK_ROWS):
+            block = X[start:start + EVAL_BLOCK_ROWS]
+            # Offset of each row in the flattened block, so one np.take fetches X[row, feature[node]]
+            row_base = (np.arange(len(block), dtype=np.int64) * X.shape[1])[:, None]
+            flat = block.ravel()
+            # (rows, trees) node indices; all trees descend together
+            node = np.broadcast_to(self.roots, (len(block), len(self.roots))).copy()
+            for _ in range(self.header["max_depth"]):
+                x = flat.take(row_base + self.feature.take(node))
+                go_left = x <= self.threshold.take(node)
+                node = np.where(go_left, self.left.take(node), self.right.take(node))
+            leaf_values = self.value.take(node)
+            # Sequential sum in stage order (np.sum is pairwise and would round differently)
+            raw = np.full(len(block), self.header["base_score"], dtype=np.float64)
+            for t in range(leaf_values.shape[1]):
+                raw += lr * leaf_values[:, t]
+            out[start:start + len(block)] = raw
+        return out
+
+    def predict_proba(self, X) -> np.ndarray:
+        p = expit(self.decision_function(X))
+        return np.column_stack([1 - p, p])
+
+
+def remove_trees(json_path: Path = TREES_JSON, bin_path: Path = TREES_BIN):
+    json_path.unlink(missing_ok=True)
+    bin_path.unlink(missing_ok=True)
+
+
+def check_trees(model, X_check, json_path: Path = TREES_JSON, bin_path: Path = TREES_BIN) -> tuple:
+    """(header, buffers) of model, after checking they reproduce model.predict_proba on X_check.
+
+    On a mismatch the previous trees files are deleted, so they cannot be used next to a new model.onnx.
+    """
+    header, buffers = flatten(model)
+    expected = model.predict_proba(X_check)
+    got = FlatTrees(header, buffers).predict_proba(X_check)
+    if not np.array_equal(expected, got):
+        remove_trees(json_path, bin_path)
+        raise SystemExit(f"Flat trees differ from predict_proba (max abs diff {np.abs(expected - got).max():.3g}); "
+                         f"removed {json_path.name} + {bin_path.name}")
+    return header, buffers
+
+
+def write_trees(header: dict, buffers: dict, version: int, rows_checked: int, json_path: Path = TREES_JSON,
+                bin_path: Path = TREES_BIN):
+    """Write checked buffers (from check_trees) with the model version in the header."""
+    offset, layout, chunks = 0, {}, []
+    for name, dtype in BUFFERS.items():
+        data = buffers[name].tobytes()
+        layout[name] = {"dtype": dtype, "offset": offset, "length": int(len(buffers[name]))}
+        chunks.append(data)
+        offset += len(data)
+    bin_path.write_bytes(b"".join(chunks))
+    header = {**header, "model_version": version, "file": bin_path.name, "buffers": layout}
+    json_path.write_text(json.dumps(header, indent=2), encoding="utf-8")
+    print(f"Saved {json_path.name} + {bin_path.name} ({header['num_trees']} trees, {header['num_nodes']} nodes, "
+          f"{offset / 1024:.0f} KiB; matches predict_proba on {rows_checked} rows)")
+
+
+def bench(rows: int, batch_sizes: list):
+    """Throughput of FlatTrees vs onnxruntime on training rows, plus their max difference."""
+    import pandas as pd
+    import onnxruntime as ort
+
+    spec = json.loads(SPEC_PATH.read_text(encoding="utf-8"))
+    X = pd.read_csv(TRAINING_CSV, usecols=spec["feature_names"], nrows=rows)[spec["feature_names"]]
+    X = X.to_numpy(dtype=np.float32)
+
+    started = time.perf_counter()
+    trees = FlatTrees.load()
+    load_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    session = ort.InferenceSession(str(MODEL_ONNX), providers=["CPUExecutionProvider"])
+    ort_load_ms = (time.perf_counter() - started) * 1000
+    input_name = session.get_inputs()[0].name
+
+    def ort_predict(batch):
+        proba = session.run(None, {input_name: batch})[-1]
+        return np.array([r[1] for r in proba]) if isinstance(proba, list) else proba[:, -1]
+
+    diff = np.abs(trees.predict_proba(X)[:, 1] - ort_predict(X)).max()
+    print(f"{len(X)} rows; load: flat {load_ms:.1f} ms, onnxruntime {ort_load_ms:.1f} ms; "
+          f"max |flat - onnx| = {diff:.2e} (onnx runs in float32)")
+    print(f"{'batch':>8}{'flat rows/s':>14}{'onnx rows/s':>14}")
+    for size in batch_sizes:
+        batches = [X[i:i + size] for i in range(0, len(X), size)]
+        timings = []
+        for fn in (lambda b: trees.predict_proba(b)[:, 1], ort_predict):
+            started = time.perf_counter()
+            for b in batches:
+                fn(b)
+            timings.append(len(X) / (time.perf_counter() - started))
+        print(f"{size:>8}{timings[0]:>14,.0f}{timings[1]:>14,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the flat tree evaluator against onnxruntime.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("bench")
+    b.add_argument("--rows", type=int, default=100_000)
+    b.add_argument("--batch", type=int, nargs="+", default=[1, 30, 1000, 100_000])
+    args = parser.parse_args()
+    bench(args.rows, args.batch)
+
+
+if __name__ == "__main__":
+    main()
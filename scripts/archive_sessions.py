@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Session archival and compaction for the SQLite database (standard library only).
+
+Sessions older than --older-than-days are streamed out of "Session" in rowid order into
+day-partitioned, column-oriented archives:
+
+  prisma/archive/sessions/day=YYYY-MM-DD/part-<run>-<n>.zip
+      meta.json                      rows, columns, first/last created_at
+      id.jsonl, created_at.jsonl,    one JSON value per line, one LZMA-compressed member per column
+      form_json.jsonl, ...
+
+Each column sits in its own member, so the similar form_json / result_json blobs compress
+together, and readers can load only the columns they need (read_archive()). Parts are fsynced
+and renamed into place before any row is deleted. rowid order roughly follows created_at, so
+a day is flushed as soon as the stream reaches a later day; at most BUFFER_ROWS rows are held
+(the largest day is flushed first), whatever the order.
+
+The archived rows are then deleted in transactions of --batch rows, with a pause between
+them. This keeps each write lock, and each WAL append, short while the app keeps writing.
+With auto_vacuum = INCREMENTAL, the freed pages go back to the filesystem in steps of
+--vacuum-pages. Otherwise the report says how to switch (--enable-incremental-vacuum runs
+one full VACUUM). The report covers rows archived, archive size, database size before and
+after, and total and longest lock time.
+
+Run from project root: python scripts/archive_sessions.py [--older-than-days 30] [--db file:./dev.db] [--dry-run]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+import zipfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from catalog_delta import sqlite_path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+ARCHIVE_DIR = PROJECT_ROOT / "prisma" / "archive" / "sessions"
+
+COLUMNS = ["id", "created_at", "form_json", "result_json", "request_cost_estimate"]
+READ_ROWS = 1000  # rows fetched per query while archiving
+PART_ROWS = 20_000  # rows per archive part (per day)
+BUFFER_ROWS = 50_000  # rows buffered across days before the largest day is flushed
+DELETE_ROWS = 500  # rows deleted per transaction
+VACUUM_PAGES = 1000  # pages freed per incremental_vacuum step
+
+# Prisma stores DateTime in SQLite as milliseconds since the epoch; older rows may be ISO text
+_OLD_ROWS = '((typeof(created_at) = \'integer\' AND created_at < :ms) OR (typeof(created_at) = \'text\' AND created_at < :iso))'
+
+
+def created_at_datetime(value) -> datetime:
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    text = str(value).replace("Z", "+00:00").replace(" ", "T")
+    dt = datetime.fromisoformat(text)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class LockTimer:
+    """Wall time spent inside write transactions."""
+
+    def __init__(self):
+        self.total = 0.0
+        self.longest = 0.0
+        self.transactions = 0
+
+    def run(self, conn: sqlite3.Connection, fn):
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.add(time.perf_counter() - started)
+        return result
+
+    def add(self, held: float):
+        self.total += held
+        self.longest = max(self.longest, held)
+        self.transactions += 1
+
+
+def _write_part(day: str, rows: list, out_dir: Path, run_id: str, index: int) -> Path:
+    day_dir = out_dir / f"day={day}"
+    day_dir.mkdir(parents=True, exist_ok=True)
+    path = day_dir / f"part-{run_id}-{index:04d}.zip"
+    tmp = path.with_name(path.name + ".tmp")
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_LZMA) as z:
+        meta = {"rows": len(rows), "columns": COLUMNS, "day": day,
+                "first_created_at": rows[0][1], "last_created_at": rows[-1][1]}
+        z.writestr("meta.json", json.dumps(meta))
+        for c, name in enumerate(COLUMNS):
+            z.writestr(f"{name}.jsonl", "\n".join(json.dumps(row[c]) for row in rows) + "\n")
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def read_archive(path: Path, columns=None):
+    """Yield archived sessions of one part as dicts, decompressing only the requested columns."""
+    with zipfile.ZipFile(path) as z:
+        meta = json.loads(z.read("meta.json"))
+        names = columns or meta["columns"]
+        values = [z.read(f"{name}.jsonl").decode("utf-8").splitlines() for name in names]
+    for row in zip(*values):
+        yield {name: json.loads(v) for name, v in zip(names, row)}
+
+
+def archive_rows(conn: sqlite3.Connection, params: dict, out_dir: Path) -> tuple:
+    """Write every old session to day partitions; returns (rows, max rowid, archive bytes, parts)."""
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    by_day, parts_per_day = {}, {}
+    rows = archive_bytes = 0
+    max_rowid, parts = 0, []
+
+    buffered, current_day = 0, None
+
+    def flush(day):
+        nonlocal buffered
+        rows_of_day = by_day.pop(day)
+        buffered -= len(rows_of_day)
+        index = parts_per_day.get(day, 0)
+        path = _write_part(day, rows_of_day, out_dir, run_id, index)
+        parts_per_day[day] = index + 1
+        parts.append(path)
+        return path.stat().st_size
+
+    query = (f'SELECT rowid, {", ".join(COLUMNS)} FROM "Session" '
+             f'WHERE {_OLD_ROWS} AND rowid > :after ORDER BY rowid LIMIT :limit')
+    while True:
+        batch = conn.execute(query, {**params, "after": max_rowid, "limit": READ_ROWS}).fetchall()
+        if not batch:
+            break
+        for rowid, *values in batch:
+            day = created_at_datetime(values[1]).strftime("%Y-%m-%d")
+            if day != current_day:
+                # The stream has moved on: earlier days are complete (late rows start a new part)
+                for old in [d for d in by_day if d < day]:
+                    archive_bytes += flush(old)
+                current_day = day
+            by_day.setdefault(day, []).append(values)
+            buffered += 1
+            if len(by_day[day]) >= PART_ROWS:
+                archive_bytes += flush(day)
+            elif buffered > BUFFER_ROWS:
+                archive_bytes += flush(max(by_day, key=lambda d: len(by_day[d])))
+        rows += len(batch)
+        max_rowid = batch[-1][0]
+    for day in sorted(by_day):
+        archive_bytes += flush(day)
+    return rows, max_rowid, archive_bytes, parts
+
+
+def delete_rows(conn: sqlite3.Connection, params: dict, max_rowid: int, timer: LockTimer, batch_rows: int,
+                pause: float) -> int:
+    """Delete the archived sessions (old and rowid <= max_rowid) in transactions of batch_rows."""
+    sql = (f'DELETE FROM "Session" WHERE rowid IN (SELECT rowid FROM "Session" '
+           f'WHERE {_OLD_ROWS} AND rowid <= :max_rowid ORDER BY rowid LIMIT :limit)')
+    deleted = 0
+    while True:
+        n = timer.run(conn, lambda: conn.execute(sql, {**params, "max_rowid": max_rowid,
+                                                       "limit": batch_rows}).rowcount)
+        deleted += n
+        if n < batch_rows:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+def reclaim_space(conn: sqlite3.Connection, timer: LockTimer, pages: int, pause: float) -> int:
+    """incremental_vacuum in steps of pages; returns pages freed (0 unless auto_vacuum is INCREMENTAL)."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    freed = 0
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while free:
+        # execute() steps a pragma once (one page); executescript() runs it to completion
+        started = time.perf_counter()
+        conn.executescript(f"BEGIN IMMEDIATE; PRAGMA incremental_vacuum({pages}); COMMIT;")
+        timer.add(time.perf_counter() - started)
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining >= free:
+            break
+        freed += free - remaining
+        free = remaining
+        if pause:
+            time.sleep(pause)
+    return freed
+
+
+def db_bytes(db_path: Path) -> int:
+    return sum(p.stat().st_size for p in (db_path, Path(f"{db_path}-wal")) if p.exists())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old sessions to day-partitioned files and compact SQLite.")
+    parser.add_argument("--older-than-days", type=float, default=30, help="archive sessions older than this")
+    parser.add_argument("--db", default=None, help="SQLite URL (default: DATABASE_URL or .env)")
+    parser.add_argument("--archive-dir", type=Path, default=ARCHIVE_DIR)
+    parser.add_argument("--batch", type=int, default=DELETE_ROWS, help="rows deleted per transaction")
+    parser.add_argument("--pause-ms", type=float, default=20, help="pause between write transactions")
+    parser.add_argument("--vacuum-pages", type=int, default=VACUUM_PAGES, help="pages freed per vacuum step")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="switch the database to auto_vacuum=INCREMENTAL (one full VACUUM, locks the file)")
+    parser.add_argument("--dry-run", action="store_true", help="only count the sessions that would be archived")
+    args = parser.parse_args()
+
+    db_path = sqlite_path(args.db)
+    if not db_path.exists():
+        raise SystemExit(f"Database {db_path} not found")
+    cutoff = datetime.now(timezone.utc) - timedelta(days=args.older_than_days)
+    params = {"ms": int(cutoff.timestamp() * 1000), "iso": cutoff.strftime("%Y-%m-%dT%H:%M:%S")}
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    pause = args.pause_ms / 1000
+    timer = LockTimer()
+    size_before = db_bytes(db_path)
+    started = time.perf_counter()
+
+    try:
+        if args.dry_run:
+            count = conn.execute(f'SELECT COUNT(*) FROM "Session" WHERE {_OLD_ROWS}', params).fetchone()[0]
+            print(f"{count} sessions older than {cutoff:%Y-%m-%d %H:%M} UTC would be archived")
+            return
+        rows, max_rowid, archive_bytes, parts = archive_rows(conn, params, args.archive_dir)
+        print(f"Archived {rows} sessions older than {cutoff:%Y-%m-%d} into {len(parts)} parts "
+              f"({archive_bytes / 1024:.0f} KiB) under {args.archive_dir}")
+        deleted = delete_rows(conn, params, max_rowid, timer, args.batch, pause) if rows else 0
+        if deleted != rows:
+            print(f"   ! Deleted {deleted} sessions but archived {rows}; the archive parts are kept either way")
+        if args.enable_incremental_vacuum and conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            vacuum_started = time.perf_counter()
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            held = time.perf_counter() - vacuum_started
+            timer.add(held)
+            print(f"Switched to auto_vacuum=INCREMENTAL (full VACUUM, {held:.2f}s)")
+        freed = reclaim_space(conn, timer, args.vacuum_pages, pause)
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print("   ! auto_vacuum is not INCREMENTAL: freed pages stay in the file for reuse; "
+                  "run once with --enable-incremental-vacuum to return them to the filesystem")
+    finally:
+        conn.close()
+
+    size_after = db_bytes(db_path)
+    print(f"Deleted {deleted} sessions, freed {freed} pages in {timer.transactions} write transactions "
+          f"({time.perf_counter() - started:.1f}s)")
+    print(f"Database {size_before / 1024:.0f} KiB -> {size_after / 1024:.0f} KiB "
+          f"(saved {(size_before - size_after) / 1024:.0f} KiB)")
+    print(f"Write lock held {timer.total:.2f}s in total, longest {1000 * timer.longest:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Catalog delta: diff two versions of products.csv and apply the changes to the SQLite Product table.
+
+diff streams both CSVs through an external sort by id (sorted runs of RUN_ROWS rows in a temp
+dir, merged with heapq.merge). It then merge-joins them, so memory does not grow with catalog
+size. Rows are compared by a hash of the Product columns. The delta is a CSV (gzip if the name
+ends in .gz) with an `op` column in front:
+  insert      id only in the new file (full row)
+  update      id in both, row hash changed (full row)
+  deactivate  id only in the old file (id only; the product is kept with active = false)
+
+apply upserts the delta into "Product" in transactions of --batch rows, with the same defaults
+as prisma/seed.ts. Each transaction holds the write lock only for its own batch, and the
+longest and total lock times are reported. A 1% change to the catalog costs about 1% of a
+full reseed.
+
+Run from project root:
+  python scripts/catalog_delta.py diff prisma/products.csv.bak prisma/products.csv --out prisma/catalog_delta.csv.gz
+  python scripts/catalog_delta.py apply prisma/catalog_delta.csv.gz [--db file:./dev.db] [--batch 1000]
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DELTA_CSV = PROJECT_ROOT / "prisma" / "catalog_delta.csv.gz"
+
+COLUMNS = ["id", "title", "description", "category", "tags", "price_min", "price_max",
+           "amazon_url", "image_url", "locale", "active"]
+RUN_ROWS = 100_000  # rows per sorted run (bounds memory during the external sort)
+BATCH_ROWS = 1000  # delta rows per write transaction
+
+
+def open_text(path: Path, mode: str, compress: bool = None):
+    if compress if compress is not None else str(path).endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, mode + "b"), encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def row_hash(row: dict) -> str:
+    values = "\x1f".join((row.get(c) or "").strip() for c in COLUMNS)
+    return hashlib.blake2b(values.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _write_run(rows: list, tmp_dir: str, index: int) -> Path:
+    rows.sort(key=lambda r: r[0])
+    path = Path(tmp_dir) / f"run-{index:05d}.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+    return path
+
+
+def _read_run(path: Path):
+    with open(path, encoding="utf-8", newline="") as f:
+        for record in csv.reader(f):
+            yield record
+
+
+def sorted_rows(path: Path, tmp_dir: str):
+    """Yield [id, hash, *COLUMNS values] for every row of path, ordered by id (external merge sort)."""
+    csv.field_size_limit(sys.maxsize)
+    runs, buffer = [], []
+    with open_text(path, "r") as f:
+        for row in csv.DictReader(f):
+            pid = (row.get("id") or "").strip()
+            if not pid:
+                continue
+            buffer.append([pid, row_hash(row), *((row.get(c) or "").strip() for c in COLUMNS)])
+            if len(buffer) >= RUN_ROWS:
+                runs.append(_write_run(buffer, tmp_dir, len(runs)))
+                buffer = []
+    if not runs:
+        buffer.sort(key=lambda r: r[0])
+        yield from buffer
+        return
+    if buffer:
+        runs.append(_write_run(buffer, tmp_dir, len(runs)))
+    yield from heapq.merge(*(_read_run(p) for p in runs), key=lambda r: r[0])
+
+
+def _unique(records, path: Path):
+    previous = None
+    for record in records:
+        if record[0] == previous:
+            raise SystemExit(f"Duplicate product id {record[0]!r} in {path}")
+        previous = record[0]
+        yield record
+
+
+def diff_catalogs(old_csv: Path, new_csv: Path, out: Path = DELTA_CSV) -> dict:
+    """Write the delta from old_csv to new_csv; returns counts per op."""
+    counts = {"insert": 0, "update": 0, "deactivate": 0, "unchanged": 0}
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="catalog_delta_") as tmp:
+        old_dir, new_dir = os.path.join(tmp, "old"), os.path.join(tmp, "new")
+        os.mkdir(old_dir)
+        os.mkdir(new_dir)
+        old = _unique(sorted_rows(old_csv, old_dir), old_csv)
+        new = _unique(sorted_rows(new_csv, new_dir), new_csv)
+        partial = out.with_name(out.name + ".partial")
+        with open_text(partial, "w", compress=str(out).endswith(".gz")) as f:
+            writer = csv.writer(f)
+            writer.writerow(["op", *COLUMNS])
+            o, n = next(old, None), next(new, None)
+            while o is not None or n is not None:
+                if n is not None and (o is None or n[0] < o[0]):
+                    writer.writerow(["insert", *n[2:]])
+                    counts["insert"] += 1
+                    n = next(new, None)
+                elif o is not None and (n is None or o[0] < n[0]):
+                    writer.writerow(["deactivate", o[0]])
+                    counts["deactivate"] += 1
+                    o = next(old, None)
+                else:
+                    if o[1] != n[1]:
+                        writer.writerow(["update", *n[2:]])
+                        counts["update"] += 1
+                    else:
+                        counts["unchanged"] += 1
+                    o, n = next(old, None), next(new, None)
+        os.replace(partial, out)
+    changed = counts["insert"] + counts["update"] + counts["deactivate"]
+    print(f"Delta {old_csv.name} -> {new_csv.name}: {counts['insert']} inserts, {counts['update']} updates, "
+          f"{counts['deactivate']} deactivations, {counts['unchanged']} unchanged "
+          f"({time.perf_counter() - started:.1f}s)")
+    print(f"Wrote {changed} changes to {out}")
+    return counts
+
+
+def sqlite_path(database_url: str = None) -> Path:
+    """Resolve Prisma's DATABASE_URL ("file:./dev.db", relative to prisma/) to a file path.
+
+    Shared by archive_sessions.py and ml/hot_profiles.py.
+    """
+    url = database_url or os.environ.get("DATABASE_URL")
+    if not url:
+        env_file = PROJECT_ROOT / ".env"
+        if env_file.exists():
+            for line in env_file.read_text(encoding="utf-8").splitlines():
+                name, _, value = line.partition("=")
+                if name.strip() == "DATABASE_URL":
+                    url = value.strip().strip('"').strip("'")
+    if not url or not url.startswith("file:"):
+        raise SystemExit("DATABASE_URL must be a SQLite file: URL (e.g. file:./dev.db); pass --db")
+    path = Path(url[len("file:"):].split("?", 1)[0])
+    return path if path.is_absolute() else (PROJECT_ROOT / "prisma" / path).resolve()
+
+
+def product_values(row: dict) -> tuple:
+    """Column values with prisma/seed.ts defaults (active is stored as 0/1)."""
+    def _int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return 0
+
+    price_min = _int(row.get("price_min"))
+    price_max = _int(row.get("price_max")) or price_min or 99
+    active = (row.get("active") or "").lower()
+    return (
+        row["id"],
+        row.get("title") or "Untitled",
+        row.get("description") or "",
+        row.get("category") or "Other",
+        row.get("tags") or "",
+        price_min,
+        price_max,
+        row.get("amazon_url") or None,
+        row.get("image_url") or None,
+        row.get("locale") or "US",
+        0 if active in ("false", "0") else 1,
+    )
+
+
+UPSERT_SQL = (
+    f'INSERT INTO "Product" ({", ".join(COLUMNS)}) VALUES ({", ".join("?" for _ in COLUMNS)}) '
+    f'ON CONFLICT(id) DO UPDATE SET {", ".join(f"{c} = excluded.{c}" for c in COLUMNS[1:])}'
+)
+DEACTIVATE_SQL = 'UPDATE "Product" SET active = 0 WHERE id = ?'
+
+
+def apply_delta(delta: Path, db_path: Path, batch_rows: int = BATCH_ROWS) -> dict:
+    """Upsert / deactivate the delta's rows in transactions of batch_rows; returns counts and lock times."""
+    if not db_path.exists():
+        raise SystemExit(f"Database {db_path} not found")
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    stats = {"upserted": 0, "deactivated": 0, "missing": 0, "transactions": 0, "lock_seconds": 0.0,
+             "max_lock_seconds": 0.0}
+
+    def flush(upserts, deactivations):
+        locked = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(UPSERT_SQL, upserts)
+            before = conn.total_changes
+            conn.executemany(DEACTIVATE_SQL, [(pid,) for pid in deactivations])
+            deactivated = conn.total_changes - before
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        held = time.perf_counter() - locked
+        stats["transactions"] += 1
+        stats["lock_seconds"] += held
+        stats["max_lock_seconds"] = max(stats["max_lock_seconds"], held)
+        stats["upserted"] += len(upserts)
+        stats["deactivated"] += deactivated
+        stats["missing"] += len(deactivations) - deactivated
+
+    started = time.perf_counter()
+    csv.field_size_limit(sys.maxsize)
+    upserts, deactivations = [], []
+    try:
+        with open_text(delta, "r") as f:
+            for row in csv.DictReader(f):
+                if row["op"] == "deactivate":
+                    deactivations.append(row["id"])
+                elif row["op"] in ("insert", "update"):
+                    upserts.append(product_values(row))
+                else:
+                    raise SystemExit(f"Unknown delta op {row['op']!r} in {delta}")
+                if len(upserts) + len(deactivations) >= batch_rows:
+                    flush(upserts, deactivations)
+                    upserts, deactivations = [], []
+            if upserts or deactivations:
+                flush(upserts, deactivations)
+    finally:
+        conn.close()
+    stats["seconds"] = time.perf_counter() - started
+    print(f"Applied {delta.name} to {db_path.name}: {stats['upserted']} upserts, {stats['deactivated']} "
+          f"deactivations ({stats['missing']} ids not in the table) in {stats['transactions']} transactions, "
+          f"{stats['seconds']:.2f}s")
+    print(f"Write lock held {stats['lock_seconds']:.2f}s in total, longest {1000 * stats['max_lock_seconds']:.0f}ms")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two products.csv versions and apply the delta to SQLite.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    d = sub.add_parser("diff", help="write the delta from OLD to NEW")
+    d.add_argument("old", type=Path)
+    d.add_argument("new", type=Path)
+    d.add_argument("--out", type=Path, default=DELTA_CSV)
+    a = sub.add_parser("apply", help="apply a delta to the Product table")
+    a.add_argument("delta", type=Path, nargs="?", default=DELTA_CSV)
+    a.add_argument("--db", default=None, help="SQLite URL (default: DATABASE_URL or .env)")
+    a.add_argument("--batch", type=int, default=BATCH_ROWS, help="delta rows per transaction")
+    args = parser.parse_args()
+
+    if args.command == "diff":
+        for path in (args.old, args.new):
+            if not path.exists():
+                raise SystemExit(f"{path} not found")
+        diff_catalogs(args.old, args.new, args.out)
+        return
+    if not args.delta.exists():
+        raise SystemExit(f"{args.delta} not found")
+    apply_delta(args.delta, sqlite_path(args.db), args.batch)
+
+
+if __name__ == "__main__":
+    main()
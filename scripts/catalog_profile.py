@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Single-pass catalog profiler for products.csv with bounded memory (standard library only).
+
+Streams the CSV once and reports:
+  - distinct ids, tags, categories and top-level categories (HyperLogLog, ~0.8% error)
+  - price_min / price_max quantiles (merging t-digest)
+  - most frequent tags and categories (Space-Saving)
+  - per-column empty rates and invalid rows (bad or negative prices, min > max, bad `active`)
+
+Memory is fixed by the sketch sizes, not by the catalog size, so it can run on a 5M-row
+catalog in CI after every merge. merge_amazon_data.py and generate_enhanced_products.py print
+this report after writing products.csv.
+
+Run: python scripts/catalog_profile.py [prisma/products.csv] [--json report.json] [--max-invalid-rate 0.01]
+"""
+
+import argparse
+import bisect
+import csv
+import hashlib
+import heapq
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PRODUCTS_CSV = PROJECT_ROOT / "prisma" / "products.csv"
+
+HLL_PRECISION = 14  # 16384 one-byte registers per counter
+TDIGEST_COMPRESSION = 100
+TOP_K_CAPACITY = 1000
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+ACTIVE_VALUES = {"true", "false"}
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    def add(self, value: str):
+        h = hash64(value)
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+
+class TDigest:
+    """Merging t-digest (Dunning): centroids sized by the k1 scale function."""
+
+    def __init__(self, compression: int = TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means, self.weights = [], []
+        self.buffer = []
+        self.count = 0
+        self.min, self.max = math.inf, -math.inf
+
+    def add(self, x: float):
+        self.buffer.append(x)
+        self.count += 1
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        if len(self.buffer) >= 10 * self.compression:
+            self._merge()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _merge(self):
+        if not self.buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + [(x, 1) for x in self.buffer])
+        self.buffer = []
+        total = sum(w for _, w in points)
+        means, weights = [], []
+        cur_mean, cur_weight = points[0]
+        done = 0.0
+        k_lo = self._k(0.0)
+        for mean, weight in points[1:]:
+            if self._k((done + cur_weight + weight) / total) - k_lo <= 1:
+                cur_weight += weight
+                cur_mean += (mean - cur_mean) * weight / cur_weight
+            else:
+                means.append(cur_mean)
+                weights.append(cur_weight)
+                done += cur_weight
+                k_lo = self._k(done / total)
+                cur_mean, cur_weight = mean, weight
+        means.append(cur_mean)
+        weights.append(cur_weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q: float) -> float:
+        self._merge()
+        if not self.weights:
+            return math.nan
+        if len(self.weights) == 1:
+            return self.means[0]
+        target = q * self.count
+        # Interpolate between centroid centres; the extremes are anchored at min and max
+        cumulative, centres = 0.0, []
+        for w in self.weights:
+            centres.append(cumulative + w / 2)
+            cumulative += w
+        if target <= centres[0]:
+            return self.min + (self.means[0] - self.min) * target / centres[0]
+        if target >= centres[-1]:
+            tail = self.count - centres[-1]
+            return self.means[-1] + (self.max - self.means[-1]) * (target - centres[-1]) / tail if tail else self.max
+        i = bisect.bisect_right(centres, target) - 1
+        frac = (target - centres[i]) / (centres[i + 1] - centres[i])
+        return self.means[i] + frac * (self.means[i + 1] - self.means[i])
+
+
+class SpaceSaving:
+    """Top-k heavy hitters in bounded memory (Metwally et al.): counts overestimate by at most error.
+
+    Each key can carry a payload (the last one added wins). Shared with ml/hot_profiles.py.
+    """
+
+    def __init__(self, capacity: int = TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}  # key -> [count, error, payload]
+        self.heap = []  # (count, key), lazily invalidated
+
+    def add(self, key, payload=None):
+        entry = self.counts.get(key)
+        if entry is not None:
+            entry[0] += 1
+            entry[2] = payload
+            heapq.heappush(self.heap, (entry[0], key))
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = [1, 0, payload]
+            heapq.heappush(self.heap, (1, key))
+        else:
+            # Evict the current minimum; the newcomer inherits its count as error
+            while True:
+                count, victim = heapq.heappop(self.heap)
+                current = self.counts.get(victim)
+                if current is not None and current[0] == count:
+                    break
+            del self.counts[victim]
+            self.counts[key] = [count + 1, count, payload]
+            heapq.heappush(self.heap, (count + 1, key))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(c[0], k) for k, c in self.counts.items()]
+            heapq.heapify(self.heap)
+
+    def ranked(self, n: int) -> list:
+        """[(key, count, error, payload)] by count, highest first."""
+        ranked = sorted(self.counts.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        return [(k, c[0], c[1], c[2]) for k, c in ranked[:n]]
+
+    def top(self, n: int) -> list:
+        return [{"value": k, "count": count, "error": error} for k, count, error, _ in self.ranked(n)]
+
+
+def _price(value):
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if math.isfinite(price) and price >= 0 else None
+
+
+class CatalogProfile:
+    def __init__(self):
+        self.rows = 0
+        self.empty = {}
+        self.invalid = {"price": 0, "price_order": 0, "active": 0}
+        self.invalid_rows = 0
+        self.distinct = {name: HyperLogLog() for name in ("id", "tag", "category", "top_category")}
+        self.prices = {"price_min": TDigest(), "price_max": TDigest()}
+        self.top_tags = SpaceSaving()
+        self.top_categories = SpaceSaving()
+        self.tags_per_product = TDigest()
+        self.active = 0
+
+    def add(self, row: dict):
+        self.rows += 1
+        for name, value in row.items():
+            if name is not None and not (value or "").strip():
+                self.empty[name] = self.empty.get(name, 0) + 1
+        if row.get("id"):
+            self.distinct["id"].add(row["id"])
+
+        tags = [t.strip().lower() for t in (row.get("tags") or "").split("|") if t.strip()]
+        self.tags_per_product.add(len(tags))
+        for tag in tags:
+            self.distinct["tag"].add(tag)
+            self.top_tags.add(tag)
+        category = (row.get("category") or "").strip()
+        if category:
+            self.distinct["category"].add(category.lower())
+            self.top_categories.add(category.lower())
+            self.distinct["top_category"].add(category.split("|")[0].strip().lower())
+
+        bad = False
+        p_min, p_max = _price(row.get("price_min")), _price(row.get("price_max"))
+        if p_min is None or p_max is None:
+            self.invalid["price"] += 1
+            bad = True
+        else:
+            self.prices["price_min"].add(p_min)
+            self.prices["price_max"].add(p_max)
+            if p_min > p_max:
+                self.invalid["price_order"] += 1
+                bad = True
+        active = (row.get("active") or "true").strip().lower()
+        if active not in ACTIVE_VALUES:
+            self.invalid["active"] += 1
+            bad = True
+        elif active == "true":
+            self.active += 1
+        self.invalid_rows += bad
+
+    def report(self, top_n: int = 20) -> dict:
+        rows = max(1, self.rows)
+        return {
+            "rows": self.rows,
+            "active_rows": self.active,
+            "invalid_rows": self.invalid_rows,
+            "invalid_rate": self.invalid_rows / rows,
+            "invalid": self.invalid,
+            "empty_rate": {name: count / rows for name, count in sorted(self.empty.items())},
+            "distinct_estimate": {name: hll.count() for name, hll in self.distinct.items()},
+            "price_quantiles": {
+                name: {str(q): round(d.quantile(q), 2) for q in QUANTILES} for name, d in self.prices.items()
+            },
+            "tags_per_product": {str(q): round(self.tags_per_product.quantile(q), 2) for q in (0.5, 0.95)},
+            "top_tags": self.top_tags.top(top_n),
+            "top_categories": self.top_categories.top(top_n),
+        }
+
+
+def profile_csv(path: Path = PRODUCTS_CSV) -> dict:
+    csv.field_size_limit(sys.maxsize)
+    profile = CatalogProfile()
+    started = time.perf_counter()
+    with open(path, encoding="utf-8", newline="", errors="replace") as f:
+        for row in csv.DictReader(f):
+            profile.add(row)
+            if profile.rows % 500000 == 0:
+                print(f"Profiled {profile.rows} rows...", end="\r")
+    report = profile.report()
+    report["source"] = str(path)
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    return report
+
+
+def print_report(report: dict, top_n: int = 10):
+    print(f"\n📊 Catalog profile: {report['rows']} rows ({report['active_rows']} active) in {report['seconds']}s")
+    d = report["distinct_estimate"]
+    print(f"   - Distinct (est.): {d['id']} ids, {d['tag']} tags, {d['category']} categories, "
+          f"{d['top_category']} top-level categories")
+    if report["rows"] and d["id"] < 0.98 * report["rows"]:
+        print("   ! Distinct ids well below row count: likely duplicate ids")
+    print(f"   - Invalid rows: {report['invalid_rows']} ({100 * report['invalid_rate']:.2f}%) {report['invalid']}")
+    empties = {k: f"{100 * v:.1f}%" for k, v in report["empty_rate"].items() if v > 0}
+    print(f"   - Empty fields: {empties or 'none'}")
+    print("\n💰 Price quantiles (p1 / p5 / p25 / p50 / p75 / p95 / p99):")
+    for name, qs in report["price_quantiles"].items():
+        print(f"   - {name}: " + " / ".join(f"${v:g}" for v in qs.values()))
+    print(f"\n🏷️  Top {top_n} tags:")
+    for item in report["top_tags"][:top_n]:
+        print(f"      {item['value']}: {item['count']}" + (f" (±{item['error']})" if item["error"] else ""))
+    print(f"\n🏆 Top {top_n} categories:")
+    for item in report["top_categories"][:top_n]:
+        print(f"      {item['value']}: {item['count']}" + (f" (±{item['error']})" if item["error"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a products CSV once and report sketch-based stats.")
+    parser.add_argument("csv", type=Path, nargs="?", default=PRODUCTS_CSV)
+    parser.add_argument("--json", type=Path, default=None, help="also write the report as JSON")
+    parser.add_argument("--max-invalid-rate", type=float, default=None, help="exit 1 if invalid rows exceed this rate")
+    args = parser.parse_args()
+
+    if not args.csv.exists():
+        raise SystemExit(f"{args.csv} not found")
+    report = profile_csv(args.csv)
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.max_invalid_rate is not None and report["invalid_rate"] > args.max_invalid_rate:
+        raise SystemExit(f"Invalid row rate {report['invalid_rate']:.4f} exceeds {args.max_invalid_rate}")
+
+
+if __name__ == "__main__":
+    main()
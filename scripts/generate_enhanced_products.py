@@ -8,6 +8,9 @@ import csv
 import random
 from pathlib import Path
 
+from catalog_profile import print_report, profile_csv
+from partition_catalog import partition_csv
+
 OUTPUT = Path(__file__).parent.parent / "prisma" / "products.csv"
 
 # Product templates organized by category with realistic details
@@ -349,31 +352,9 @@ def generate_csv():
         writer.writerows(rows)
     
     print(f"✅ Generated {len(rows)-1} products to {OUTPUT}")
-    print(f"\n📊 Statistics:")
-    print(f"   - Total products: {len(rows)-1}")
-    
-    # Category breakdown
-    categories = {}
-    for row in rows[1:]:
-        cat = row[3]
-        categories[cat] = categories.get(cat, 0) + 1
-    
-    print(f"   - Unique categories: {len(categories)}")
-    print(f"\n🏆 Top 10 categories:")
-    for cat, count in sorted(categories.items(), key=lambda x: -x[1])[:10]:
-        print(f"      {cat}: {count}")
-    
-    # Price analysis
-    prices = [int(row[6]) for row in rows[1:]]
-    print(f"\n💰 Price distribution:")
-    print(f"   - Average price: ${sum(prices)/len(prices):.2f}")
-    print(f"   - Price range: ${min(prices)}-${max(prices)}")
-    low = sum(1 for p in prices if p < 20)
-    mid = sum(1 for p in prices if 20 <= p < 60)
-    high = sum(1 for p in prices if p >= 60)
-    print(f"   - Budget (<$20): {low}")
-    print(f"   - Mid ($20-$60): {mid}")
-    print(f"   - Premium (>$60): {high}")
+    partition_csv(OUTPUT)
+    print_report(profile_csv(OUTPUT))
+
 
 if __name__ == "__main__":
     generate_csv()
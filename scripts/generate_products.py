@@ -10,6 +10,8 @@ import csv
 import random
 from pathlib import Path
 
+from partition_catalog import partition_csv
+
 OUTPUT = Path(__file__).resolve().parent.parent / "prisma" / "products.csv"
 TARGET_ROWS = 1050  # 1000+ products
 
@@ -181,6 +183,7 @@ def main():
         writer = csv.writer(f)
         writer.writerows(rows)
     print(f"Wrote {len(rows)-1} products to {OUTPUT}")
+    partition_csv(OUTPUT)
 
 if __name__ == "__main__":
     main()
@@ -10,6 +10,8 @@ import csv
 import random
 from pathlib import Path
 
+from partition_catalog import partition_csv
+
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 OUTPUT = PROJECT_ROOT / "prisma" / "products.csv"
 EXISTING_CSV = PROJECT_ROOT / "prisma" / "products.csv"
@@ -185,6 +187,7 @@ def main():
         writer = csv.writer(f)
         writer.writerows(rows)
     print(f"Wrote {len(rows)-1} products (research-based) to {OUTPUT}")
+    partition_csv(OUTPUT)
 
 if __name__ == "__main__":
     main()
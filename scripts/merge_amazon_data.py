@@ -3,6 +3,10 @@ import re
 from pathlib import Path
 import sys
 
+from catalog_delta import diff_catalogs
+from catalog_profile import print_report, profile_csv
+from partition_catalog import partition_csv
+
 # Constants
 EXCHANGE_RATE_INR_TO_USD = 1 / 83.0  # Approx exchange rate
 # Relative paths from scripts/ folder
@@ -124,8 +128,15 @@ def main():
 
     print(f"\nProcessed {len(new_rows)} new rows. Skipped {skipped} invalid rows.")
     
-    # 4. Write merged data
-    all_rows = existing_rows + new_rows
+    # 4. Write merged data. A re-run reads the amz_2023_* rows back from the backup, so rows are
+    # merged by id (the new row replaces the old one in place) to keep ids unique
+    merged = {}
+    for n, row in enumerate(existing_rows + new_rows):
+        merged[row.get("id") or ("", n)] = row
+    all_rows = list(merged.values())
+    replaced = len(existing_rows) + len(new_rows) - len(all_rows)
+    if replaced:
+        print(f"Replaced {replaced} rows with an id already in the catalog.")
     
     with open(EXISTING_PRODUCTS_CSV, 'w', newline='', encoding='utf-8') as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
@@ -133,6 +144,11 @@ def main():
         writer.writerows(all_rows)
         
     print(f"Successfully wrote {len(all_rows)} rows to {EXISTING_PRODUCTS_CSV}")
+    partition_csv(EXISTING_PRODUCTS_CSV)
+    print_report(profile_csv(EXISTING_PRODUCTS_CSV))
+    if BACKUP_PRODUCTS_CSV.exists():
+        # Changes since the previous catalog; apply with: python scripts/catalog_delta.py apply
+        diff_catalogs(BACKUP_PRODUCTS_CSV, EXISTING_PRODUCTS_CSV)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Partitioned catalog layout: split products.csv by top-level category and price band.
+
+  prisma/catalog/<category>/<band>.csv   same columns as products.csv
+  prisma/catalog/index.json              per partition: path, rows, min price_min, max price_max
+
+The category is the first segment of `category` (slugified) and the band is taken from
+price_min (see PRICE_BANDS). A product's partition depends only on its own row, so ids stay
+unique and every product keeps its partition across rebuilds. Readers use the index to open
+only partitions whose category matches and whose price range overlaps the budget. The budget
+rule is the same as retrieval's: price_max >= budget_min and price_min <= budget_max.
+
+The catalog writers (merge_amazon_data.py, generate_*.py) call partition_csv() after writing
+products.csv. It can also be run on its own:
+  python scripts/partition_catalog.py [--input prisma/products.csv]
+  python scripts/partition_catalog.py query --category electronics --budget 20 40
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PRODUCTS_CSV = PROJECT_ROOT / "prisma" / "products.csv"
+CATALOG_DIR = PROJECT_ROOT / "prisma" / "catalog"
+INDEX_NAME = "index.json"
+
+# Lower edges (USD) of the price_min bands; the last band is open-ended
+PRICE_BANDS = [0, 10, 25, 50, 100, 200, 500]
+
+
+def category_slug(category: str) -> str:
+    top = (category or "").split("|")[0].strip().lower()
+    return re.sub(r"[^a-z0-9]+", "-", top).strip("-") or "other"
+
+
+def price_band(price_min: int) -> str:
+    band = 0
+    for i, edge in enumerate(PRICE_BANDS):
+        if price_min >= edge:
+            band = i
+    lo = PRICE_BANDS[band]
+    return f"{lo}-{PRICE_BANDS[band + 1]}" if band + 1 < len(PRICE_BANDS) else f"{lo}+"
+
+
+def _int(value) -> int:
+    try:
+        return int(float(value or 0))
+    except ValueError:
+        return 0
+
+
+def partition_csv(input_csv: Path = PRODUCTS_CSV, out_dir: Path = CATALOG_DIR) -> dict:
+    """Stream input_csv into partitions; swaps the finished layout into out_dir and returns the index."""
+    csv.field_size_limit(sys.maxsize)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    writers, parts, seen_ids = {}, {}, set()
+    try:
+        with open(input_csv, encoding="utf-8", newline="") as f:
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames
+            for row in reader:
+                pid = row.get("id")
+                if not pid:
+                    continue
+                if pid in seen_ids:
+                    raise SystemExit(f"Duplicate product id {pid!r} in {input_csv}")
+                seen_ids.add(pid)
+                p_min, p_max = _int(row.get("price_min")), _int(row.get("price_max"))
+                key = (category_slug(row.get("category")), price_band(p_min))
+                if key not in writers:
+                    path = tmp_dir / key[0] / f"{key[1]}.csv"
+                    path.parent.mkdir(exist_ok=True)
+                    handle = open(path, "w", newline="", encoding="utf-8")
+                    writer = csv.DictWriter(handle, fieldnames=fieldnames)
+                    writer.writeheader()
+                    writers[key] = (handle, writer)
+                    parts[key] = {"path": f"{key[0]}/{key[1]}.csv", "category": key[0], "band": key[1],
+                                  "rows": 0, "price_min": p_min, "price_max": p_max}
+                writers[key][1].writerow(row)
+                part = parts[key]
+                part["rows"] += 1
+                part["price_min"] = min(part["price_min"], p_min)
+                part["price_max"] = max(part["price_max"], p_max)
+    finally:
+        for handle, _ in writers.values():
+            handle.close()
+
+    index = {
+        "source": input_csv.name,
+        "fieldnames": fieldnames,
+        "price_bands": PRICE_BANDS,
+        "total_rows": len(seen_ids),
+        "partitions": sorted(parts.values(), key=lambda p: (p["category"], int(re.match(r"\d+", p["band"]).group()))),
+    }
+    (tmp_dir / INDEX_NAME).write_text(json.dumps(index, indent=2), encoding="utf-8")
+    # Build aside, then swap in with renames, so an interrupted run never leaves a half-written catalog
+    old_dir = out_dir.with_name(out_dir.name + ".old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if out_dir.exists():
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    print(f"Partitioned {index['total_rows']} products into {len(parts)} partitions under {out_dir}")
+    return index
+
+
+def read_index(out_dir: Path = CATALOG_DIR) -> dict:
+    path = out_dir / INDEX_NAME
+    if not path.exists():
+        raise SystemExit(f"No {INDEX_NAME} in {out_dir}; run: python scripts/partition_catalog.py")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def select_partitions(index: dict, categories=None, budget=None) -> list:
+    """Partitions that can hold products in categories (slugs) overlapping budget (min, max)."""
+    wanted = {category_slug(c) for c in categories} if categories else None
+    selected = []
+    for part in index["partitions"]:
+        if wanted is not None and part["category"] not in wanted:
+            continue
+        if budget is not None and (part["price_max"] < budget[0] or part["price_min"] > budget[1]):
+            continue
+        selected.append(part)
+    return selected
+
+
+def load_partitions(out_dir: Path = CATALOG_DIR, categories=None, budget=None):
+    """Yield product rows (dicts) from the partitions that overlap the query, filtered by budget."""
+    csv.field_size_limit(sys.maxsize)
+    for part in select_partitions(read_index(out_dir), categories, budget):
+        with open(out_dir / part["path"], encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                if budget is not None:
+                    if _int(row.get("price_max")) < budget[0] or _int(row.get("price_min")) > budget[1]:
+                        continue
+                yield row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition products.csv by category and price band.")
+    sub = parser.add_subparsers(dest="command")
+    parser.add_argument("--input", type=Path, default=PRODUCTS_CSV)
+    parser.add_argument("--out", type=Path, default=CATALOG_DIR)
+    q = sub.add_parser("query", help="count products a query reads from the partitions")
+    q.add_argument("--category", action="append", default=None, help="top-level category (repeatable)")
+    q.add_argument("--budget", type=int, nargs=2, metavar=("MIN", "MAX"), default=None)
+    args = parser.parse_args()
+
+    if args.command != "query":
+        partition_csv(args.input, args.out)
+        return
+    index = read_index(args.out)
+    parts = select_partitions(index, args.category, args.budget)
+    scanned = sum(p["rows"] for p in parts)
+    matched = sum(1 for _ in load_partitions(args.out, args.category, args.budget))
+    print(f"{matched} matching products; read {len(parts)}/{len(index['partitions'])} partitions "
+          f"({scanned}/{index['total_rows']} rows)")
+
+
+if __name__ == "__main__":
+    main()
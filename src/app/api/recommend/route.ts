@@ -3,6 +3,8 @@
  * Without OPENAI_API_KEY: local path — profile + retrieval from DB, top 6 with static bullets.
  * With OPENAI_API_KEY: LLM profile + retrieval + LLM rerank.
  * 5) Persist session.
+ * With "X-Recompute: 1" (ml/hot_profiles.py --recompute-url): skips the result cache, stores the fresh
+ * result in it and persists no session. Needs X-Admin-Secret when ADMIN_SECRET is set.
  */
 
 import { NextRequest, NextResponse } from "next/server";
@@ -23,10 +25,28 @@ const USE_OPENAI =
   process.env.ENABLE_OPENAI === "true" && Boolean(process.env.OPENAI_API_KEY);
 // Use locally trained ML model to rank candidates (requires ml/model.onnx + ml/feature_spec.json)
 const USE_ML = process.env.USE_ML === "true";
+const ADMIN_SECRET = process.env.ADMIN_SECRET;
 
 // In-memory cache: form_hash -> { profile, result } (MVP only)
 const resultCache = new Map<string, { profile: RecipientProfile; result: RecommendResult }>();
 
+// Preload frequent forms mined from Session logs (python ml/hot_profiles.py); keys are formHash values
+function preloadHotProfiles() {
+  const hotPath = path.join(process.cwd(), "ml", "hot_profiles.json");
+  if (!fs.existsSync(hotPath)) return;
+  try {
+    const data = JSON.parse(fs.readFileSync(hotPath, "utf-8")) as {
+      entries?: { key: string; profile: RecipientProfile; result: RecommendResult }[];
+    };
+    for (const entry of data.entries ?? []) {
+      resultCache.set(entry.key, { profile: entry.profile, result: entry.result });
+    }
+  } catch (err) {
+    console.warn("Could not preload ml/hot_profiles.json:", err);
+  }
+}
+if (CACHE_BY_FORM_HASH) preloadHotProfiles();
+
 function normalizeForm(body: unknown): QuizForm {
   const o = body as Record<string, unknown>;
   const budgetMin = typeof o.budget_min === "number" ? o.budget_min : Number(o.budget_min) || 0;
@@ -44,6 +64,12 @@ function normalizeForm(body: unknown): QuizForm {
   };
 }
 
+function isRecompute(request: NextRequest): boolean {
+  if (request.headers.get("X-Recompute") !== "1") return false;
+  if (!ADMIN_SECRET) return true; // no secret set = allow in dev
+  return request.headers.get("X-Admin-Secret") === ADMIN_SECRET;
+}
+
 function formHash(form: QuizForm): string {
   return createHash("sha256").update(JSON.stringify(form)).digest("hex").slice(0, 16);
 }
@@ -58,6 +84,7 @@ export async function POST(request: NextRequest) {
     }
     const body = await request.json();
     const form = normalizeForm(body);
+    const recompute = isRecompute(request);
 
     const cacheKey = formHash(form);
     let profile: RecipientProfile;
@@ -65,7 +92,7 @@ export async function POST(request: NextRequest) {
     let candidatesCount = 0;
     let usedML = false;
 
-    if (CACHE_BY_FORM_HASH && resultCache.has(cacheKey)) {
+    if (CACHE_BY_FORM_HASH && !recompute && resultCache.has(cacheKey)) {
       const cached = resultCache.get(cacheKey)!;
       profile = cached.profile;
       result = cached.result;
@@ -108,17 +135,17 @@ export async function POST(request: NextRequest) {
       if (CACHE_BY_FORM_HASH) resultCache.set(cacheKey, { profile, result });
     }
 
-    const sessionId = randomUUID();
-    const formJson = JSON.stringify(form);
-    const resultJson = JSON.stringify({ profile, result });
-
-    await prisma.session.create({
-      data: {
-        id: sessionId,
-        form_json: formJson,
-        result_json: resultJson,
-      },
-    });
+    // Recompute calls are not visitor quizzes: no Session row (it would count towards the hot profiles)
+    const sessionId = recompute ? null : randomUUID();
+    if (sessionId) {
+      await prisma.session.create({
+        data: {
+          id: sessionId,
+          form_json: JSON.stringify(form),
+          result_json: JSON.stringify({ profile, result }),
+        },
+      });
+    }
 
     const productIds = [...result.top_3.map((r) => r.product_id), ...result.alternatives_3.map((r) => r.product_id)];
     const products = await prisma.product.findMany({ where: { id: { in: productIds } } });
@@ -1,13 +1,16 @@
 /**
  * ML inference: load ONNX model and feature_spec, compute features (match Python), run model.
  * Used when USE_ML=true. Results are based on the locally trained model (ml/model.onnx).
- * Dynamic import of onnxruntime-node so the app builds even if the package isn't installed.
+ * Scores with the flat tree export (ml/model_trees.json, see treeEvaluator.ts) when it is present and
+ * has the same model_version as feature_spec.json.
+ * Otherwise dynamic import of onnxruntime-node so the app builds even if the package isn't installed.
  */
 
 import * as path from "path";
 import * as fs from "fs";
 import type { QuizForm } from "@/types/quiz";
 import type { CandidateProduct } from "@/types/recommend";
+import { isFlatTreesAvailable, predictFlatTrees } from "@/lib/treeEvaluator";
 
 export interface MLSpec {
   occasion_values: string[];
@@ -21,16 +24,21 @@ export interface MLSpec {
   max_tag_overlap: number;
   feature_names: string[];
   category_list: string[];
+  model_version?: number;
 }
 
 let spec: MLSpec | null = null;
+let specMtimeMs = 0;
 let session: { run: (feeds: Record<string, unknown>) => Promise<Record<string, { data: Float32Array; dims: number[] }>> } | null = null;
 
 function getSpec(): MLSpec {
-  if (spec) return spec;
   const mlPath = path.join(process.cwd(), "ml", "feature_spec.json");
+  // Re-read after a new export, so model_version keeps matching the trees on disk
+  const mtimeMs = fs.statSync(mlPath).mtimeMs;
+  if (spec && mtimeMs === specMtimeMs) return spec;
   const raw = fs.readFileSync(mlPath, "utf-8");
   spec = JSON.parse(raw) as MLSpec;
+  specMtimeMs = mtimeMs;
   return spec!;
 }
 
@@ -129,6 +137,9 @@ export function computeFeatures(form: QuizForm, product: CandidateProduct, mlSpe
  * Uses the model trained on our dataset (training_data.csv from our products + keyword labels).
  */
 export async function runModel(features: number[][]): Promise<number[]> {
+  // Prefer the flat tree export (no native library, instant load) when it belongs to the current model;
+  // fall back to onnxruntime
+  if (isFlatTreesAvailable(getSpec().model_version)) return predictFlatTrees(features);
   const ort = await import(/* webpackIgnore: true */ "onnxruntime-node").catch(() => null);
   if (!ort) throw new Error("onnxruntime-node not installed. Run: npm install onnxruntime-node");
   const sess = await getSession();
@@ -0,0 +1,95 @@
+/**
+ * Flat gradient-boosted tree evaluator for ml/model_trees.json + ml/model_trees.bin (written by ml/train.py).
+ * No native dependency: loads in about a millisecond and scores with plain typed-array lookups.
+ * Same arithmetic as ml/tree_export.py: features rounded to float32, raw = base_score plus
+ * learning_rate * leaf value in tree order, then the logistic function.
+ * The trees are only used when their model_version matches feature_spec.json (written with model.onnx),
+ * and are reloaded when model_trees.json changes on disk.
+ */
+
+import * as path from "path";
+import * as fs from "fs";
+
+interface TreesHeader {
+  format: string;
+  model_version?: number;
+  num_features: number;
+  max_depth: number;
+  learning_rate: number;
+  base_score: number;
+  file: string;
+  buffers: Record<string, { dtype: string; offset: number; length: number }>;
+}
+
+export interface FlatTrees {
+  header: TreesHeader;
+  threshold: Float64Array;
+  value: Float64Array;
+  feature: Int32Array;
+  left: Int32Array;
+  right: Int32Array;
+  roots: Int32Array;
+}
+
+let trees: FlatTrees | null = null;
+let treesMtimeMs = 0;
+
+function treesPath(): string {
+  return path.join(process.cwd(), "ml", "model_trees.json");
+}
+
+/**
+ * True when the flat trees exist and were exported with modelVersion (feature_spec.json's model_version).
+ */
+export function isFlatTreesAvailable(modelVersion: number | undefined): boolean {
+  if (modelVersion === undefined) return false;
+  try {
+    if (!fs.existsSync(treesPath())) return false;
+    return loadFlatTrees().header.model_version === modelVersion;
+  } catch {
+    return false;
+  }
+}
+
+export function loadFlatTrees(): FlatTrees {
+  const mtimeMs = fs.statSync(treesPath()).mtimeMs;
+  if (trees && mtimeMs === treesMtimeMs) return trees;
+  const header = JSON.parse(fs.readFileSync(treesPath(), "utf-8")) as TreesHeader;
+  if (header.format !== "flat-gbdt-v1") throw new Error(`Unsupported tree format: ${header.format}`);
+  const buf = fs.readFileSync(path.join(process.cwd(), "ml", header.file));
+  // Copy into a fresh ArrayBuffer: Node may return a pooled Buffer with an unaligned byteOffset
+  const data = buf.buffer.slice(buf.byteOffset, buf.byteOffset + buf.byteLength);
+  const f64 = (name: string) => new Float64Array(data, header.buffers[name].offset, header.buffers[name].length);
+  const i32 = (name: string) => new Int32Array(data, header.buffers[name].offset, header.buffers[name].length);
+  trees = {
+    header,
+    threshold: f64("threshold"),
+    value: f64("value"),
+    feature: i32("feature"),
+    left: i32("left"),
+    right: i32("right"),
+    roots: i32("roots"),
+  };
+  treesMtimeMs = mtimeMs;
+  return trees;
+}
+
+/**
+ * Probability of class 1 (relevant) per feature row.
+ */
+export function predictFlatTrees(features: number[][]): number[] {
+  const t = loadFlatTrees();
+  const lr = t.header.learning_rate;
+  return features.map((row) => {
+    const x = row.map((v) => Math.fround(v));
+    let raw = t.header.base_score;
+    for (let k = 0; k < t.roots.length; k++) {
+      let node = t.roots[k];
+      while (t.feature[node] >= 0) {
+        node = x[t.feature[node]] <= t.threshold[node] ? t.left[node] : t.right[node];
+      }
+      raw += lr * t.value[node];
+    }
+    return 1 / (1 + Math.exp(-raw));
+  });
+}